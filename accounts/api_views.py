@@ -17,6 +17,14 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from roupadegala.conditional import ConditionalListMixin
+
+from .authentication import (
+    PermissionContext,
+    permission_context,
+    revoke_token,
+    tokens_for_user,
+)
 from .models import City, Person, PersonsAdresses, PersonsContacts, PersonType
 from .serializers import (
     ClientListSerializer,
@@ -106,19 +114,15 @@ class LoginAPIView(APIView):
         user = authenticate(request, username=username, password=password)
 
         if user:
-            # Gerar tokens JWT
-            refresh = RefreshToken.for_user(user)
-
-            # Buscar informações da pessoa
-            person_type = "N/A"
+            # Gerar tokens JWT (com pessoa e papel nos claims)
             try:
-                person = user.person
-                person_type = person.person_type.type if person.person_type else "N/A"
+                refresh = tokens_for_user(user)
             except Exception as e:
                 return Response(
                     {"error": f"Erro ao buscar informações da pessoa: {str(e)}"},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
+            person_type = refresh["role"] or "N/A"
 
             return Response(
                 {
@@ -173,7 +177,7 @@ class RefreshTokenAPIView(TokenRefreshView):
 @extend_schema(
     tags=["auth"],
     summary="Logout",
-    description="Invalida o refresh token atual",
+    description="Invalida o refresh token informado e o access token da requisição",
     request={
         "application/json": {
             "type": "object",
@@ -213,6 +217,9 @@ class LogoutAPIView(APIView):
 
             token = RefreshToken(refresh_token)
             token.blacklist()
+            # O access token da requisição deixa de valer já, não só na expiração
+            if request.auth is not None:
+                revoke_token(request.auth)
 
             return Response(
                 {
@@ -322,7 +329,8 @@ class RegisterAPIView(APIView):
             PersonsContacts.objects.create(email=email, phone=phone, person=person)
 
             # Gerar tokens JWT
-            refresh = RefreshToken.for_user(user)
+            user.permission_context = PermissionContext(person.id, employee_type.type)
+            refresh = tokens_for_user(user)
 
             return Response(
                 {
@@ -402,8 +410,7 @@ class EmployeeRegisterAPIView(APIView):
 
     def post(self, request):
         """Registro de funcionário via API"""
-        user_person = getattr(request.user, "person", None)
-        if not user_person or user_person.person_type.type != "ADMINISTRADOR":
+        if not permission_context(request.user).is_admin:
             return Response(
                 {"error": "Apenas administradores podem registrar novos funcionários."},
                 status=status.HTTP_403_FORBIDDEN,
@@ -542,9 +549,9 @@ class EmployeeUpdateAPIView(APIView):
         """Atualizar dados de funcionário"""
         try:
             # Verificar se o usuário é ADMINISTRADOR ou está atualizando seus próprios dados
-            user_person = getattr(request.user, "person", None)
-            is_admin = user_person and user_person.person_type.type == "ADMINISTRADOR"
-            is_self_update = user_person and user_person.id == person_id
+            context = permission_context(request.user)
+            is_admin = context.is_admin
+            is_self_update = context.person_id is not None and context.person_id == person_id
 
             if not (is_admin or is_self_update):
                 return Response(
@@ -667,15 +674,15 @@ class UserSelfUpdateAPIView(APIView):
     def put(self, request):
         """Atualizar dados do usuário logado"""
         try:
-            user_person = getattr(request.user, "person", None)
-            if not user_person:
+            context = permission_context(request.user)
+            if context.person_id is None:
                 return Response(
                     {"error": "Usuário não possui dados de pessoa associados."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
             # Verificar se é funcionário
-            if user_person.person_type.type not in [
+            if context.role not in [
                 "ADMINISTRADOR",
                 "ATENDENTE",
                 "RECEPÇÃO",
@@ -684,6 +691,9 @@ class UserSelfUpdateAPIView(APIView):
                     {"error": "Apenas funcionários podem atualizar dados."},
                     status=status.HTTP_403_FORBIDDEN,
                 )
+            user_person = Person.objects.select_related("person_type").get(
+                id=context.person_id
+            )
 
             # Remover role dos dados se presente (usuário não pode alterar seu próprio cargo)
             data = request.data.copy()
@@ -1060,8 +1070,9 @@ class ClientSearchAPIView(APIView):
     ],
     responses={200: ClientListSerializer},
 )
-class ClientListAPIView(APIView):
+class ClientListAPIView(ConditionalListMixin, APIView):
     permission_classes = [IsAuthenticated]
+    conditional_related = ("contacts", "personsadresses")
 
     def get(self, request):
         """Lista de clientes"""
@@ -1100,6 +1111,11 @@ class ClientListAPIView(APIView):
             # Ordenar para evitar warning de paginação
             clients = clients.order_by('id')
 
+            validators = self.list_validators(request, clients)
+            not_modified = self.not_modified(request, validators)
+            if not_modified is not None:
+                return not_modified
+
             # Paginação
             paginator = Paginator(clients, page_size)
             try:
@@ -1159,7 +1175,7 @@ class ClientListAPIView(APIView):
                 "clients": data,
             }
 
-            return Response(response)
+            return self.conditional(Response(response), validators)
 
         except Exception as e:
             return Response(
@@ -1184,7 +1200,8 @@ class PasswordResetAPIView(APIView):
             )
 
         try:
-            user = request.user
+            # request.user não traz a senha (CachedJWTAuthentication)
+            user = User.objects.get(pk=request.user.pk)
             if not user.check_password(old_password):
                 return Response(
                     {"error": "Senha antiga inválida"},
@@ -1341,7 +1358,10 @@ class GetUserMeAPIView(APIView):
     def get(self, request):
         """Retorna dados completos do usuário logado"""
         try:
-            user = request.user
+            # request.user traz só id, username e flags (CachedJWTAuthentication)
+            user = User.objects.select_related("person__person_type").get(
+                pk=request.user.pk
+            )
 
             # Dados básicos do usuário
             user_data = {
@@ -0,0 +1,290 @@
+"""
+Autenticação JWT com contexto de permissão em cache
+
+O token de acesso carrega `username`, `person_id` e `role` (tipo da
+pessoa). Em escritas, o usuário é revalidado por uma entrada de cache de
+vida curta (ativo, pessoa e papel), sem consultar o banco; a entrada é
+recarregada com uma única query quando expira ou quando User/Person/
+PersonType mudam. Em leituras (GET/HEAD/OPTIONS) com cache compartilhado
+entre os processos (`roupadegala.cache.is_shared`), os claims assinados
+bastam: o usuário é um TokenUser e só a lista de revogação é consultada.
+Com cache local (locmem, o padrão), as leituras também revalidam o usuário
+pelo estado em cache, pois as revogações feitas em outro worker não chegam
+a este.
+
+Revogação: o logout revoga o jti do access token; desativar o usuário ou
+trocar seu papel revoga todos os tokens emitidos antes disso. As revogações
+ficam em memória no processo e no cache, até o token expirar; com cache
+local, desativação e troca de papel valem nos outros workers em até
+USER_STATE_TTL segundos, e o logout só no worker que o recebeu.
+"""
+
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from roupadegala.cache import is_shared
+
+# Tempo máximo que uma desativação ou troca de papel leva para valer em
+# outros processos (no mesmo processo a invalidação é imediata)
+USER_STATE_TTL = 60
+
+ADMIN_ROLE = "ADMINISTRADOR"
+
+
+class PermissionContext(NamedTuple):
+    """Pessoa e papel do usuário autenticado"""
+
+    person_id: Optional[int] = None
+    role: Optional[str] = None
+
+    @property
+    def is_admin(self):
+        return self.role == ADMIN_ROLE
+
+
+def _cache_key(user_id):
+    return f"accounts:user-state:{user_id}"
+
+
+def load_user_state(user_id):
+    """
+    Estado do usuário usado na autenticação (username, flags, pessoa e
+    papel), do cache ou de uma única query. Retorna None se não existir.
+    """
+    key = _cache_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        row = (
+            User.objects.filter(pk=user_id)
+            .values(
+                "username",
+                "is_active",
+                "is_staff",
+                "is_superuser",
+                "person__id",
+                "person__person_type__type",
+            )
+            .first()
+        )
+        # Usuário inexistente também fica em cache ({}), para não consultar
+        # o banco a cada token de um usuário removido
+        state = row or {}
+        cache.set(key, state, USER_STATE_TTL)
+    return state or None
+
+
+def _context(state):
+    return PermissionContext(state["person__id"], state["person__person_type__type"])
+
+
+def invalidate_user_state(*user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids if user_id])
+
+
+def permission_context(user):
+    """
+    Contexto de permissão do usuário da requisição. Usuários autenticados
+    por CachedJWTAuthentication já o trazem; os demais (sessão,
+    force_authenticate) passam pelo cache.
+    """
+    context = getattr(user, "permission_context", None)
+    if context is None:
+        state = load_user_state(user.pk) if user is not None and user.pk else None
+        context = _context(state) if state else PermissionContext()
+        if user is not None:
+            user.permission_context = context
+    return context
+
+
+class ClaimsUser(TokenUser):
+    """TokenUser com o contexto de permissão lido dos claims do token"""
+
+    @cached_property
+    def permission_context(self):
+        return PermissionContext(self.token.get("person_id"), self.token.get("role"))
+
+
+class _RevocationList:
+    """
+    Revogações (jti e "não antes de" por usuário) com validade até o fim da
+    vida do access token. Consultas checam primeiro a memória do processo e
+    depois o cache compartilhado, que propaga a revogação entre processos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # chave -> (valor, expira em)
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            now = time.time()
+            if len(self._entries) > 1000:
+                self._entries = {
+                    k: entry for k, entry in self._entries.items() if entry[1] > now
+                }
+            self._entries[key] = (value, expires_at)
+
+    def add(self, key, value, expires_at):
+        timeout = max(int(expires_at - time.time()), 1)
+        self._remember(key, value, expires_at)
+        cache.set(key, value, timeout)
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        missing = []
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                found[key] = entry[0]
+            else:
+                missing.append(key)
+        if missing:
+            shared = cache.get_many(missing)
+            for key, value in shared.items():
+                self._remember(key, value, now + USER_STATE_TTL)
+            found.update(shared)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+revocations = _RevocationList()
+
+
+def _jti_key(jti):
+    return f"accounts:revoked-jti:{jti}"
+
+
+def _user_key(user_id):
+    return f"accounts:revoked-user:{user_id}"
+
+
+def revoke_token(token):
+    """Revoga um access token (pelo jti) até ele expirar"""
+    revocations.add(_jti_key(token[api_settings.JTI_CLAIM]), True, token["exp"])
+
+
+def revoke_user(user_id):
+    """
+    Revoga os tokens do usuário emitidos até agora: access tokens pela
+    lista de revogação e refresh tokens pela blacklist do simplejwt.
+    """
+    from rest_framework_simplejwt.token_blacklist.models import (
+        BlacklistedToken,
+        OutstandingToken,
+    )
+
+    now = time.time()
+    lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    revocations.add(_user_key(user_id), now, now + lifetime)
+
+    outstanding = OutstandingToken.objects.filter(
+        user_id=user_id, expires_at__gt=timezone.now(), blacklistedtoken__isnull=True
+    )
+    BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token=token) for token in outstanding],
+        ignore_conflicts=True,
+    )
+
+
+def is_revoked(token):
+    jti_key = _jti_key(token.get(api_settings.JTI_CLAIM))
+    user_key = _user_key(token.get(api_settings.USER_ID_CLAIM))
+    found = revocations.get_many([jti_key, user_key])
+    if found.get(jti_key):
+        return True
+    # iat tem resolução de segundos: o instante da revogação é guardado com
+    # fração para não deixar passar tokens emitidos no mesmo segundo, antes dela
+    not_before = found.get(user_key)
+    return not_before is not None and token.get("iat", 0) < not_before
+
+
+def tokens_for_user(user):
+    """
+    Refresh token (e o access derivado dele) com os claims username,
+    person_id e role
+    """
+    refresh = RefreshToken.for_user(user)
+    context = permission_context(user)
+    refresh["username"] = user.get_username()
+    refresh["person_id"] = context.person_id
+    refresh["role"] = context.role
+    return refresh
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que monta o usuário a partir do token e do estado em
+    cache, sem buscar User, Person e PersonType a cada requisição.
+
+    Em escritas, o usuário retornado é uma instância de User não carregada
+    do banco, com apenas id, username e flags preenchidos: serve para
+    comparações e para atribuir em FKs (created_by, updated_by). Em leituras
+    com token que traz `role` e cache compartilhado, é um TOKEN_USER_CLASS
+    (ClaimsUser), sem consulta ao cache de usuários. Views que precisam dos
+    demais campos devem buscar o registro.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if is_revoked(validated_token):
+            raise AuthenticationFailed("Token revogado", code="token_revoked")
+        if request.method in SAFE_METHODS and "role" in validated_token and is_shared():
+            return api_settings.TOKEN_USER_CLASS(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token sem identificação de usuário")
+
+        state = load_user_state(user_id)
+        if state is None:
+            raise AuthenticationFailed("Usuário não encontrado", code="user_not_found")
+        if not state["is_active"]:
+            raise AuthenticationFailed("Usuário inativo", code="user_inactive")
+
+        context = _context(state)
+        # Tokens emitidos antes de uma troca de papel deixam de valer
+        if "role" in validated_token and (
+            validated_token.get("person_id") != context.person_id
+            or validated_token["role"] != context.role
+        ):
+            raise AuthenticationFailed(
+                "Permissões do usuário foram alteradas. Faça login novamente.",
+                code="token_outdated",
+            )
+
+        user = User(
+            id=user_id,
+            username=state["username"],
+            is_active=True,
+            is_staff=state["is_staff"],
+            is_superuser=state["is_superuser"],
+        )
+        user.permission_context = context
+        return user
@@ -0,0 +1,125 @@
+import re
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Q, Subquery
+
+from accounts.models import Person, PersonsContacts
+from accounts.services import merge_persons
+
+
+class Command(BaseCommand):
+    help = (
+        "Encontra pessoas duplicadas (mesmo CPF com formatações diferentes e, "
+        "opcionalmente, clientes da triagem sem CPF) e as mescla em lote."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sem-cpf",
+            action="store_true",
+            help=(
+                "Também mescla pessoas sem CPF em uma pessoa com CPF que tenha "
+                "o mesmo nome e o mesmo telefone."
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Apenas lista as mesclagens, sem alterar o banco.",
+        )
+
+    def handle(self, *args, **options):
+        pairs = self._cpf_duplicates()
+        if options["sem_cpf"]:
+            pairs.extend(self._triage_duplicates())
+
+        if not pairs:
+            self.stdout.write("Nenhuma pessoa duplicada encontrada.")
+            return
+
+        persons = Person.objects.in_bulk({pk for pair in pairs for pk in pair})
+        merged = 0
+        for source_id, target_id in pairs:
+            source = persons.get(source_id)
+            target = persons.get(target_id)
+            if source is None or target is None:
+                continue
+
+            self.stdout.write(
+                f"Pessoa {source.id} ({source.name}) -> {target.id} ({target.name})"
+            )
+            if options["dry_run"]:
+                continue
+
+            try:
+                merge_persons(source, target)
+            except ValueError as e:
+                self.stderr.write(f"  ignorada: {e}")
+                continue
+            persons.pop(source_id)
+            merged += 1
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(pairs)} mesclagem(ns) encontrada(s).")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{merged} pessoa(s) mesclada(s)."))
+
+    def _cpf_duplicates(self):
+        """
+        Agrupa as pessoas pelo CPF só com dígitos. Em cada grupo, o destino é
+        a pessoa com usuário vinculado ou, na falta dela, a mais antiga.
+        """
+        groups = defaultdict(list)
+        rows = (
+            Person.objects.filter(cpf__isnull=False)
+            .exclude(cpf="")
+            .values_list("id", "cpf", "user_id")
+            .order_by("id")
+        )
+        for person_id, cpf, user_id in rows:
+            groups[re.sub(r"\D", "", cpf)].append((person_id, user_id))
+
+        pairs = []
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            target_id = next(
+                (pid for pid, user_id in members if user_id), members[0][0]
+            )
+            pairs.extend((pid, target_id) for pid, _ in members if pid != target_id)
+        return pairs
+
+    def _triage_duplicates(self):
+        """
+        Pessoas sem CPF (nulo ou vazio) que compartilham nome e telefone com
+        uma pessoa com CPF, resolvidas em uma única consulta.
+        """
+        match = (
+            Person.objects.filter(
+                cpf__isnull=False,
+                name=OuterRef("person__name"),
+                contacts__phone=OuterRef("phone"),
+            )
+            .exclude(cpf="")
+            .order_by("id")
+        )
+        rows = (
+            PersonsContacts.objects.filter(
+                Q(person__cpf__isnull=True) | Q(person__cpf=""),
+                person__user__isnull=True,
+                phone__isnull=False,
+            )
+            .exclude(phone="")
+            .annotate(target_id=Subquery(match.values("id")[:1]))
+            .filter(target_id__isnull=False)
+            .values_list("person_id", "target_id")
+            .distinct()
+        )
+        seen = set()
+        pairs = []
+        for source_id, target_id in rows:
+            if source_id not in seen:
+                seen.add(source_id)
+                pairs.append((source_id, target_id))
+        return pairs
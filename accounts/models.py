@@ -32,6 +32,16 @@ class BaseModel(models.Model):
     class Meta:
         abstract = True
 
+    def save(self, *args, **kwargs):
+        # Toda gravação de um registro existente conta como alteração para os
+        # validadores das listagens (roupadegala.conditional)
+        if not self._state.adding:
+            self.date_updated = now()
+            update_fields = kwargs.get("update_fields")
+            if update_fields and "date_updated" not in update_fields:
+                kwargs["update_fields"] = [*update_fields, "date_updated"]
+        super().save(*args, **kwargs)
+
     def cancel(self, user):
         self.date_canceled = now()
         self.canceled_by = user
@@ -75,9 +85,24 @@ class Person(BaseModel):
     cpf = models.CharField(max_length=20, unique=True, null=True, blank=True)
     person_type = models.ForeignKey(PersonType, on_delete=models.CASCADE)
 
+    # Colunas que definem o acesso do usuário; os valores lidos do banco
+    # ficam em `_loaded_access` (e o nome em `_loaded_name`) para detectar
+    # mudanças no save sem nova query
+    ACCESS_FIELDS = ("person_type_id", "user_id")
+
     class Meta:
         db_table = "person"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if all(field in loaded for field in cls.ACCESS_FIELDS):
+            instance._loaded_access = tuple(loaded[f] for f in cls.ACCESS_FIELDS)
+        if "name" in loaded:
+            instance._loaded_name = loaded["name"]
+        return instance
+
     def __str__(self):
         return f"{self.name}"
 
@@ -0,0 +1,16 @@
+"""
+Permissões da API do app accounts
+"""
+
+from rest_framework.permissions import BasePermission
+
+from .authentication import permission_context
+
+
+class IsAdministrador(BasePermission):
+    """Permite acesso apenas a usuários com pessoa do tipo ADMINISTRADOR"""
+
+    message = "Apenas administradores podem acessar este recurso."
+
+    def has_permission(self, request, view):
+        return permission_context(request.user).is_admin
@@ -0,0 +1,113 @@
+"""
+Serviços de domínio do app accounts
+"""
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from service_control import changes, metrics
+from service_control.models import EventParticipant, ServiceOrder
+
+from .models import PersonsAdresses, PersonsContacts
+
+CONTACT_MATCH_FIELDS = ("email", "phone")
+ADDRESS_MATCH_FIELDS = ("street", "number", "cep", "neighborhood", "complemento")
+
+
+def _duplicate_of(model, target, text_fields, extra_fields=()):
+    """
+    Subquery que encontra, na pessoa destino, uma linha equivalente à linha
+    externa. Campos de texto são comparados tratando NULL e "" como iguais.
+    """
+    queryset = model.objects.filter(person=target)
+    annotations = {
+        f"_match_{field}": Coalesce(field, Value("")) for field in text_fields
+    }
+    filters = {
+        f"_match_{field}": Coalesce(OuterRef(field), Value("")) for field in text_fields
+    }
+    for field in extra_fields:
+        filters[field] = OuterRef(field)
+    return Exists(queryset.annotate(**annotations).filter(**filters))
+
+
+@transaction.atomic
+def merge_persons(source, target):
+    """
+    Funde a pessoa `source` na pessoa `target` e remove `source`.
+
+    Todas as referências são movidas com UPDATEs em lote: contatos e endereços
+    (descartando os que já existem no destino), ordens de serviço (cliente,
+    funcionário e atendente) e participações em eventos. Retorna um dict com
+    a quantidade de linhas movidas por relação.
+    """
+    if source.pk == target.pk:
+        raise ValueError("Não é possível mesclar uma pessoa com ela mesma.")
+    if source.user_id and target.user_id:
+        raise ValueError("As duas pessoas possuem usuário vinculado.")
+
+    # date_updated: as linhas movidas mudam o ETag das listagens e aparecem
+    # no feed de alterações
+    now = timezone.now()
+
+    source_contacts = PersonsContacts.objects.filter(person=source)
+    contacts = source_contacts.exclude(
+        _duplicate_of(PersonsContacts, target, CONTACT_MATCH_FIELDS)
+    ).update(person=target, date_updated=now)
+    source_contacts.delete()
+
+    source_addresses = PersonsAdresses.objects.filter(person=source)
+    addresses = source_addresses.exclude(
+        _duplicate_of(PersonsAdresses, target, ADDRESS_MATCH_FIELDS, ("city",))
+    ).update(person=target, date_updated=now)
+    source_addresses.delete()
+
+    orders = ServiceOrder.objects
+    moved = list(
+        orders.filter(
+            Q(renter=source) | Q(employee=source) | Q(attendant=source)
+        ).values_list("id", "order_date")
+    )
+    # Resultados por período em cache dos meses das OS movidas (atendente
+    # e cliente entram nos filtros e agrupamentos)
+    metrics.invalidate_months(*{order_date for _, order_date in moved})
+    # A mesclagem roda em uma única transação, que pode passar da janela
+    # do feed de alterações
+    changes.touch_on_commit(order_id for order_id, _ in moved)
+    service_orders = orders.filter(renter=source).update(
+        renter=target, date_updated=now
+    )
+    employee_orders = orders.filter(employee=source).update(
+        employee=target, date_updated=now
+    )
+    attendant_orders = orders.filter(attendant=source).update(
+        attendant=target, date_updated=now
+    )
+
+    source_participations = EventParticipant.objects.filter(person=source)
+    participations = source_participations.exclude(
+        Exists(EventParticipant.objects.filter(person=target, event=OuterRef("event")))
+    ).update(person=target)
+    source_participations.delete()
+
+    if source.user_id:
+        user_id = source.user_id
+        source.user = None
+        source.save(update_fields=["user"])
+        target.user_id = user_id
+        target.save(update_fields=["user"])
+
+    source.delete()
+    # A pessoa removida pode estar nas opções de atendente do dashboard
+    metrics.invalidate_facets()
+
+    return {
+        "contacts": contacts,
+        "addresses": addresses,
+        "service_orders": service_orders,
+        "employee_service_orders": employee_orders,
+        "attendant_service_orders": attendant_orders,
+        "event_participations": participations,
+    }
@@ -0,0 +1,57 @@
+"""
+Signals do app accounts
+"""
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_state, revoke_user
+from .models import Person, PersonType
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    invalidate_user_state(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def revoke_deactivated_user(sender, instance, created, **kwargs):
+    if not created and not instance.is_active:
+        revoke_user(instance.pk)
+
+
+@receiver(pre_save, sender=Person)
+def revoke_user_on_role_change(sender, instance, **kwargs):
+    # Tokens de leitura confiam no papel dos claims; trocar o papel os revoga
+    if instance.pk is None or instance.user_id is None:
+        return
+    previous = getattr(instance, "_loaded_access", None)
+    if previous is None:
+        previous = (
+            Person.objects.filter(pk=instance.pk)
+            .values_list(*Person.ACCESS_FIELDS)
+            .first()
+        )
+    current = tuple(getattr(instance, field) for field in Person.ACCESS_FIELDS)
+    if previous and previous != current:
+        revoke_user(instance.user_id)
+        if previous[1] and previous[1] != instance.user_id:
+            revoke_user(previous[1])
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def invalidate_person_user(sender, instance, **kwargs):
+    invalidate_user_state(instance.user_id)
+
+
+@receiver(post_save, sender=PersonType)
+def invalidate_person_type_users(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_state(
+            *Person.objects.filter(person_type=instance)
+            .exclude(user=None)
+            .values_list("user_id", flat=True)
+        )
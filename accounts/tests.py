@@ -3,14 +3,26 @@ Testes para os endpoints de atualização de dados
 """
 
 import json
+from datetime import date
+from io import StringIO
+from unittest import mock
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Person, PersonsContacts, PersonType
+from service_control.models import Event, EventParticipant, ServiceOrder
+
+from . import authentication
+from .models import City, Person, PersonsAdresses, PersonsContacts, PersonType
+from .services import merge_persons
 
 
 class EmployeeUpdateTests(TestCase):
@@ -325,3 +337,255 @@ class EmployeeUpdateTests(TestCase):
         self.assertEqual(
             user_data["person"]["contacts"][0]["email"], "attendant@test.com"
         )
+
+
+class PersonMergeTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        client_type, _ = PersonType.objects.get_or_create(type="CLIENTE")
+        self.city = City.objects.create(code="1", name="CIDADE TESTE", uf="SP")
+        self.temporary = Person.objects.create(
+            name="CLIENTE TRIAGEM", person_type=client_type
+        )
+        self.existing = Person.objects.create(
+            name="CLIENTE", cpf="55566677788", person_type=client_type
+        )
+
+    def test_merge_moves_references_and_skips_duplicates(self):
+        """Teste: Mesclagem move referências e descarta contatos/endereços repetidos"""
+        PersonsContacts.objects.create(person=self.existing, phone="(11) 90000-0000")
+        PersonsContacts.objects.create(person=self.temporary, phone="(11) 90000-0000")
+        PersonsContacts.objects.create(
+            person=self.temporary, phone="(11) 91111-1111", email="novo@test.com"
+        )
+        PersonsAdresses.objects.create(
+            person=self.temporary, street="RUA A", number="1", city=self.city
+        )
+        order = ServiceOrder.objects.create(
+            renter=self.temporary, order_date=date.today(), total_value=100
+        )
+        event = Event.objects.create(name="FORMATURA")
+        EventParticipant.objects.create(event=event, person=self.temporary)
+        EventParticipant.objects.create(event=event, person=self.existing)
+
+        result = merge_persons(self.temporary, self.existing)
+
+        self.assertEqual(result["contacts"], 1)
+        self.assertEqual(result["addresses"], 1)
+        self.assertEqual(result["service_orders"], 1)
+        self.assertEqual(result["event_participations"], 0)
+        self.assertFalse(Person.objects.filter(id=self.temporary.id).exists())
+        self.assertEqual(self.existing.contacts.count(), 2)
+        self.assertEqual(self.existing.personsadresses_set.count(), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.renter_id, self.existing.id)
+        self.assertEqual(EventParticipant.objects.filter(event=event).count(), 1)
+
+    def test_merge_same_person_is_rejected(self):
+        """Teste: Não é possível mesclar uma pessoa com ela mesma"""
+        with self.assertRaises(ValueError):
+            merge_persons(self.existing, self.existing)
+
+
+class MergeDuplicatePersonsCommandTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        self.client_type, _ = PersonType.objects.get_or_create(type="CLIENTE")
+
+    def person(self, name, cpf=None, phone=None, user=None):
+        person = Person.objects.create(
+            name=name, cpf=cpf, person_type=self.client_type, user=user
+        )
+        if phone:
+            PersonsContacts.objects.create(person=person, phone=phone)
+        return person
+
+    def user(self, username):
+        return User.objects.create_user(username=username, password="senha123")
+
+    def run_command(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command("merge_duplicate_persons", *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_cpf_duplicates_merge_into_person_with_user(self):
+        """Teste: CPFs iguais com formatação diferente vão para quem tem usuário"""
+        oldest = self.person("CLIENTE", cpf="123.456.789-01")
+        with_user = self.person("CLIENTE", cpf="12345678901", user=self.user("u1"))
+        order = ServiceOrder.objects.create(
+            renter=oldest, order_date=date.today(), total_value=100
+        )
+
+        stdout, _ = self.run_command()
+
+        self.assertIn("1 pessoa(s) mesclada(s).", stdout)
+        self.assertFalse(Person.objects.filter(id=oldest.id).exists())
+        order.refresh_from_db()
+        self.assertEqual(order.renter_id, with_user.id)
+
+    def test_triage_duplicates_skip_empty_cpf(self):
+        """Teste: Pessoa com CPF vazio não é destino de clientes da triagem"""
+        self.person("JOAO", cpf="", phone="11999990000")
+        target = self.person("JOAO", cpf="98765432100", phone="11999990000")
+        self.person("JOAO", phone="11999990000")
+
+        stdout, _ = self.run_command()
+        self.assertIn("Nenhuma pessoa duplicada encontrada.", stdout)
+        self.run_command("--sem-cpf")
+
+        self.assertEqual(
+            set(Person.objects.values_list("id", flat=True)), {target.id}
+        )
+        # Contatos repetidos das pessoas mescladas são descartados
+        self.assertEqual(target.contacts.count(), 1)
+
+    def test_dry_run_only_lists(self):
+        """Teste: --dry-run lista as mesclagens sem alterar o banco"""
+        self.person("MARIA", cpf="111.222.333-44")
+        self.person("MARIA", cpf="11122233344")
+        self.person("MARIA", phone="11988887777")
+        self.person("MARIA", cpf="55566677788", phone="11988887777")
+
+        stdout, _ = self.run_command("--sem-cpf", "--dry-run")
+
+        self.assertIn("2 mesclagem(ns) encontrada(s).", stdout)
+        self.assertEqual(Person.objects.count(), 4)
+
+    def test_pairs_where_both_have_users_are_skipped(self):
+        """Teste: Pares em que as duas pessoas têm usuário são ignorados"""
+        first = self.person("ANA", cpf="222.333.444-55", user=self.user("u1"))
+        second = self.person("ANA", cpf="22233344455", user=self.user("u2"))
+        oldest = self.person("ANA", cpf="333.444.555-66")
+        self.person("ANA", cpf="33344455566")
+
+        stdout, stderr = self.run_command()
+
+        self.assertIn("ignorada: As duas pessoas possuem usuário vinculado.", stderr)
+        self.assertIn("1 pessoa(s) mesclada(s).", stdout)
+        self.assertEqual(
+            set(Person.objects.values_list("id", flat=True)),
+            {first.id, second.id, oldest.id},
+        )
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        self.client = APIClient()
+        self.admin_type, _ = PersonType.objects.get_or_create(type="ADMINISTRADOR")
+        self.attendant_type, _ = PersonType.objects.get_or_create(type="ATENDENTE")
+        self.user = User.objects.create_user(username="12345678901", password="senha123")
+        self.person = Person.objects.create(
+            user=self.user, name="ADMIN", cpf="12345678901", person_type=self.admin_type
+        )
+
+    def login(self):
+        response = self.client.post(
+            reverse("api_login"),
+            {"username": "123.456.789-01", "password": "senha123"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data
+
+    def test_login_token_carries_person_and_role(self):
+        """Teste: O access token traz person_id e role"""
+        data = self.login()
+
+        token = AccessToken(data["access"])
+        self.assertEqual(token["person_id"], self.person.id)
+        self.assertEqual(token["role"], "ADMINISTRADOR")
+        self.assertEqual(data["user"]["person_type"], "ADMINISTRADOR")
+
+    @mock.patch.object(authentication, "is_shared", return_value=True)
+    def test_read_requests_trust_token_claims(self, _shared_cache):
+        """Teste: Em GET, autenticar e checar papel não consulta o banco nem o cache"""
+        self.login()
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("api_metrics_slow_requests"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ctx.captured_queries, [])
+        self.assertIsNone(cache.get(f"accounts:user-state:{self.user.id}"))
+
+    def test_local_cache_reads_check_user_state(self):
+        """Teste: Com cache local (locmem), leituras revalidam o usuário"""
+        self.login()
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("api_metrics_slow_requests"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIsNotNone(cache.get(f"accounts:user-state:{self.user.id}"))
+
+    def test_deactivation_applies_on_other_workers(self):
+        """Teste: Desativação em outro worker vale aqui quando o estado expira"""
+        self.login()
+        self.assertEqual(
+            self.client.get(reverse("api_user_me")).status_code, status.HTTP_200_OK
+        )
+
+        # Outro worker desativa o usuário: este processo não recebe o signal
+        # nem a revogação, só vê o banco quando o estado em cache expira
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+        authentication.revocations.clear()
+
+        response = self.client.get(reverse("api_user_me"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @mock.patch.object(authentication, "is_shared", return_value=True)
+    def test_revocation_applies_on_other_workers(self, _shared_cache):
+        """Teste: Com cache compartilhado, o logout vale nos outros workers"""
+        data = self.login()
+        self.client.post(
+            reverse("api_logout"), {"refresh": data["refresh"]}, format="json"
+        )
+
+        # Outro worker: sem a revogação na memória do processo, só no cache
+        authentication.revocations.clear()
+
+        response = self.client.get(reverse("api_metrics_slow_requests"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_access_token(self):
+        """Teste: Após o logout o access token é recusado também em leituras"""
+        data = self.login()
+
+        response = self.client.post(
+            reverse("api_logout"), {"refresh": data["refresh"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse("api_user_me"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """Teste: Desativar o usuário revoga seus tokens de leitura e de refresh"""
+        data = self.login()
+        self.client.get(reverse("api_user_me"))
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(reverse("api_user_me"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = APIClient().post(
+            reverse("api_refresh"), {"refresh": data["refresh"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_outdates_token(self):
+        """Teste: Token emitido antes de uma troca de papel deixa de valer"""
+        self.login()
+        self.person.person_type = self.attendant_type
+        self.person.save()
+
+        response = self.client.get(reverse("api_user_me"))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
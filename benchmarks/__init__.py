@@ -0,0 +1,10 @@
+"""
+Benchmarks de carga do RoupadeGala
+
+Gera uma loja sintética (roupadegala.testing.StoreFactory) na escala pedida e
+repete uma mistura ponderada de endpoints reais, pelo test client do Django ou
+contra um servidor local (gunicorn). O resultado (p50/p95/p99 e vazão por
+endpoint) sai em JSON para comparar execuções.
+
+    python -m benchmarks --orders 5000 --requests 2000 --output antes.json
+"""
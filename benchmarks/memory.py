@@ -0,0 +1,134 @@
+"""
+Benchmark de memória da listagem por fase (V1)
+
+Mede com tracemalloc o pico de memória alocada durante uma requisição da
+listagem por fase, com e sem ?stream=1, para lojas sintéticas de tamanhos
+crescentes. Com streaming, o pico deve ficar estável; sem ele, cresce com
+o número de OS da fase.
+
+    python -m benchmarks.memory --orders 600 1800 5400 --phase FINALIZADO
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from .runner import build_store, quiet_request_log, test_database
+
+
+def _client(store):
+    from rest_framework.test import APIClient
+
+    from accounts.authentication import tokens_for_user
+
+    client = APIClient()
+    token = tokens_for_user(store.admin.user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+def measure(client, url, stream):
+    """Pico de memória (KiB), bytes e tempo de uma requisição consumida"""
+    params = {"stream": "1"} if stream else {}
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+
+    response = client.get(url, params)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url}: HTTP {response.status_code}")
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    return {
+        "peak_kib": round((peak - before) / 1024, 1),
+        "bytes": size,
+        "duration_ms": round(elapsed * 1000, 1),
+    }
+
+
+def run(args):
+    from django.urls import reverse
+
+    from service_control import phases
+    from service_control.models import ServiceOrder
+
+    quiet_request_log()
+    url = reverse("api_service_order_by_phase", kwargs={"phase_name": args.phase})
+    sizes = sorted(args.orders)
+    results = []
+
+    with test_database():
+        store = build_store(sizes[0], args.seed)
+        client = _client(store)
+        # A primeira chamada aplica a recusa automática de OS vencidas
+        client.get(url)
+
+        tracemalloc.start()
+        try:
+            grown = sizes[0]
+            for size in sizes:
+                if size > grown:
+                    remaining = size - grown
+                    while remaining > 0:
+                        batch = min(remaining, 1000)
+                        store.grow(orders=batch)
+                        remaining -= batch
+                    grown = size
+                    client.get(url)
+                orders = ServiceOrder.objects.filter(
+                    service_order_phase_id__in=phases.search_phase_ids(args.phase)
+                ).count()
+                results.append(
+                    {
+                        "orders": size,
+                        "phase_orders": orders,
+                        "list": measure(client, url, stream=False),
+                        "stream": measure(client, url, stream=True),
+                    }
+                )
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "config": {"phase": args.phase, "orders": sizes, "seed": args.seed},
+        "results": results,
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.memory",
+        description="Pico de memória da listagem por fase com e sem streaming",
+    )
+    parser.add_argument(
+        "--orders",
+        type=int,
+        nargs="+",
+        default=[600, 1800, 5400],
+        help="Tamanhos da loja sintética (OS no total)",
+    )
+    parser.add_argument("--phase", default="FINALIZADO", help="Fase listada")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "roupadegala.settings")
+    import django
+
+    django.setup()
+
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    print(json.dumps(run(args), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark de serialização e compressão das respostas
+
+Busca os dados (response.data) das maiores respostas de leitura numa loja
+sintética e mede, para cada uma, o render do JSONRenderer do DRF e do
+FastJSONRenderer, além do tamanho do corpo cru, com gzip e com brotli
+(quando instalado) nos níveis de RESPONSE_COMPRESSION.
+
+    python -m benchmarks.rendering --orders 2000 --repeat 50
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+
+from .runner import build_store, quiet_request_log, test_database
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+
+def _payloads(store, page_size):
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from accounts.authentication import tokens_for_user
+
+    client = APIClient()
+    token = tokens_for_user(store.admin.user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    targets = {
+        f"phase_list[PENDENTE] page_size={page_size}": (
+            reverse("api_service_order_by_phase_v2", kwargs={"phase_name": "PENDENTE"}),
+            {"page_size": page_size},
+        ),
+        "dashboard": (reverse("api_service_order_dashboard"), {}),
+    }
+    payloads = {}
+    for name, (path, params) in targets.items():
+        response = client.get(path, params)
+        if response.status_code != 200:
+            raise RuntimeError(f"{name}: HTTP {response.status_code}")
+        payloads[name] = response.data
+    return payloads
+
+
+def _median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def measure(data, repeat, compression):
+    from rest_framework.renderers import JSONRenderer
+
+    from roupadegala.renderers import FastJSONRenderer
+
+    result = {}
+    for renderer in (JSONRenderer(), FastJSONRenderer()):
+        body = renderer.render(data)
+        result[type(renderer).__name__] = {
+            "render_ms": _median_ms(lambda: renderer.render(data), repeat),
+            "bytes": len(body),
+        }
+
+    body = FastJSONRenderer().render(data)
+    level = compression["GZIP_LEVEL"]
+    result["gzip"] = {
+        "level": level,
+        "compress_ms": _median_ms(lambda: gzip.compress(body, level), repeat),
+        "bytes": len(gzip.compress(body, level)),
+    }
+    if brotli is not None:
+        quality = compression["BROTLI_QUALITY"]
+        result["br"] = {
+            "quality": quality,
+            "compress_ms": _median_ms(
+                lambda: brotli.compress(body, quality=quality), repeat
+            ),
+            "bytes": len(brotli.compress(body, quality=quality)),
+        }
+    return result
+
+
+def run(args):
+    from roupadegala.middleware import _compression_settings
+
+    quiet_request_log()
+    with test_database():
+        store = build_store(args.orders, args.seed)
+        payloads = _payloads(store, args.page_size)
+        compression = _compression_settings()
+        results = {
+            name: measure(data, args.repeat, compression)
+            for name, data in payloads.items()
+        }
+    return {
+        "config": {
+            "orders": args.orders,
+            "page_size": args.page_size,
+            "repeat": args.repeat,
+            "brotli": brotli is not None,
+        },
+        "responses": results,
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.rendering",
+        description="Benchmark de render JSON e compressão das respostas",
+    )
+    parser.add_argument("--orders", type=int, default=2000, help="OS na loja sintética")
+    parser.add_argument(
+        "--page-size", type=int, default=200, help="page_size da listagem por fase"
+    )
+    parser.add_argument("--repeat", type=int, default=50, help="Repetições por medida")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "roupadegala.settings")
+    import django
+
+    django.setup()
+
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    print(json.dumps(run(args), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
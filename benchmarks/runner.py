@@ -0,0 +1,349 @@
+"""
+Executor do benchmark de carga
+
+Alvos:
+- test client (padrão): cria um banco de teste, popula a loja sintética e
+  faz as requisições em processo, sem rede;
+- --url: popula o banco configurado em settings (o mesmo do servidor) e faz
+  as requisições HTTP contra o servidor em execução, com --concurrency
+  threads. As linhas sintéticas não são removidas depois, então o banco
+  precisa ser de rascunho: o executor se recusa a popular um banco que já
+  tenha pessoas ou OS (recrie-o ou use `manage.py flush` entre execuções).
+
+A quantidade de queries de cada requisição vem do header Server-Timing
+(RequestMetricsMiddleware).
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(values, q):
+    """Percentil por posição (nearest-rank) de uma lista ordenada"""
+    if not values:
+        return None
+    index = max(0, math.ceil(q / 100 * len(values)) - 1)
+    return values[index]
+
+
+def _queries(server_timing):
+    match = QUERIES_RE.search(server_timing or "")
+    return int(match.group(1)) if match else None
+
+
+class TestClientTarget:
+    """Requisições em processo pelo APIClient do DRF, autenticado como admin"""
+
+    name = "test-client"
+
+    def __init__(self, store):
+        from rest_framework.test import APIClient
+
+        from accounts.authentication import tokens_for_user
+
+        self.client = APIClient()
+        token = tokens_for_user(store.admin.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def request(self, method, path, body):
+        kwargs = {"format": "json"} if body is not None else {}
+        response = getattr(self.client, method)(path, data=body, **kwargs)
+        return response.status_code, _queries(response.get("Server-Timing"))
+
+
+class HttpTarget:
+    """Requisições HTTP contra um servidor em execução (ex.: gunicorn local)"""
+
+    def __init__(self, base_url, store, timeout=30):
+        from django.urls import reverse
+
+        from roupadegala.testing import PASSWORD
+
+        self.name = base_url
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.token = None
+        status, _, body = self._send(
+            "post",
+            reverse("api_login"),
+            {"username": store.admin.user.username, "password": PASSWORD},
+        )
+        if status != 200:
+            raise RuntimeError(f"Login no servidor falhou (HTTP {status})")
+        self.token = json.loads(body)["access"]
+
+    def _send(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method.upper()
+        )
+        request.add_header("Accept", "application/json")
+        if data is not None:
+            request.add_header("Content-Type", "application/json")
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, error.read()
+
+    def request(self, method, path, body):
+        status, headers, _ = self._send(method, path, body)
+        return status, _queries(headers.get("Server-Timing"))
+
+
+class Results:
+    """Latências, status e queries por cenário"""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.queries = defaultdict(list)
+
+    def add(self, name, duration, status, queries):
+        self.durations[name].append(duration)
+        self.statuses[name][status] += 1
+        if queries is not None:
+            self.queries[name].append(queries)
+
+    def _summary(self, durations, statuses, queries, elapsed):
+        durations = sorted(durations)
+        errors = sum(n for code, n in statuses.items() if code is None or code >= 400)
+        return {
+            "requests": len(durations),
+            "errors": errors,
+            "status": {str(code): n for code, n in sorted(statuses.items(), key=str)},
+            "mean_ms": round(statistics.fmean(durations) * 1000, 2),
+            "p50_ms": round(percentile(durations, 50) * 1000, 2),
+            "p95_ms": round(percentile(durations, 95) * 1000, 2),
+            "p99_ms": round(percentile(durations, 99) * 1000, 2),
+            "max_ms": round(durations[-1] * 1000, 2),
+            "throughput_rps": round(len(durations) / elapsed, 2) if elapsed else None,
+            "db_queries": statistics.median(queries) if queries else None,
+        }
+
+    def report(self, elapsed):
+        endpoints = {
+            name: self._summary(
+                self.durations[name], self.statuses[name], self.queries[name], elapsed
+            )
+            for name in sorted(self.durations)
+        }
+        all_statuses = defaultdict(int)
+        for statuses in self.statuses.values():
+            for code, n in statuses.items():
+                all_statuses[code] += n
+        total = self._summary(
+            [d for values in self.durations.values() for d in values],
+            all_statuses,
+            [q for values in self.queries.values() for q in values],
+            elapsed,
+        )
+        total["duration_s"] = round(elapsed, 3)
+        return {"total": total, "endpoints": endpoints}
+
+
+def _timed(target, job):
+    name, method, path, body = job
+    start = time.perf_counter()
+    try:
+        status, queries = target.request(method, path, body)
+    except OSError:
+        status, queries = None, None
+    return name, time.perf_counter() - start, status, queries
+
+
+def _jobs(scenarios, store, total, rnd):
+    """
+    Monta as requisições antes da medição: as threads só fazem I/O e o
+    tempo de montar payloads (que lê o banco) não entra nas latências.
+    """
+    from . import workload
+
+    return [
+        (scenario.name, *scenario.request(store, rnd))
+        for scenario in workload.plan(scenarios, total, rnd)
+    ]
+
+
+def replay(target, store, scenarios, total, warmup=0, concurrency=1, seed=0):
+    """Executa a mistura de cenários e retorna o relatório por endpoint"""
+    rnd = random.Random(seed)
+    for job in _jobs(scenarios, store, warmup, rnd):
+        _timed(target, job)
+
+    results = Results()
+    jobs = _jobs(scenarios, store, total, rnd)
+    start = time.perf_counter()
+    if concurrency <= 1:
+        for job in jobs:
+            results.add(*_timed(target, job))
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for outcome in pool.map(lambda job: _timed(target, job), jobs):
+                results.add(*outcome)
+    return results.report(time.perf_counter() - start)
+
+
+def ensure_scratch_database():
+    """
+    Levanta RuntimeError se o banco configurado já tem dados: com --url a
+    loja sintética é gravada nele e fica lá depois da execução
+    """
+    from django.db import connection
+
+    from accounts.models import Person
+    from service_control.models import ServiceOrder
+
+    if Person.objects.exists() or ServiceOrder.objects.exists():
+        raise RuntimeError(
+            f"O banco '{connection.settings_dict['NAME']}' já tem pessoas ou OS. "
+            "Com --url a loja sintética é gravada no banco do servidor e não é "
+            "removida: use um banco de rascunho vazio."
+        )
+
+
+def build_store(orders, seed):
+    """Popula a loja sintética no banco atual, em lotes de até 1000 OS"""
+    from roupadegala.testing import StoreFactory
+
+    store = StoreFactory(seed=seed)
+    remaining = orders
+    while remaining > 0:
+        batch = min(remaining, 1000)
+        store.grow(orders=batch)
+        remaining -= batch
+    return store
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark de carga com uma loja sintética",
+    )
+    parser.add_argument("--orders", type=int, default=2000, help="OS na loja sintética")
+    parser.add_argument("--requests", type=int, default=500, help="Requisições medidas")
+    parser.add_argument(
+        "--warmup", type=int, default=20, help="Requisições de aquecimento"
+    )
+    parser.add_argument(
+        "--url",
+        help=(
+            "Servidor alvo (ex.: http://127.0.0.1:8000). Sem --url, usa o test "
+            "client. Com --url, a loja é criada no banco configurado em settings, "
+            "que precisa estar vazio."
+        ),
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=1, help="Threads simultâneas (apenas --url)"
+    )
+    parser.add_argument(
+        "--only", action="append", help="Executa apenas os cenários com esse prefixo"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: stdout)")
+    return parser.parse_args(argv)
+
+
+@contextmanager
+def test_database(enabled=True):
+    """Banco de teste descartável (como no test runner), se `enabled`"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    if not enabled:
+        yield
+        return
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def quiet_request_log():
+    """A linha de log por requisição atrapalharia a saída do benchmark"""
+    logging.getLogger("roupadegala.requests").setLevel(logging.WARNING)
+
+
+def run(args):
+    from django.conf import settings
+
+    from . import workload
+
+    scenarios = workload.select(workload.SCENARIOS, args.only)
+    quiet_request_log()
+
+    with test_database(enabled=not args.url):
+        if args.url:
+            ensure_scratch_database()
+        populate_start = time.perf_counter()
+        store = build_store(args.orders, args.seed)
+        populate_s = time.perf_counter() - populate_start
+
+        if args.url:
+            target = HttpTarget(args.url, store)
+            concurrency = args.concurrency
+        else:
+            target = TestClientTarget(store)
+            concurrency = 1
+
+        report = replay(
+            target,
+            store,
+            scenarios,
+            args.requests,
+            warmup=args.warmup,
+            concurrency=concurrency,
+            seed=args.seed,
+        )
+
+    return {
+        "config": {
+            "target": target.name,
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "orders": args.orders,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": concurrency,
+            "seed": args.seed,
+            "scenarios": {s.name: s.weight for s in scenarios},
+            "populate_s": round(populate_s, 3),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        },
+        **report,
+    }
+
+
+def main(argv=None):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "roupadegala.settings")
+    import django
+
+    django.setup()
+
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    result = json.dumps(run(args), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(result + "\n")
+    else:
+        print(result)
@@ -0,0 +1,89 @@
+"""
+Mistura de requisições do benchmark
+
+Cada cenário tem um peso (participação relativa no tráfego) e uma função que
+recebe a loja sintética e monta (método, caminho, corpo). Os pesos seguem o
+uso do balcão: listagens por fase dominam, seguidas de busca de cliente e
+atualização de OS.
+"""
+
+from django.urls import reverse
+
+
+class Scenario:
+    def __init__(self, name, weight, build, method="get"):
+        self.name = name
+        self.weight = weight
+        self.build = build
+        self.method = method
+
+    def request(self, store, rnd):
+        """Retorna (método, caminho, corpo) de uma requisição do cenário"""
+        path, body = self.build(store, rnd)
+        return self.method, path, body
+
+
+def _phase_list(phase):
+    def build(store, rnd):
+        return (
+            reverse("api_service_order_by_phase_v2", kwargs={"phase_name": phase}),
+            None,
+        )
+
+    return build
+
+
+def _client_search(store, rnd):
+    client = rnd.choice(store.clients)
+    return reverse("api_client_search") + f"?cpf={client.cpf}", None
+
+
+def _client_list_search(store, rnd):
+    client = rnd.choice(store.clients)
+    return reverse("api_client_list") + f"?search={client.name[:10]}", None
+
+
+def _order_update(store, rnd):
+    order = rnd.choice(store.orders["PENDENTE"])
+    path = reverse("api_service_order_update", kwargs={"order_id": order.id})
+    return path, store.order_update_payload(order)
+
+
+def _dashboard(store, rnd):
+    return reverse("api_service_order_dashboard"), None
+
+
+def _finance_summary(store, rnd):
+    return reverse("api_service_order_finance_summary"), None
+
+
+SCENARIOS = [
+    Scenario("phase_list[PENDENTE]", 18, _phase_list("PENDENTE")),
+    Scenario("phase_list[EM_PRODUCAO]", 8, _phase_list("EM_PRODUCAO")),
+    Scenario("phase_list[AGUARDANDO_RETIRADA]", 12, _phase_list("AGUARDANDO_RETIRADA")),
+    Scenario(
+        "phase_list[AGUARDANDO_DEVOLUCAO]", 10, _phase_list("AGUARDANDO_DEVOLUCAO")
+    ),
+    Scenario("phase_list[ATRASADO]", 6, _phase_list("ATRASADO")),
+    Scenario("phase_list[FINALIZADO]", 3, _phase_list("FINALIZADO")),
+    Scenario("dashboard", 8, _dashboard),
+    Scenario("client_search", 12, _client_search),
+    Scenario("client_list_search", 6, _client_list_search),
+    Scenario("order_update", 10, _order_update, method="put"),
+    Scenario("finance_summary", 7, _finance_summary),
+]
+
+
+def select(scenarios, only=None):
+    """Filtra os cenários pelo nome (prefixo), mantendo os pesos"""
+    if not only:
+        return list(scenarios)
+    selected = [s for s in scenarios if any(s.name.startswith(o) for o in only)]
+    if not selected:
+        raise ValueError(f"Nenhum cenário corresponde a {', '.join(only)}")
+    return selected
+
+
+def plan(scenarios, total, rnd):
+    """Sequência de `total` cenários sorteados conforme os pesos"""
+    return rnd.choices(scenarios, weights=[s.weight for s in scenarios], k=total)
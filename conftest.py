@@ -0,0 +1,96 @@
+"""
+Fixtures compartilhadas dos testes
+"""
+
+import os
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts import authentication
+from accounts.authentication import tokens_for_user
+from roupadegala.testing import StoreFactory
+from service_control import dimensions, phases
+
+# Quantidade de OS do lote inicial da loja sintética; o teste de crescimento
+# mede de novo depois de acrescentar o dobro. Com mil OS as listagens
+# paginadas já enchem a página, então os orçamentos valem para o volume de
+# produção
+QUERY_BUDGET_ORDERS = int(os.getenv("QUERY_BUDGET_ORDERS", "1000"))
+
+
+@pytest.fixture(autouse=True)
+def _reset_phase_registry():
+    """
+    Os registros de fases e de valores canônicos são por processo; cada
+    teste tem seu próprio banco
+    """
+    phases.invalidate()
+    dimensions.invalidate()
+    yield
+    phases.invalidate()
+    dimensions.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    """
+    O cache e a lista de revogação em memória sobrevivem ao rollback do
+    banco entre testes; uma revogação de outro teste valeria para um usuário
+    que reaproveitou o mesmo id
+    """
+    cache.clear()
+    authentication.revocations.clear()
+    yield
+
+
+@pytest.fixture
+def store_orders():
+    """Quantidade de OS do lote inicial da loja sintética"""
+    return QUERY_BUDGET_ORDERS
+
+
+@pytest.fixture
+def store(db, store_orders):
+    """
+    Loja sintética com um lote inicial de OS em todas as fases, já sem OS
+    vencidas à espera da recusa automática
+    """
+    factory = StoreFactory()
+    factory.grow(orders=store_orders)
+    factory.expire_overdue()
+    return factory
+
+
+@pytest.fixture
+def api_client():
+    """APIClient sem autenticação"""
+    return APIClient()
+
+
+@pytest.fixture
+def admin_client(store):
+    """APIClient autenticado com JWT (emitido como no login) como administrador"""
+    client = APIClient()
+    token = tokens_for_user(store.admin.user)
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token.access_token}")
+    return client
+
+
+@pytest.fixture
+def count_queries():
+    """
+    Executa a função e retorna (quantidade de queries, resultado). O cache é
+    limpo antes para que a medição não dependa de chamadas anteriores.
+    """
+
+    def run(func, *args, **kwargs):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+        return len(context.captured_queries), result
+
+    return run
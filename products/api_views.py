@@ -17,6 +17,9 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from roupadegala.cache import cached_response
+from roupadegala.conditional import ConditionalListMixin
+
 from .models import (
     Brand,
     Button,
@@ -124,7 +127,7 @@ class ProductDashboardAPIView(APIView):
     ],
     responses={200: ProductSerializer(many=True)},
 )
-class ProductListAPIView(ListAPIView):
+class ProductListAPIView(ConditionalListMixin, ListAPIView):
     permission_classes = [AllowAny]
     serializer_class = ProductSerializer
     queryset = Product.objects.all()
@@ -148,6 +151,13 @@ class ProductListAPIView(ListAPIView):
 
     def list(self, request, *args, **kwargs):
         """Sobrescreve o método list para converter tamanho de float para inteiro"""
+        validators = self.list_validators(
+            request, self.filter_queryset(self.get_queryset())
+        )
+        not_modified = self.not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+
         response = super().list(request, *args, **kwargs)
 
         # Converter tamanho de float para inteiro em cada produto
@@ -162,7 +172,7 @@ class ProductListAPIView(ListAPIView):
                 if "tamanho" in product and product["tamanho"] is not None:
                     product["tamanho"] = int(round(float(product["tamanho"])))
 
-        return response
+        return self.conditional(response, validators)
 
 
 class ProductUpdateAPIView(APIView):
@@ -633,6 +643,7 @@ class ColorListAPIView(APIView):
     permission_classes = [AllowAny]
     serializer_class = ColorCombinationSerializer
 
+    @cached_response("catalog")
     def get(self, request):
         """Lista todas as cores e combinações possíveis com intensidades"""
         from .models import Color, ColorCatalogue, ColorIntensity
@@ -786,6 +797,7 @@ class BrandListNoPaginationAPIView(ListAPIView):
             queryset = queryset.filter(description__icontains=search)
         return queryset
 
+    @cached_response("catalog")
     def get(self, request, *args, **kwargs):
         """Lista todas as marcas sem paginação"""
         queryset = self.get_queryset()
@@ -797,6 +809,7 @@ class ColorWithIntensityListAPIView(APIView):
     permission_classes = [AllowAny]
     serializer_class = ColorWithIntensitySerializer
 
+    @cached_response("catalog")
     def get(self, request):
         """Lista todas as combinações de cor e intensidade"""
         combos = (
@@ -842,6 +855,7 @@ class CatalogListAPIView(APIView):
     permission_classes = [AllowAny]
     serializer_class = CatalogListSerializer
 
+    @cached_response("catalog")
     def get(self, request):
         """Lista todos os catálogos (marcas, tecidos, etc.)"""
         catalogs = {
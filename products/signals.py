@@ -0,0 +1,43 @@
+"""
+Signals do app products
+"""
+
+from django.db.models.signals import post_delete, post_save
+
+from roupadegala import cache as response_cache
+
+from .models import (
+    Brand,
+    Button,
+    Color,
+    ColorCatalogue,
+    ColorIntensity,
+    Fabric,
+    Lapel,
+    Model,
+    Pattern,
+    ProductType,
+)
+
+# Tabelas de catálogo servidas pelas views com @cached_response("catalog")
+CATALOG_MODELS = (
+    Brand,
+    Button,
+    Color,
+    ColorCatalogue,
+    ColorIntensity,
+    Fabric,
+    Lapel,
+    Model,
+    Pattern,
+    ProductType,
+)
+
+
+def invalidate_catalog(sender, **kwargs):
+    response_cache.bump("catalog")
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog, sender=model)
+    post_delete.connect(invalidate_catalog, sender=model)
@@ -6,6 +6,8 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from products.api_views import BrandViewSet, ColorCatalogueViewSet, ColorIntensityViewSet, BrandListNoPaginationAPIView
 
+from .api_views import SlowRequestsAPIView
+
 router = DefaultRouter()
 router.register(r'brands', BrandViewSet, basename='brand')
 router.register(r'color-catalogues', ColorCatalogueViewSet, basename='color-catalogue')
@@ -17,4 +19,5 @@ urlpatterns = [
     path("v1/", include(router.urls)),
     path("v1/", include("products.api_urls")),
     path("v1/", include("service_control.api_urls")),
+    path("v1/metrics/slow-requests/", SlowRequestsAPIView.as_view(), name="api_metrics_slow_requests"),
 ]
@@ -0,0 +1,35 @@
+"""
+Views API do projeto RoupadeGala
+"""
+
+from drf_spectacular.utils import extend_schema
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.permissions import IsAdministrador
+
+from .middleware import slow_requests
+
+
+@extend_schema(
+    tags=["metrics"],
+    summary="Requisições mais lentas",
+    description="Lista as requisições mais lentas registradas por este processo (tempo total, queries, tempo de banco e tamanho da resposta). Apenas administradores.",
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "count": {"type": "integer"},
+                "results": {"type": "array", "items": {"type": "object"}},
+            },
+        },
+        403: {"description": "Usuário não autorizado"},
+    },
+)
+class SlowRequestsAPIView(APIView):
+    permission_classes = [IsAdministrador]
+
+    def get(self, request):
+        """Listar as requisições mais lentas"""
+        entries = slow_requests.entries()
+        return Response({"count": len(entries), "results": entries})
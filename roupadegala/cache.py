@@ -0,0 +1,126 @@
+"""
+Cache de respostas de views de leitura
+
+As respostas ficam no cache padrão (settings.CACHES) já renderizadas, com a
+chave montada a partir de um namespace versionado, do caminho e da query
+string. Para invalidar um namespace basta trocar sua versão (`bump`): as
+entradas antigas deixam de ser encontradas e expiram sozinhas. Valores
+calculados (não respostas) usam o mesmo versionamento via `data_key`.
+"""
+
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import transaction
+from django.http import HttpResponse
+
+# Vida das respostas em cache; a invalidação por versão cobre as mudanças,
+# o timeout só limita o espaço ocupado por entradas órfãs
+RESPONSE_TIMEOUT = 60 * 60
+
+# Backends em que cada processo tem o seu cache: versões trocadas e
+# revogações gravadas num worker não são vistas pelos demais
+LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def is_shared():
+    """Se o cache padrão é compartilhado entre os processos (workers)"""
+    return settings.CACHES[DEFAULT_CACHE_ALIAS]["BACKEND"] not in LOCAL_BACKENDS
+
+
+def _version_key(namespace):
+    return f"cache-version:{namespace}"
+
+
+def version(namespace):
+    """
+    Versão atual do namespace. A versão é um timestamp, não um contador:
+    se a chave for descartada pelo cache, a nova versão não coincide com
+    nenhuma anterior.
+    """
+    key = _version_key(namespace)
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, time.time_ns(), None)
+        current = cache.get(key)
+    return current
+
+
+def versions(namespaces):
+    """Versões atuais de vários namespaces, lidas com um único get_many"""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    return [
+        found.get(key) or version(namespace) for key, namespace in zip(keys, namespaces)
+    ]
+
+
+def _set_version(namespace):
+    cache.set(_version_key(namespace), time.time_ns(), None)
+
+
+def bump(*namespaces):
+    """
+    Invalida as respostas dos namespaces. Troca a versão já e de novo após o
+    commit, para que uma leitura durante a transação não deixe em cache
+    dados anteriores a ela.
+    """
+    for namespace in namespaces:
+        _set_version(namespace)
+        transaction.on_commit(functools.partial(_set_version, namespace))
+
+
+def response_key(namespace, request):
+    query = request.META.get("QUERY_STRING", "")
+    digest = hashlib.md5(
+        f"{request.path}?{query}".encode(), usedforsecurity=False
+    ).hexdigest()
+    return f"response:{namespace}:{version(namespace)}:{digest}"
+
+
+def data_key(namespace, *parts):
+    """Chave versionada para valores calculados (não respostas) do namespace"""
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f"data:{namespace}:{version(namespace)}:{digest}"
+
+
+def cached_response(namespace, timeout=RESPONSE_TIMEOUT):
+    """
+    Decorator para o `get` de views DRF cujas respostas não dependem do
+    usuário. Só respostas 200 são guardadas, já renderizadas (corpo e
+    Content-Type); autenticação e permissões continuam sendo verificadas
+    antes do handler.
+    """
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = response_key(namespace, request)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code == 200:
+
+                def store(rendered):
+                    cache.set(
+                        key, (rendered.content, rendered["Content-Type"]), timeout
+                    )
+
+                if getattr(response, "is_rendered", True):
+                    store(response)
+                else:
+                    response.add_post_render_callback(store)
+            return response
+
+        return wrapper
+
+    return decorator
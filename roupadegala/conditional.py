@@ -0,0 +1,122 @@
+"""
+GET condicional (ETag / Last-Modified) para listagens
+
+O validador de uma listagem sai de uma única query de agregação sobre o
+queryset já filtrado: o maior carimbo (date_updated, ou date_created para
+registros nunca atualizados) e a contagem, dos registros e das relações que
+aparecem na resposta. Cada relação é agregada numa subquery própria sobre a
+tabela relacionada, então o custo soma por relação em vez de multiplicar as
+linhas com os JOINs de todas elas. Junto com a URL completa (filtros e paginação) e
+valores extras (ex.: a data de hoje, para fases calculadas por data), isso
+forma o ETag. Se o cliente manda If-None-Match com o ETag atual, a view
+responde 304 sem serializar nada.
+
+A detecção de mudanças depende dos carimbos: BaseModel.save() carimba
+date_updated em toda gravação de registro existente; UPDATEs em lote que
+alteram a resposta precisam passar date_updated explicitamente.
+"""
+
+import hashlib
+from typing import NamedTuple, Optional
+
+from django.db.models import Count, F, Func, IntegerField, Max, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _changed_at(prefix=""):
+    return Coalesce(f"{prefix}date_updated", f"{prefix}date_created")
+
+
+def _related_stats(queryset, path):
+    """
+    Subqueries (maior carimbo, contagem) dos registros da relação `path`
+    alcançados pelo queryset, sem GROUP BY (Func em vez de Max/Count)
+    """
+    model = queryset.model
+    for name in path.split("__"):
+        model = model._meta.get_field(name).related_model
+    rows = model._default_manager.filter(
+        pk__in=queryset.order_by().values(f"{path}__pk")
+    ).order_by()
+    changed_at = rows.values(changed_at=Func(_changed_at(), function="MAX"))
+    total = rows.values(
+        total=Func(F("pk"), function="COUNT", output_field=IntegerField())
+    )
+    return Subquery(changed_at), Subquery(total)
+
+
+class ListValidators(NamedTuple):
+    etag: str
+    last_modified: Optional[object] = None  # datetime
+
+
+class ConditionalListMixin:
+    """
+    Mixin para views de listagem. Uso dentro do handler:
+
+        validators = self.list_validators(request, queryset)
+        not_modified = self.not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+        ...
+        return self.conditional(Response(data), validators)
+
+    `conditional_related`: caminhos de relações (ex.: "renter", "items")
+    cujas mudanças também alteram a resposta.
+    """
+
+    conditional_related = ()
+
+    def list_validators(self, request, queryset, related=None, extra=()):
+        related = self.conditional_related if related is None else related
+        aggregates = {
+            "changed_at": Max(_changed_at()),
+            "total": Count("pk", distinct=True),
+        }
+        for index, path in enumerate(related):
+            # Subqueries não correlacionadas: o banco as avalia uma vez, e o
+            # Max só as coloca dentro da agregação
+            changed_at, total = _related_stats(queryset, path)
+            aggregates[f"changed_at_{index}"] = Max(changed_at)
+            aggregates[f"total_{index}"] = Max(total)
+        stats = queryset.order_by().aggregate(**aggregates)
+
+        changed = [
+            value
+            for key, value in stats.items()
+            if key.startswith("changed_at") and value is not None
+        ]
+        fingerprint = "|".join(
+            [request.get_full_path()]
+            + [f"{key}={stats[key]!r}" for key in sorted(stats)]
+            + [repr(value) for value in extra]
+        )
+        digest = hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest()
+        return ListValidators(quote_etag(digest), max(changed) if changed else None)
+
+    def not_modified(self, request, validators):
+        """
+        Resposta 304 se o If-None-Match do cliente bate com o ETag atual;
+        None caso contrário. If-Modified-Since sozinho não gera 304: o
+        Last-Modified tem resolução de segundos e não cobre os valores
+        extras do validador.
+        """
+        if not request.META.get("HTTP_IF_NONE_MATCH"):
+            return None
+        response = get_conditional_response(request, etag=validators.etag)
+        if response is not None:
+            self._set_headers(response, validators)
+        return response
+
+    def conditional(self, response, validators):
+        """Acrescenta ETag e Last-Modified a uma resposta 200"""
+        if response.status_code == 200:
+            self._set_headers(response, validators)
+        return response
+
+    def _set_headers(self, response, validators):
+        response["ETag"] = validators.etag
+        if validators.last_modified is not None:
+            response["Last-Modified"] = http_date(validators.last_modified.timestamp())
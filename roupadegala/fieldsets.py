@@ -0,0 +1,272 @@
+"""
+Campos esparsos (?fields= / ?expand=) para listagens DRF
+
+`fields` escolhe os campos da resposta, separados por vírgula; caminhos com
+ponto descem em serializers aninhados (`renter.name`). `expand` escolhe as
+relações devolvidas como objeto: as demais saem só com a chave primária
+(lista de chaves em relações múltiplas). Sem `expand`, toda relação é
+expandida, como na resposta completa; uma relação pedida com subcampos
+(`renter.name`) é sempre expandida.
+
+O plano de consulta (select_related, Prefetch e only()) sai do mesmo
+serializer já podado, então campos e relações não pedidos não são buscados.
+`prefetch_for_serializer` aplica esse plano a qualquer serializer, podado
+ou não, e evita o N+1 das relações aninhadas.
+Campos calculados (SerializerMethodField) declaram as colunas que usam em
+`Meta.sparse_sources` (caminhos com "__"); sem a declaração, todas as
+colunas do modelo daquele nível são carregadas.
+"""
+
+from typing import NamedTuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def parse_paths(value):
+    """'a,b.c,b.d' -> {"a": {}, "b": {"c": {}, "d": {}}}"""
+    tree = {}
+    for path in value.split(","):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for part in path.split("."):
+            node = node.setdefault(part.strip(), {})
+    return tree
+
+
+def _nested(field):
+    """Serializer aninhado de um campo (o filho, em many=True), ou None"""
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+def _pk_field(field):
+    kwargs = {"read_only": True}
+    if field.source != field.field_name:
+        kwargs["source"] = field.source
+    if isinstance(field, serializers.ListSerializer):
+        kwargs["many"] = True
+    return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+def _unknown(names, path):
+    return serializers.ValidationError(
+        {"error": "Campos desconhecidos: " + ", ".join(path + n for n in sorted(names))}
+    )
+
+
+def prune(serializer, fields=None, expand=None, path=""):
+    """
+    Poda o serializer (já instanciado) conforme as árvores de `parse_paths`
+    de `fields` e `expand`; None em qualquer uma significa "tudo". Levanta
+    ValidationError para nomes que não existem.
+    """
+    serializer = _nested(serializer)
+    declared = serializer.fields
+
+    if fields:
+        unknown = set(fields) - set(declared)
+        if unknown:
+            raise _unknown(unknown, path)
+        for name in list(declared):
+            if name not in fields:
+                del declared[name]
+    if expand:
+        unknown = {
+            name
+            for name in expand
+            if name not in declared and (not fields or name in fields)
+        }
+        if unknown:
+            raise _unknown(unknown, path)
+
+    for name, field in list(declared.items()):
+        nested = _nested(field)
+        if nested is None:
+            continue
+        subfields = fields.get(name) if fields else None
+        if subfields or expand is None or name in expand:
+            prune(
+                nested,
+                subfields or None,
+                None if expand is None else expand.get(name, {}),
+                path=f"{path}{name}.",
+            )
+        else:
+            declared[name] = _pk_field(field)
+    return serializer
+
+
+class _Relation(NamedTuple):
+    model: object
+    many: bool
+    remote_field: str = None  # FK no modelo relacionado (relações reversas)
+
+
+def _relation(model, name):
+    """Relação `name` (campo ou accessor reverso) do modelo, ou None"""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        field = next(
+            (
+                rel
+                for rel in model._meta.related_objects
+                if rel.get_accessor_name() == name
+            ),
+            None,
+        )
+    if field is None or not field.is_relation:
+        return None
+    many = field.many_to_many or field.one_to_many
+    remote = field.field.name if field.auto_created and field.one_to_many else None
+    return _Relation(field.related_model, many, remote)
+
+
+def _all_columns(model, prefix):
+    return [prefix + f.name for f in model._meta.concrete_fields]
+
+
+class QueryPlan:
+    """select_related, prefetch_related e only() para um queryset"""
+
+    def __init__(self):
+        self.select_related = []
+        self.prefetch_related = []
+        self.only = []
+
+    def _add(self, bucket, value):
+        if value not in bucket:
+            bucket.append(value)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset.only(*self.only)
+
+    def add_path(self, model, prefix, attrs):
+        """
+        Colunas e relações usadas por um caminho de atributos (source de um
+        campo ou entrada de `sparse_sources`) a partir de `model`
+        """
+        for index, attr in enumerate(attrs):
+            relation = _relation(model, attr)
+            if relation is None:
+                if attr in {f.name for f in model._meta.concrete_fields}:
+                    self._add(self.only, prefix + attr)
+                else:
+                    # Propriedade ou método do modelo: colunas desconhecidas
+                    for column in _all_columns(model, prefix):
+                        self._add(self.only, column)
+                return
+            if relation.many:
+                self._add(self.prefetch_related, prefix + attr)
+                return
+            if index == len(attrs) - 1:
+                self._add(self.only, prefix + attr)
+                return
+            self._add(self.select_related, prefix + attr)
+            model = relation.model
+            prefix = f"{prefix}{attr}__"
+
+    def add_serializer(self, serializer, model, prefix=""):
+        serializer = _nested(serializer)
+        self._add(self.only, prefix + model._meta.pk.name)
+        sources = getattr(getattr(serializer, "Meta", None), "sparse_sources", {})
+
+        for name, field in serializer.fields.items():
+            if name in sources:
+                for source in sources[name]:
+                    self.add_path(model, prefix, source.split("__"))
+                continue
+            if field.source == "*":
+                # Campo calculado sobre o objeto inteiro (ex.: SerializerMethodField)
+                for column in _all_columns(model, prefix):
+                    self._add(self.only, column)
+                continue
+
+            nested = _nested(field)
+            relation = (
+                _relation(model, field.source) if len(field.source_attrs) == 1 else None
+            )
+            if nested is not None and relation is not None:
+                lookup = prefix + field.source
+                if relation.many:
+                    child = QueryPlan()
+                    child.add_serializer(nested, relation.model)
+                    if relation.remote_field:
+                        child._add(child.only, relation.remote_field)
+                    queryset = child.apply(relation.model._default_manager.all())
+                    self._add(self.prefetch_related, Prefetch(lookup, queryset))
+                else:
+                    self._add(self.only, lookup)
+                    self._add(self.select_related, lookup)
+                    self.add_serializer(nested, relation.model, f"{lookup}__")
+                continue
+
+            if isinstance(field, serializers.ManyRelatedField) and relation:
+                queryset = relation.model._default_manager.only(
+                    relation.model._meta.pk.name,
+                    *([relation.remote_field] if relation.remote_field else []),
+                )
+                lookup = prefix + field.source
+                self._add(self.prefetch_related, Prefetch(lookup, queryset))
+                continue
+
+            self.add_path(model, prefix, field.source_attrs)
+        return self
+
+
+def query_plan(serializer):
+    """Plano de consulta para o serializer (podado ou não)"""
+    child = _nested(serializer)
+    return QueryPlan().add_serializer(child, child.Meta.model)
+
+
+def prefetch_for_serializer(queryset, serializer):
+    """
+    Aplica ao queryset o plano de consulta do serializer (classe ou
+    instância): select_related nas relações simples aninhadas e Prefetch,
+    com o próprio plano, nas múltiplas. O número de queries por página
+    passa a depender só da profundidade do serializer.
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+    return query_plan(serializer).apply(queryset)
+
+
+class SparseFieldsetMixin:
+    """
+    Mixin para views genéricas (ListAPIView) com ?fields= e ?expand=.
+    No get_queryset, `self.sparse_queryset(queryset)` aplica o plano de
+    consulta dos campos pedidos (de todos, sem os parâmetros);
+    get_serializer devolve o serializer podado.
+    """
+
+    def sparse_params(self):
+        params = self.request.query_params
+        fields = params.get("fields")
+        expand = params.get("expand")
+        return (
+            parse_paths(fields) if fields is not None else None,
+            parse_paths(expand) if expand is not None else None,
+        )
+
+    def sparse_requested(self):
+        params = self.request.query_params
+        return "fields" in params or "expand" in params
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.sparse_requested():
+            prune(serializer, *self.sparse_params())
+        return serializer
+
+    def sparse_queryset(self, queryset):
+        return prefetch_for_serializer(queryset, self.get_serializer())
@@ -0,0 +1,302 @@
+"""
+Middlewares do projeto RoupadeGala
+"""
+
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+logger = logging.getLogger("roupadegala.requests")
+
+
+class QueryTimer:
+    """
+    Wrapper de execução (connection.execute_wrapper) que conta as queries e
+    acumula o tempo gasto no banco durante a requisição.
+    """
+
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class SlowRequestLog:
+    """Guarda em memória as N requisições mais lentas deste processo"""
+
+    def __init__(self, size):
+        self.size = size
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        if self.size <= 0:
+            return
+        item = (entry["duration_ms"], next(self._counter), entry)
+        with self._lock:
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif item[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def entries(self):
+        """Requisições registradas, da mais lenta para a mais rápida"""
+        with self._lock:
+            items = list(self._heap)
+        return [entry for _, _, entry in sorted(items, reverse=True)]
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+
+
+def _metrics_settings():
+    config = {"ENABLED": True, "LOG": True, "SLOW_REQUESTS": 50}
+    config.update(getattr(settings, "REQUEST_METRICS", {}))
+    return config
+
+
+slow_requests = SlowRequestLog(_metrics_settings()["SLOW_REQUESTS"])
+
+
+class RequestMetricsMiddleware:
+    """
+    Mede, por requisição, o tempo total, a quantidade de queries, o tempo gasto
+    no banco e o tamanho da resposta. Os valores vão para o header
+    Server-Timing, para uma linha de log em JSON no logger
+    "roupadegala.requests" e para o registro das requisições mais lentas.
+
+    Deve ficar no topo de MIDDLEWARE para medir a requisição inteira.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = _metrics_settings()
+        self.enabled = config["ENABLED"]
+        self.log = config["LOG"]
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        start = time.perf_counter()
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+
+        if response.streaming:
+            # O corpo ainda não foi gerado: as queries do streaming contam para
+            # a requisição, e a medição termina quando o servidor consome (ou
+            # fecha) o iterador. Os headers já foram enviados nesse momento,
+            # então não há Server-Timing
+            response.streaming_content = MeasuredStream(
+                response.streaming_content,
+                lambda size: self.record(request, response, timer, start, size),
+                stack,
+            )
+            return response
+
+        stack.close()
+        entry = self.record(request, response, timer, start, len(response.content))
+        duration_ms, db_ms = entry["duration_ms"], entry["db_ms"]
+        response["Server-Timing"] = (
+            f'app;dur={duration_ms}, db;dur={db_ms};desc="{timer.count} queries"'
+        )
+        return response
+
+    def record(self, request, response, timer, start, response_bytes):
+        """Registra as medidas da requisição no log e nas mais lentas"""
+        resolver_match = getattr(request, "resolver_match", None)
+        user = getattr(request, "user", None)
+        entry = {
+            "method": request.method,
+            "path": request.path,
+            "route": resolver_match.route if resolver_match else None,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            "db_queries": timer.count,
+            "db_ms": round(timer.duration * 1000, 2),
+            "response_bytes": response_bytes,
+            "user_id": user.pk if user is not None and user.is_authenticated else None,
+        }
+        slow_requests.add(entry)
+        if self.log:
+            logger.info(json.dumps(entry))
+        return entry
+
+
+class MeasuredStream:
+    """
+    Iterador sobre o corpo de uma resposta em streaming que mantém os
+    wrappers de execução ativos enquanto o corpo é gerado. Ao terminar (ou
+    ao ser fechado pelo servidor) remove os wrappers e chama `finish` com o
+    total de bytes enviados.
+    """
+
+    def __init__(self, content, finish, stack):
+        self.content = iter(content)
+        self.finish = finish
+        self.stack = stack
+        self.size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self.content)
+        except StopIteration:
+            self.close()
+            raise
+        self.size += len(chunk)
+        return chunk
+
+    def close(self):
+        finish, self.finish = self.finish, None
+        if finish is not None:
+            self.stack.close()
+            finish(self.size)
+
+
+def _compression_settings():
+    config = {"MIN_SIZE": 1024, "GZIP_LEVEL": 6, "BROTLI_QUALITY": 4}
+    config.update(getattr(settings, "RESPONSE_COMPRESSION", {}))
+    return config
+
+
+# Content-Types que vale a pena comprimir (planilhas e imagens já são)
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def _accepted_encodings(header):
+    """Codificações aceitas em Accept-Encoding (ignora as com q=0)"""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in sequence:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Comprime respostas com brotli (se o pacote estiver instalado) ou gzip,
+    conforme o Accept-Encoding do cliente. Respostas menores que
+    RESPONSE_COMPRESSION["MIN_SIZE"] bytes, de tipos não compressíveis ou já
+    codificadas passam direto; respostas em streaming são comprimidas em
+    fluxo. Como o GZipMiddleware do Django, enfraquece o ETag (W/).
+
+    Fica logo abaixo de RequestMetricsMiddleware, que assim registra o
+    tamanho trafegado.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = _compression_settings()
+        self.min_size = config["MIN_SIZE"]
+        self.gzip_level = config["GZIP_LEVEL"]
+        self.brotli_quality = config["BROTLI_QUALITY"]
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        content_type = response.get("Content-Type", "").lower()
+        if (
+            response.status_code in (204, 304)
+            or response.has_header("Content-Encoding")
+            or not content_type.startswith(COMPRESSIBLE_TYPES)
+        ):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        accepted = _accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            return response
+
+        if response.streaming:
+            if encoding == "br":
+                response.streaming_content = _brotli_sequence(
+                    response.streaming_content, self.brotli_quality
+                )
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content
+                )
+            del response["Content-Length"]
+        else:
+            content = response.content
+            if len(content) < self.min_size:
+                return response
+            if encoding == "br":
+                compressed = brotli.compress(content, quality=self.brotli_quality)
+            else:
+                compressed = gzip.compress(
+                    content, compresslevel=self.gzip_level, mtime=0
+                )
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,70 @@
+"""
+Renderer JSON da API
+
+Usa orjson quando instalado, com a mesma saída do JSONRenderer do DRF para
+os tipos que a API devolve: datas e horas passam pelo encoder do DRF (UTC
+como "Z"), Decimal vira número, chaves não-string viram string e U+2028/
+U+2029 são escapados. Sem orjson, ou em casos que ele não cobre (indentação
+pedida pelo cliente, inteiros acima de 64 bits, UNICODE_JSON desligado), o
+render é o do DRF.
+"""
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    if orjson is not None:
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            content = orjson.dumps(
+                data, default=encoders.JSONEncoder().default, option=self.options
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Mesmo escape do DRF, para a saída continuar sendo JavaScript válido
+        return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+# Tamanho aproximado dos blocos emitidos por stream_json_array
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def stream_json_array(rows, renderer=None):
+    """
+    Gera um array JSON a partir de um iterável de itens, renderizando um
+    item por vez e emitindo blocos de ~STREAM_BUFFER_SIZE bytes. O resultado
+    concatenado é igual ao render da lista inteira.
+    """
+    renderer = renderer or FastJSONRenderer()
+    buffer = bytearray(b"[")
+    separator = b""
+    for row in rows:
+        buffer += separator
+        buffer += renderer.render(row)
+        separator = b","
+        if len(buffer) >= STREAM_BUFFER_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]"
+    yield bytes(buffer)
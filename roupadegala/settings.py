@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "roupadegala.middleware.RequestMetricsMiddleware",  # Deve ser o primeiro
+    "roupadegala.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -64,6 +66,22 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Métricas por requisição (tempo, queries, tempo de banco, tamanho da resposta)
+REQUEST_METRICS = {
+    "ENABLED": os.getenv("REQUEST_METRICS_ENABLED", "True") == "True",
+    "LOG": os.getenv("REQUEST_METRICS_LOG", "True") == "True",
+    # Quantidade de requisições mais lentas mantidas em memória (0 desativa)
+    "SLOW_REQUESTS": int(os.getenv("REQUEST_METRICS_SLOW_REQUESTS", "50")),
+}
+
+# Compressão de respostas (brotli se instalado, senão gzip)
+RESPONSE_COMPRESSION = {
+    # Respostas menores que isso (bytes) não são comprimidas
+    "MIN_SIZE": int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024")),
+    "GZIP_LEVEL": int(os.getenv("RESPONSE_COMPRESSION_GZIP_LEVEL", "6")),
+    "BROTLI_QUALITY": int(os.getenv("RESPONSE_COMPRESSION_BROTLI_QUALITY", "4")),
+}
+
 ROOT_URLCONF = "roupadegala.urls"
 
 # Templates não são mais necessários - API REST pura
@@ -122,6 +140,26 @@ DATABASES = {
     }
 }
 
+# Cache: locmem por padrão (por processo). Com vários workers, usar um
+# backend compartilhado: CACHE_BACKEND=file (CACHE_LOCATION = diretório) ou
+# redis (CACHE_LOCATION = redis://host:6379/0, requer o pacote redis);
+# também aceita o caminho completo de outro backend do Django.
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        "LOCATION": os.getenv("CACHE_LOCATION", "roupadegala"),
+        "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", "300")),
+        "KEY_PREFIX": "roupadegala",
+    }
+}
+
 
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
 
@@ -172,7 +210,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -180,7 +218,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "roupadegala.pagination.StandardResultsSetPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "roupadegala.renderers.FastJSONRenderer",
     ],
     "DEFAULT_PARSER_CLASSES": [
         "rest_framework.parsers.JSONParser",
@@ -213,7 +251,7 @@ SIMPLE_JWT = {
     "USER_AUTHENTICATION_RULE": "rest_framework_simplejwt.authentication.default_user_authentication_rule",
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
-    "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
+    "TOKEN_USER_CLASS": "accounts.authentication.ClaimsUser",
     "JTI_CLAIM": "jti",
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(hours=1),
@@ -257,5 +295,24 @@ SPECTACULAR_SETTINGS = {
         {"name": "accounts", "description": "Gerenciamento de contas e usuários"},
         {"name": "products", "description": "Gerenciamento de produtos e estoque"},
         {"name": "service-orders", "description": "Gerenciamento de ordens de serviço"},
+        {"name": "metrics", "description": "Métricas de desempenho da API"},
     ],
 }
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "plain": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "plain"},
+    },
+    "loggers": {
+        "roupadegala.requests": {
+            "handlers": ["console"],
+            "level": os.getenv("REQUEST_METRICS_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
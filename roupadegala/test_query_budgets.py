@@ -0,0 +1,594 @@
+"""
+Orçamento de queries por endpoint
+
+Cada endpoint de accounts, products e service_control declara quantas
+queries pode executar sobre a loja sintética (fixture `store`). O teste de
+crescimento mede de novo depois de triplicar a loja: a quantidade de queries
+não pode depender do volume de dados. Endpoints com N+1 conhecido ficam
+marcados com xfail estrito, para que a correção obrigue a atualizar a lista.
+"""
+
+import importlib.util
+import io
+from datetime import date, timedelta
+from unittest import mock
+
+import pandas as pd
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts import authentication
+from accounts.authentication import tokens_for_user
+from roupadegala.testing import PASSWORD
+
+
+@pytest.fixture(autouse=True)
+def _shared_cache():
+    """
+    Orçamentos medidos como em produção com vários workers, que usa cache
+    compartilhado: leituras autenticadas só pelos claims do token
+    """
+    with mock.patch.object(authentication, "is_shared", return_value=True):
+        yield
+
+
+class Endpoint:
+    """
+    Declaração de um endpoint: `url` e `data` recebem a loja sintética e
+    retornam a URL e o corpo da requisição (a URL é montada antes, então
+    `data` pode usar `store.last_order`). `grows` marca um N+1 conhecido.
+    `fresh_token` usa um token novo a cada medição (ex.: logout o revoga).
+    """
+
+    def __init__(
+        self,
+        name,
+        url,
+        budget,
+        method="get",
+        data=None,
+        format="json",
+        status=200,
+        grows=False,
+        anonymous=False,
+        requires=None,
+        fresh_token=False,
+    ):
+        self.name = name
+        self.url = url
+        self.budget = budget
+        self.method = method
+        self.data = data
+        self.format = format
+        self.status = status
+        self.grows = grows
+        self.anonymous = anonymous
+        self.requires = requires
+        self.fresh_token = fresh_token
+
+    def request(self, client, store):
+        url = self.url(store)
+        kwargs = {}
+        if self.data is not None:
+            kwargs["data"] = self.data(store)
+            if self.format:
+                kwargs["format"] = self.format
+        return getattr(client, self.method)(url, **kwargs)
+
+
+def _url(name, **kwargs):
+    return lambda store: reverse(name, kwargs=kwargs or None)
+
+
+def _order_url(name, phase):
+    def url(store):
+        store.last_order = store.take_order(phase)
+        return reverse(name, kwargs={"order_id": store.last_order.id})
+
+    return url
+
+
+def _refresh_token(store):
+    return {"refresh": str(RefreshToken.for_user(store.admin.user))}
+
+
+def _new_cpf(store):
+    return store._cpf()
+
+
+def _rename(prefix):
+    # Um nome novo a cada medição: a troca de nome de quem atende OS
+    # invalida os meses dessas OS no cache do dashboard
+    return lambda store: {"name": f"{prefix} {store._next()}"}
+
+
+def _stock_file(store):
+    buffer = io.BytesIO()
+    pd.DataFrame(
+        [
+            {
+                "Tipo": "Paletó",
+                "ID": f"X{store._next():06d}",
+                "Nome do produto": "PALETÓ TESTE",
+                "Marca": "BRAND A",
+                "Material": "LÃ",
+                "Cor": "AZUL",
+                "Intensidade de cor": "ESCURO",
+                "Tamanho": 50,
+            }
+            for _ in range(2)
+        ]
+    ).to_excel(buffer, index=False)
+    return {
+        "excel_file": SimpleUploadedFile(
+            "estoque.xlsx",
+            buffer.getvalue(),
+            content_type=(
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            ),
+        )
+    }
+
+
+# Orçamento das listagens por fase (V1 e V2): fase -> (queries, N+1 conhecido).
+# A V2 faz queries por OS da página: com a página cheia o total não cresce
+# com o volume, mas o orçamento acompanha o tamanho da página
+PHASE_LIST_BUDGETS = {
+    "PENDENTE": (6, False),
+    "EM_PRODUCAO": (6, False),
+    "AGUARDANDO_RETIRADA": (90, True),
+    "AGUARDANDO_DEVOLUCAO": (6, False),
+    "FINALIZADO": (6, False),
+    "RECUSADA": (6, False),
+    "ATRASADO": (6, False),
+}
+PHASE_LIST_V2_BUDGETS = {
+    "PENDENTE": (66, False),
+    "EM_PRODUCAO": (66, False),
+    "AGUARDANDO_RETIRADA": (148, True),
+    "AGUARDANDO_DEVOLUCAO": (66, False),
+    "FINALIZADO": (66, False),
+    "RECUSADA": (66, False),
+    "ATRASADO": (66, False),
+}
+
+ENDPOINTS = [
+    # accounts
+    Endpoint(
+        "auth_login",
+        _url("api_login"),
+        budget=3,
+        method="post",
+        data=lambda store: {
+            "username": store.admin.user.username,
+            "password": PASSWORD,
+        },
+        anonymous=True,
+    ),
+    Endpoint(
+        "auth_register",
+        _url("api_register"),
+        budget=7,
+        method="post",
+        data=lambda store: {
+            "username": (cpf := _new_cpf(store)),
+            "cpf": cpf,
+            "name": "NOVO USUÁRIO",
+            "password": "Senha@Forte123",
+            "password_confirm": "Senha@Forte123",
+            "email": f"{cpf}@teste.com",
+            "phone": "(11) 97777-6666",
+        },
+        anonymous=True,
+    ),
+    Endpoint(
+        "auth_refresh",
+        _url("api_refresh"),
+        budget=7,
+        method="post",
+        data=_refresh_token,
+        anonymous=True,
+    ),
+    Endpoint(
+        "auth_logout",
+        _url("api_logout"),
+        budget=8,
+        method="post",
+        data=_refresh_token,
+        fresh_token=True,
+    ),
+    Endpoint("auth_me", _url("api_user_me"), budget=3),
+    Endpoint(
+        "auth_me_update",
+        _url("api_user_self_update"),
+        budget=7,
+        method="put",
+        data=_rename("ADMIN ATUALIZADO"),
+    ),
+    Endpoint(
+        "auth_password_reset",
+        _url("api_password_reset"),
+        budget=3,
+        method="post",
+        data=lambda store: {"old_password": PASSWORD, "new_password": PASSWORD},
+    ),
+    Endpoint(
+        "city_search",
+        lambda store: reverse("api_city_search") + "?q=SAO",
+        budget=1,
+        anonymous=True,
+    ),
+    Endpoint(
+        "employee_register",
+        _url("api_employee_register"),
+        budget=8,
+        method="post",
+        data=lambda store: {
+            "name": "NOVO ATENDENTE",
+            "cpf": (cpf := _new_cpf(store)),
+            "email": f"{cpf}@loja.com",
+            "phone": "(11) 96666-5555",
+            "role": "ATENDENTE",
+        },
+    ),
+    Endpoint("employee_list", _url("api_employee_list"), budget=7),
+    Endpoint(
+        "employee_toggle_status",
+        _url("api_employee_toggle_status"),
+        budget=4,
+        method="post",
+        data=lambda store: {"person_id": store.attendants[-1].id, "active": True},
+    ),
+    Endpoint(
+        "employee_update",
+        lambda store: reverse(
+            "api_employee_update", kwargs={"person_id": store.attendants[0].id}
+        ),
+        budget=8,
+        method="put",
+        data=_rename("ATENDENTE ATUALIZADO"),
+    ),
+    Endpoint(
+        "client_register",
+        _url("api_client_register"),
+        budget=12,
+        method="post",
+        data=lambda store: {
+            "nome": "CLIENTE NOVO",
+            "cpf": _new_cpf(store),
+            "email": "novo@cliente.com",
+            "telefone": "(11) 95555-4444",
+            "cidade": "SAO PAULO",
+            "rua": "RUA A",
+            "numero": "1",
+        },
+    ),
+    # Queries por cliente da página (contatos e endereços), limitadas pela
+    # paginação
+    Endpoint("client_list", _url("api_client_list"), budget=153),
+    Endpoint(
+        "client_search",
+        lambda store: reverse("api_client_search") + f"?cpf={store.clients[0].cpf}",
+        budget=4,
+    ),
+    # products
+    Endpoint("product_dashboard", _url("api_product_dashboard"), budget=8),
+    Endpoint("product_list", _url("api_product_list"), budget=3, anonymous=True),
+    Endpoint(
+        "product_update",
+        lambda store: reverse(
+            "api_product_update", kwargs={"product_id": store.products[0].id}
+        ),
+        budget=3,
+        method="put",
+        data=lambda store: {"nome_produto": "PRODUTO ATUALIZADO"},
+    ),
+    Endpoint(
+        "product_stock_update",
+        _url("api_product_stock_update"),
+        budget=5,
+        method="post",
+        data=_stock_file,
+        format="multipart",
+    ),
+    Endpoint(
+        "product_qr_code",
+        lambda store: reverse(
+            "api_product_qr_code", kwargs={"product_id": store.products[0].id}
+        ),
+        budget=4,
+        requires="PIL",
+    ),
+    Endpoint("color_list", _url("api_color_list"), budget=8),
+    Endpoint(
+        "color_with_intensity_list", _url("api_color_with_intensity_list"), budget=1
+    ),
+    Endpoint("colors_with_intensities", _url("colors-with-intensities"), budget=1),
+    Endpoint(
+        "temporary_product_create",
+        _url("api_temporary_product_create"),
+        budget=2,
+        method="post",
+        data=lambda store: {"product_type": "paleto", "size": "50"},
+        status=201,
+    ),
+    Endpoint("catalog_list", _url("api_catalog_list"), budget=8, anonymous=True),
+    # service_control - eventos
+    Endpoint(
+        "event_create",
+        _url("api_event_create"),
+        budget=3,
+        method="post",
+        data=lambda store: {
+            "name": "FORMATURA",
+            "event_date": str(date.today() + timedelta(days=60)),
+        },
+        status=201,
+    ),
+    Endpoint(
+        "event_update",
+        lambda store: reverse(
+            "api_event_update", kwargs={"event_id": store.events[0].id}
+        ),
+        budget=26,
+        grows=True,
+        method="put",
+        data=lambda store: {"description": "Atualizado"},
+    ),
+    Endpoint(
+        "event_add_participants",
+        lambda store: reverse(
+            "api_event_add_participants", kwargs={"event_id": store.events[0].id}
+        ),
+        budget=39,
+        grows=True,
+        method="post",
+        data=lambda store: {"participant_ids": [c.id for c in store.clients[:5]]},
+    ),
+    Endpoint("event_open_list", _url("api_event_open_list"), budget=1980, grows=True),
+    Endpoint(
+        "event_link_service_order",
+        _url("api_event_link_service_order"),
+        budget=4,
+        method="post",
+        data=lambda store: {
+            "service_order_id": store.orders["PENDENTE"][0].id,
+            "event_id": store.events[0].id,
+        },
+    ),
+    Endpoint(
+        "event_list_with_status",
+        _url("api_event_list_with_status"),
+        budget=262,
+        grows=True,
+    ),
+    Endpoint(
+        "event_detail",
+        lambda store: reverse(
+            "api_event_detail", kwargs={"event_id": store.events[0].id}
+        ),
+        budget=3,
+    ),
+    # service_control - ordens de serviço
+    Endpoint("service_order_dashboard", _url("api_service_order_dashboard"), budget=35),
+    Endpoint(
+        "service_order_attendant_metrics",
+        _url("api_service_order_attendant_metrics"),
+        budget=98,
+    ),
+    Endpoint("service_order_list", _url("api_service_order_list"), budget=6),
+    Endpoint(
+        "service_order_create",
+        _url("api_service_order_create"),
+        budget=24,
+        method="post",
+        data=lambda store: {
+            "cliente_nome": "CLIENTE NOVO",
+            "cpf": _new_cpf(store),
+            "telefone": "(11) 94444-3333",
+            "email": "novo@cliente.com",
+            "atendente": store.attendants[0].name,
+            "origem": "INSTAGRAM",
+            "tipo_servico": "Aluguel",
+            "papel_evento": "NOIVO",
+            "endereco": {"cidade": "SAO PAULO", "rua": "RUA A", "numero": "1"},
+        },
+        status=201,
+    ),
+    Endpoint(
+        "service_order_virtual_create",
+        _url("api_virtual_service_order_create"),
+        budget=3,
+        method="post",
+        data=lambda store: {
+            "renter_id": store.clients[0].id,
+            "total_value": "500.00",
+            "sinal": {"amount": "200.00", "forma_pagamento": "PIX"},
+        },
+        status=201,
+    ),
+    Endpoint(
+        "service_order_detail",
+        lambda store: reverse(
+            "api_service_order_detail",
+            kwargs={"order_id": store.orders["EM_PRODUCAO"][0].id},
+        ),
+        budget=4,
+    ),
+    Endpoint(
+        "service_order_update",
+        _order_url("api_service_order_update", "PENDENTE"),
+        budget=32,
+        method="put",
+        data=lambda store: store.order_update_payload(store.last_order),
+    ),
+    Endpoint(
+        "service_order_mark_paid",
+        _order_url("api_service_order_mark_paid", "AGUARDANDO_DEVOLUCAO"),
+        budget=4,
+        method="post",
+    ),
+    Endpoint(
+        "service_order_refuse",
+        _order_url("api_service_order_refuse", "PENDENTE"),
+        budget=5,
+        method="post",
+        data=lambda store: {
+            "justification_reason_id": store.refusal_reasons[0].id,
+            "justification_refusal": "Cliente desistiu",
+        },
+    ),
+    Endpoint("refusal_reasons", _url("api_refusal_reasons_list"), budget=1),
+    Endpoint(
+        "service_order_mark_ready",
+        _order_url("api_service_order_mark_ready", "EM_PRODUCAO"),
+        budget=4,
+        method="post",
+    ),
+    Endpoint(
+        "service_order_mark_retrieved",
+        _order_url("api_service_order_mark_retrieved", "AGUARDANDO_RETIRADA"),
+        budget=4,
+        method="post",
+        data=lambda store: {},
+    ),
+    Endpoint(
+        "service_order_return_to_pending",
+        _order_url("api_service_order_return_to_pending", "EM_PRODUCAO"),
+        budget=4,
+        method="post",
+    ),
+    Endpoint(
+        "service_order_bulk_transition",
+        _url("api_service_order_bulk_transition"),
+        budget=4,
+        method="post",
+        data=lambda store: {
+            "order_ids": [store.take_order("EM_PRODUCAO").id for _ in range(3)],
+            "target_phase": "AGUARDANDO_RETIRADA",
+        },
+    ),
+    Endpoint(
+        "service_order_client",
+        lambda store: reverse(
+            "api_service_order_client",
+            kwargs={"order_id": store.orders["EM_PRODUCAO"][0].id},
+        ),
+        budget=5,
+    ),
+    *[
+        Endpoint(
+            f"service_order_by_phase[{phase}]",
+            _url("api_service_order_by_phase", phase_name=phase),
+            budget=budget,
+            grows=grows,
+        )
+        for phase, (budget, grows) in PHASE_LIST_BUDGETS.items()
+    ],
+    *[
+        Endpoint(
+            f"service_order_by_phase_v2[{phase}]",
+            _url("api_service_order_by_phase_v2", phase_name=phase),
+            budget=budget,
+            grows=grows,
+        )
+        for phase, (budget, grows) in PHASE_LIST_V2_BUDGETS.items()
+    ],
+    Endpoint("service_order_board", _url("api_service_order_board"), budget=5),
+    Endpoint(
+        "service_order_phase_counts", _url("api_service_order_phase_counts"), budget=1
+    ),
+    Endpoint(
+        "service_order_changes",
+        lambda store: reverse("api_service_order_changes") + "?limit=50",
+        budget=1,
+    ),
+    Endpoint(
+        "service_order_by_client",
+        lambda store: reverse(
+            "api_service_order_by_client", kwargs={"renter_id": store.clients[0].id}
+        ),
+        budget=4,
+    ),
+    Endpoint(
+        "service_order_pre_triage",
+        _url("api_service_order_pre_triage"),
+        budget=21,
+        method="post",
+        data=lambda store: {
+            "cliente_nome": "CLIENTE TRIAGEM",
+            "telefone": "(11) 93333-2222",
+            "origem": "INSTAGRAM",
+            "papel_evento": "PADRINHO",
+            "atendente_id": store.attendants[0].id,
+            "endereco": {"cidade": "SAO PAULO", "rua": "RUA B", "numero": "2"},
+        },
+        status=201,
+    ),
+    Endpoint(
+        "service_order_finance_summary",
+        _url("api_service_order_finance_summary"),
+        budget=1,
+    ),
+    Endpoint(
+        "service_order_lead_times",
+        _url("api_service_order_lead_times"),
+        budget=1,
+    ),
+    Endpoint(
+        "service_order_timeseries",
+        lambda store: reverse("api_service_order_timeseries")
+        + "?bucket=week&metric=recebido",
+        budget=1,
+    ),
+]
+
+
+def _params(growth=False):
+    params = []
+    for endpoint in ENDPOINTS:
+        marks = []
+        if endpoint.requires and importlib.util.find_spec(endpoint.requires) is None:
+            marks.append(pytest.mark.skip(reason=f"{endpoint.requires} não instalado"))
+        if growth and endpoint.grows:
+            marks.append(pytest.mark.xfail(strict=True, reason="N+1 conhecido"))
+        params.append(pytest.param(endpoint, id=endpoint.name, marks=marks))
+    return params
+
+
+def _measure(endpoint, store, admin_client, api_client, count_queries):
+    http = api_client if endpoint.anonymous else admin_client
+    if endpoint.fresh_token:
+        http = APIClient()
+        token = tokens_for_user(store.admin.user).access_token
+        http.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    queries, response = count_queries(endpoint.request, http, store)
+    assert response.status_code == endpoint.status, response.content[:500]
+    return queries
+
+
+@pytest.mark.parametrize("endpoint", _params())
+def test_query_budget(endpoint, store, admin_client, api_client, count_queries):
+    queries = _measure(endpoint, store, admin_client, api_client, count_queries)
+
+    assert (
+        queries <= endpoint.budget
+    ), f"{endpoint.name}: {queries} queries (orçamento {endpoint.budget})"
+
+
+@pytest.mark.parametrize("endpoint", _params(growth=True))
+def test_query_count_does_not_grow_with_data(
+    endpoint, store, store_orders, admin_client, api_client, count_queries
+):
+    before = _measure(endpoint, store, admin_client, api_client, count_queries)
+    store.grow(orders=store_orders * 2)
+    store.expire_overdue()
+    after = _measure(endpoint, store, admin_client, api_client, count_queries)
+
+    assert after == before, (
+        f"{endpoint.name}: {before} queries com {store_orders} OS, "
+        f"{after} com {store_orders * 3}"
+    )
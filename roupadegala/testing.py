@@ -0,0 +1,387 @@
+"""
+Gerador de dados sintéticos de uma loja (clientes, funcionários, eventos,
+ordens de serviço em todas as fases e produtos).
+
+Usado pelos testes de orçamento de queries e pelos benchmarks. Todos os
+registros são criados com bulk_create, então o custo de popular milhares
+de OS fica em poucas queries por lote.
+"""
+
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from accounts.models import City, Person, PersonsAdresses, PersonsContacts, PersonType
+from products.models import (
+    Brand,
+    Button,
+    Color,
+    ColorCatalogue,
+    ColorIntensity,
+    Fabric,
+    Lapel,
+    Model,
+    Pattern,
+    Product,
+    ProductType,
+    TemporaryProduct,
+)
+from service_control import phases
+from service_control.models import (
+    Event,
+    EventParticipant,
+    RefusalReason,
+    ServiceOrder,
+    ServiceOrderItem,
+    ServiceOrderPhase,
+)
+
+PHASES = [
+    "PENDENTE",
+    "EM_PRODUCAO",
+    "AGUARDANDO_RETIRADA",
+    "AGUARDANDO_DEVOLUCAO",
+    "FINALIZADO",
+    "RECUSADA",
+    "ATRASADO",
+]
+# Fases em que as OS são efetivamente criadas (ATRASADO é uma fase virtual)
+ORDER_PHASES = PHASES[:6]
+PERSON_TYPES = ["ADMINISTRADOR", "ATENDENTE", "RECEPÇÃO", "CLIENTE"]
+REFUSAL_REASONS = ["PREÇO", "DESISTÊNCIA", "NÃO RETIROU", "OUTROS"]
+CAME_FROM = ["INSTAGRAM", "FACEBOOK", "INDICAÇÃO", "GOOGLE", "CLIENTE"]
+RENTER_ROLES = ["NOIVO", "PADRINHO", "PAI DA NOIVA", "FORMANDO", "CONVIDADO"]
+SERVICE_TYPES = ["Aluguel", "Compra", "Aluguel + Venda"]
+PAYMENT_METHODS = ["PIX", "DEBITO", "CREDITO", "DINHEIRO"]
+ITEM_TYPES = ["paleto", "calca", "camisa", "colete", "gravata"]
+
+PASSWORD = "senha123"
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time(12)))
+
+
+class StoreFactory:
+    """
+    Loja sintética. O construtor cria os dados fixos (tipos de pessoa,
+    fases, funcionários, catálogos); `grow` acrescenta um lote de clientes,
+    eventos, OS e produtos.
+    """
+
+    def __init__(self, seed=0, attendants=4):
+        self.random = random.Random(seed)
+        self.today = date.today()
+        self._sequence = Person.objects.count() + Product.objects.count()
+
+        self.person_types = {
+            name: PersonType.objects.get_or_create(type=name)[0]
+            for name in PERSON_TYPES
+        }
+        self.phases = {}
+        for name in PHASES:
+            phase = ServiceOrderPhase.objects.filter(name=name).first()
+            self.phases[name] = phase or ServiceOrderPhase.objects.create(name=name)
+        phases.invalidate()
+
+        self.refusal_reasons = [
+            RefusalReason.objects.get_or_create(name=name)[0]
+            for name in REFUSAL_REASONS
+        ]
+        self.city = City.objects.filter(
+            name="SAO PAULO"
+        ).first() or City.objects.create(code="3550308", name="SAO PAULO", uf="SP")
+
+        password = make_password(PASSWORD)
+        self.admin = self._employee("ADMINISTRADOR", password)
+        self.attendants = [
+            self._employee("ATENDENTE", password) for _ in range(attendants)
+        ]
+        self.receptionist = self._employee("RECEPÇÃO", password)
+        self._catalogs()
+
+        self.clients = []
+        self.events = []
+        self.orders = {name: [] for name in ORDER_PHASES}
+        self.products = []
+
+    def _next(self):
+        self._sequence += 1
+        return self._sequence
+
+    def _cpf(self):
+        return f"{90000000000 + self._next():011d}"
+
+    def _employee(self, person_type, password):
+        cpf = self._cpf()
+        user = User.objects.create(username=cpf, password=password)
+        person = Person.objects.create(
+            user=user,
+            name=f"{person_type} {cpf[-4:]}",
+            cpf=cpf,
+            person_type=self.person_types[person_type],
+        )
+        PersonsContacts.objects.create(
+            person=person, email=f"{cpf}@loja.com", phone=f"(11) 9{cpf[-8:]}"
+        )
+        return person
+
+    def _catalogs(self):
+        for model, names in (
+            (Brand, ["SEM MARCA", "BRAND A", "BRAND B"]),
+            (Fabric, ["LÃ", "LINHO"]),
+            (Pattern, ["LISO", "RISCADO"]),
+            (Button, ["UM", "DUPLO"]),
+            (Lapel, ["BICO", "SHALE"]),
+            (Model, ["SLIM", "TRADICIONAL"]),
+        ):
+            for name in names:
+                model.objects.get_or_create(description=name)
+        for description, acronym in (("PALETÓ", "PAL"), ("CALÇA", "CAL")):
+            ProductType.objects.get_or_create(
+                description=description, defaults={"acronym": acronym}
+            )
+        intensities = [
+            ColorIntensity.objects.get_or_create(description=name)[0]
+            for name in ("CLARO", "ESCURO")
+        ]
+        for name in ("AZUL", "PRETO", "CINZA"):
+            color = ColorCatalogue.objects.get_or_create(description=name)[0]
+            for intensity in intensities:
+                Color.objects.get_or_create(color=color, color_intensity=intensity)
+
+    def grow(self, orders=100, clients=None, events=None, products=None):
+        """
+        Acrescenta um lote de dados. Por padrão cria um cliente para cada duas
+        OS, um evento para cada dez OS e um produto para cada cinco OS.
+        """
+        rnd = self.random
+        clients = clients if clients is not None else max(1, orders // 2)
+        events = events if events is not None else max(1, orders // 10)
+        products = products if products is not None else max(1, orders // 5)
+
+        new_clients = Person.objects.bulk_create(
+            [
+                Person(
+                    name=f"CLIENTE {n}",
+                    cpf=self._cpf(),
+                    person_type=self.person_types["CLIENTE"],
+                )
+                for n in range(clients)
+            ]
+        )
+        PersonsContacts.objects.bulk_create(
+            [
+                PersonsContacts(
+                    person=client,
+                    email=f"{client.cpf}@cliente.com",
+                    phone=f"(11) 9{client.cpf[-8:]}",
+                )
+                for client in new_clients
+            ]
+        )
+        PersonsAdresses.objects.bulk_create(
+            [
+                PersonsAdresses(
+                    person=client,
+                    street="RUA TESTE",
+                    number=str(rnd.randint(1, 999)),
+                    cep="01000-000",
+                    neighborhood="CENTRO",
+                    city=self.city,
+                )
+                for client in new_clients
+            ]
+        )
+        self.clients.extend(new_clients)
+
+        new_events = Event.objects.bulk_create(
+            [
+                Event(
+                    name=f"EVENTO {self._next()}",
+                    event_date=self.today + timedelta(days=rnd.randint(-60, 90)),
+                )
+                for _ in range(events)
+            ]
+        )
+        self.events.extend(new_events)
+
+        order_objs = []
+        for n in range(orders):
+            phase = ORDER_PHASES[n % len(ORDER_PHASES)]
+            order_objs.append(self._order(rnd, phase))
+        new_orders = ServiceOrder.objects.bulk_create(order_objs)
+        for order in new_orders:
+            self.orders[phases.phase_name(order.service_order_phase_id)].append(order)
+
+        EventParticipant.objects.bulk_create(
+            [
+                EventParticipant(event_id=order.event_id, person_id=order.renter_id)
+                for order in new_orders
+                if order.event_id
+            ],
+            ignore_conflicts=True,
+        )
+
+        temporary_products = TemporaryProduct.objects.bulk_create(
+            [
+                TemporaryProduct(
+                    product_type=ITEM_TYPES[i % len(ITEM_TYPES)],
+                    size=str(rnd.randint(38, 56)),
+                    color=rnd.choice(["AZUL", "PRETO", "CINZA"]),
+                    brand="BRAND A",
+                )
+                for i in range(len(new_orders) * 2)
+            ]
+        )
+        ServiceOrderItem.objects.bulk_create(
+            [
+                ServiceOrderItem(
+                    service_order=order,
+                    temporary_product=temporary_products[i * 2 + j],
+                )
+                for i, order in enumerate(new_orders)
+                for j in range(2)
+            ]
+        )
+
+        self.products.extend(
+            Product.objects.bulk_create(
+                [
+                    Product(
+                        tipo=rnd.choice(["Paletó", "Calça", "Colete"]),
+                        id_produto=f"T{self._next():07d}",
+                        nome_produto="PRODUTO TESTE",
+                        marca=rnd.choice(["BRAND A", "BRAND B"]),
+                        material="LÃ",
+                        cor=rnd.choice(["AZUL", "PRETO"]),
+                        intensidade_cor="ESCURO",
+                        tamanho=Decimal(rnd.randint(38, 56)),
+                    )
+                    for _ in range(products)
+                ]
+            )
+        )
+        return new_orders
+
+    def _order(self, rnd, phase):
+        order_date = self.today - timedelta(days=rnd.randint(0, 120))
+        total = Decimal(rnd.randint(200, 2000))
+        advance = (total * Decimal("0.3")).quantize(Decimal("0.01"))
+        event = rnd.choice(self.events) if self.events else None
+        attendant = rnd.choice(self.attendants)
+        method = rnd.choice(PAYMENT_METHODS)
+        order = ServiceOrder(
+            renter=rnd.choice(self.clients),
+            employee=attendant,
+            attendant=self.receptionist,
+            order_date=order_date,
+            event=event,
+            renter_role=rnd.choice(RENTER_ROLES),
+            came_from=rnd.choice(CAME_FROM),
+            service_type=rnd.choice(SERVICE_TYPES),
+            payment_method=method,
+            payment_details=[
+                {
+                    "amount": float(advance),
+                    "forma_pagamento": method,
+                    "tipo": "sinal",
+                    "data": str(order_date),
+                }
+            ],
+            total_value=total,
+            advance_payment=advance,
+            remaining_payment=total - advance,
+            prova_date=order_date + timedelta(days=rnd.randint(5, 20)),
+            retirada_date=order_date + timedelta(days=rnd.randint(20, 40)),
+            devolucao_date=order_date + timedelta(days=rnd.randint(40, 50)),
+            service_order_phase=self.phases[phase],
+        )
+        if phase in ("EM_PRODUCAO", "AGUARDANDO_RETIRADA", "AGUARDANDO_DEVOLUCAO"):
+            order.production_date = order_date + timedelta(days=1)
+        if phase in ("AGUARDANDO_DEVOLUCAO", "FINALIZADO"):
+            order.data_retirado = _aware(order.retirada_date)
+        if phase == "FINALIZADO":
+            order.data_devolvido = _aware(order.devolucao_date)
+            order.data_finalizado = order.devolucao_date
+        if phase == "RECUSADA":
+            order.data_recusa = order_date
+            order.justification_reason = rnd.choice(self.refusal_reasons)
+        # bulk_create não passa pelo save(), que preenche os valores canônicos
+        # e date_updated
+        order.canonicalize_dimensions()
+        order.date_updated = timezone.now()
+        return order
+
+    def expire_overdue(self):
+        """
+        Recusa as OS cujo evento já passou sem retirada, como a primeira
+        listagem por fase faria, e atualiza as listas por fase. Em produção
+        isso acontece a cada listagem; sem esta chamada, a primeira
+        requisição medida carregaria as recusas de todo o lote.
+        """
+        from service_control.api_views import move_to_refused_if_event_passed
+
+        move_to_refused_if_event_passed(self.today)
+        refused_id = self.phases["RECUSADA"].id
+        refused = set(
+            ServiceOrder.objects.filter(service_order_phase_id=refused_id).values_list(
+                "id", flat=True
+            )
+        )
+        for phase, orders in self.orders.items():
+            if phase == "RECUSADA":
+                continue
+            moved = [order for order in orders if order.id in refused]
+            for order in moved:
+                order.service_order_phase_id = refused_id
+            self.orders[phase] = [order for order in orders if order.id not in refused]
+            self.orders["RECUSADA"].extend(moved)
+
+    def take_order(self, phase):
+        """Retira da lista uma OS da fase, para ser usada em escrita"""
+        return self.orders[phase].pop()
+
+    def order_update_payload(self, order):
+        """Payload do frontend para atualizar a OS (PUT service-orders/<id>/)"""
+        return {
+            "ordem_servico": {
+                "data_prova": str(self.today + timedelta(days=5)),
+                "data_retirada": str(self.today + timedelta(days=20)),
+                "data_devolucao": str(self.today + timedelta(days=30)),
+                "ocasiao": "NOIVO",
+                "modalidade": "Aluguel",
+                "employee_id": self.attendants[0].id,
+                "itens": [
+                    {
+                        "tipo": "paleto",
+                        "numero": "50",
+                        "cor": "AZUL",
+                        "marca": "BRAND A",
+                    },
+                    {"tipo": "calca", "numero": "44", "cintura": "80", "perna": "100"},
+                ],
+                "acessorios": [{"tipo": "gravata", "cor": "PRETO"}],
+                "pagamento": {
+                    "total": "900.00",
+                    "restante": "600.00",
+                    "sinal": {
+                        "total": "300.00",
+                        "pagamentos": [{"amount": "300.00", "forma_pagamento": "PIX"}],
+                    },
+                },
+            },
+            "cliente": {
+                "nome": order.renter.name,
+                "cpf": order.renter.cpf,
+                "email": f"{order.renter.cpf}@cliente.com",
+                "contatos": [{"tipo": "telefone", "valor": "(11) 98888-7777"}],
+                "enderecos": [
+                    {"cidade": "SAO PAULO", "rua": "RUA NOVA", "numero": "10"}
+                ],
+            },
+        }
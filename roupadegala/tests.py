@@ -0,0 +1,343 @@
+"""
+Testes para a instrumentação de requisições, o cache de respostas, o
+renderer JSON e a compressão
+"""
+
+import datetime
+import gzip
+import json
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.models import Person, PersonType
+from products.models import Brand
+from service_control.models import RefusalReason
+
+from . import renderers
+from .middleware import CompressionMiddleware, slow_requests
+from .renderers import FastJSONRenderer, stream_json_array
+from .testing import StoreFactory
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        self.client = APIClient()
+        admin_type, _ = PersonType.objects.get_or_create(type="ADMINISTRADOR")
+        attendant_type, _ = PersonType.objects.get_or_create(type="ATENDENTE")
+
+        self.admin_user = User.objects.create_user(username="12345678901")
+        Person.objects.create(
+            user=self.admin_user, name="ADMIN TESTE", person_type=admin_type
+        )
+        self.attendant_user = User.objects.create_user(username="98765432100")
+        Person.objects.create(
+            user=self.attendant_user, name="ATENDENTE TESTE", person_type=attendant_type
+        )
+        slow_requests.clear()
+
+    def test_server_timing_header(self):
+        """Teste: Toda resposta traz tempo total e de banco no Server-Timing"""
+        self.client.force_authenticate(self.attendant_user)
+
+        response = self.client.get(reverse("api_user_me"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("app;dur=", response["Server-Timing"])
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+    def test_slow_requests_admin_only(self):
+        """Teste: Apenas administradores veem as requisições mais lentas"""
+        self.client.force_authenticate(self.attendant_user)
+        response = self.client.get(reverse("api_metrics_slow_requests"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.get(reverse("api_metrics_slow_requests"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["results"][0]["status"], 403)
+
+    def test_streamed_listing_measured(self):
+        """Teste: Queries e bytes gerados durante o streaming entram na medição"""
+        store = StoreFactory()
+        store.grow(orders=24)
+        self.client.force_authenticate(store.admin.user)
+        url = reverse("api_service_order_by_phase", args=["PENDENTE"])
+        self.client.get(url)  # recusa automática de OS vencidas
+        slow_requests.clear()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"stream": "1"})
+            body = b"".join(response.streaming_content)
+
+        self.assertTrue(json.loads(body))
+        entry = slow_requests.entries()[0]
+        self.assertEqual(entry["db_queries"], len(ctx.captured_queries))
+        self.assertEqual(entry["response_bytes"], len(body))
+        self.assertNotIn("Server-Timing", response)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="12345678901")
+        Brand.objects.create(description="ARMANI")
+
+    def get(self, name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(ctx.captured_queries)
+
+    def test_catalog_served_from_cache(self):
+        """Teste: A segunda leitura do catálogo não consulta o banco"""
+        first, queries = self.get("api_catalog_list")
+        self.assertGreater(queries, 0)
+
+        second, queries = self.get("api_catalog_list")
+
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Content-Type"], first["Content-Type"])
+
+    def test_catalog_change_invalidates_cache(self):
+        """Teste: Salvar um item de catálogo invalida as respostas em cache"""
+        self.get("api_catalog_list")
+        Brand.objects.create(description="ZARA")
+
+        response, queries = self.get("api_catalog_list")
+
+        self.assertGreater(queries, 0)
+        brands = [b["description"] for b in response.json()["brands"]]
+        self.assertEqual(brands, ["ARMANI", "ZARA"])
+
+    def test_refusal_reasons_cache_checks_authentication(self):
+        """Teste: Resposta em cache não dispensa autenticação"""
+        RefusalReason.objects.create(name="PREÇO")
+        self.client.force_authenticate(self.user)
+        self.get("api_refusal_reasons_list")
+        self.client.force_authenticate(None)
+
+        response = self.client.get(reverse("api_refusal_reasons_list"))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refusal_reason_change_invalidates_cache(self):
+        """Teste: Criar um motivo de recusa invalida a lista em cache"""
+        self.client.force_authenticate(self.user)
+        self.get("api_refusal_reasons_list")
+        RefusalReason.objects.create(name="PREÇO")
+
+        response, _ = self.get("api_refusal_reasons_list")
+
+        self.assertEqual([r["name"] for r in response.json()], ["PREÇO"])
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_same_output_as_drf(self):
+        """Teste: O renderer gera os mesmos bytes que o JSONRenderer do DRF"""
+        data = {
+            "total": Decimal("1234.50"),
+            "quando": datetime.datetime(
+                2024, 5, 1, 13, 30, tzinfo=datetime.timezone.utc
+            ),
+            "local": datetime.datetime(2024, 5, 1, 13, 30, 15, 123456),
+            "dia": datetime.date(2024, 5, 1),
+            "hora": datetime.time(9, 15),
+            "contagem": {1: "um", 2: "dois"},
+            "texto": "CAMISA\u2028BRANCA\u2029ÇÃO",
+            "vazio": None,
+            "lista": [1, 2.5, True],
+        }
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back_to_drf(self):
+        """Teste: Indentação pedida pelo cliente usa o render do DRF"""
+        data = {"a": [1, 2]}
+        media_type = "application/json; indent=2"
+
+        self.assertEqual(
+            FastJSONRenderer().render(data, media_type),
+            JSONRenderer().render(data, media_type),
+        )
+
+    def test_big_integer_falls_back_to_drf(self):
+        """Teste: Inteiros acima de 64 bits usam o render do DRF"""
+        data = {"n": 2**70}
+
+        self.assertEqual(
+            FastJSONRenderer().render(data), b'{"n":1180591620717411303424}'
+        )
+
+    def test_stream_json_array(self):
+        """Teste: O array em streaming é igual ao render da lista inteira"""
+        rows = [{"id": index, "total": Decimal("10.50")} for index in range(5000)]
+
+        with mock.patch.object(renderers, "STREAM_BUFFER_SIZE", 1024):
+            chunks = list(stream_json_array(iter(rows)))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b"".join(chunks), JSONRenderer().render(rows))
+        self.assertEqual(b"".join(stream_json_array([])), b"[]")
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        self.factory = RequestFactory()
+
+    def process(self, response, accept="gzip"):
+        request = self.factory.get("/", HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def json_response(self, size):
+        return HttpResponse(
+            b"[" + b"1," * size + b"1]", content_type="application/json"
+        )
+
+    def test_gzip_above_threshold(self):
+        """Teste: Respostas JSON grandes são comprimidas com gzip"""
+        original = self.json_response(2000)
+        content = original.content
+
+        response = self.process(original)
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), content)
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+
+    def test_small_response_not_compressed(self):
+        """Teste: Respostas abaixo do limite não são comprimidas"""
+        response = self.process(self.json_response(10))
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    @override_settings(RESPONSE_COMPRESSION={"MIN_SIZE": 100})
+    def test_threshold_configurable(self):
+        """Teste: O limite de tamanho vem de RESPONSE_COMPRESSION"""
+        response = self.process(self.json_response(100))
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_client_without_gzip(self):
+        """Teste: Sem Accept-Encoding compatível a resposta vai sem compressão"""
+        response = self.process(self.json_response(2000), accept="gzip;q=0, identity")
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_non_compressible_type(self):
+        """Teste: Planilhas e outros binários não são comprimidos"""
+        original = HttpResponse(
+            b"x" * 5000,
+            content_type=(
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            ),
+        )
+
+        response = self.process(original)
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_etag_weakened(self):
+        """Teste: O ETag de uma resposta comprimida passa a ser fraco"""
+        original = self.json_response(2000)
+        original["ETag"] = '"abc"'
+
+        response = self.process(original)
+
+        self.assertEqual(response["ETag"], 'W/"abc"')
+
+    def test_streaming_gzip(self):
+        """Teste: Respostas em streaming são comprimidas em blocos com gzip"""
+        chunks = [b"[", *(b"1," for _ in range(2000)), b"1]"]
+        original = StreamingHttpResponse(iter(chunks), content_type="application/json")
+
+        response = self.process(original)
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        body = b"".join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), b"".join(chunks))
+
+    @unittest.skipIf(brotli is None, "brotli não instalado")
+    def test_brotli_preferred(self):
+        """Teste: Com brotli disponível, br tem preferência sobre gzip"""
+        original = self.json_response(2000)
+        content = original.content
+
+        response = self.process(original, accept="gzip, deflate, br")
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), content)
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+
+    @unittest.skipIf(brotli is None, "brotli não instalado")
+    def test_streaming_brotli(self):
+        """Teste: Respostas em streaming são comprimidas em blocos com br"""
+        chunks = [b"[", *(b"1," for _ in range(2000)), b"1]"]
+        original = StreamingHttpResponse(iter(chunks), content_type="application/json")
+
+        response = self.process(original, accept="br")
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        body = b"".join(response.streaming_content)
+        self.assertEqual(brotli.decompress(body), b"".join(chunks))
+
+
+class CompressedApiTests(TestCase):
+    def test_catalog_gzip(self):
+        """Teste: A API responde comprimido a clientes que aceitam gzip"""
+        cache.clear()
+        Brand.objects.bulk_create(
+            [Brand(description=f"MARCA {index:03d}") for index in range(100)]
+        )
+
+        response = APIClient().get(
+            reverse("api_catalog_list"), HTTP_ACCEPT_ENCODING="gzip"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "application/json")
+        body = gzip.decompress(response.content)
+        self.assertIn(b'"description":"MARCA 099"', body)
+
+    @unittest.skipIf(brotli is None, "brotli não instalado")
+    def test_catalog_brotli(self):
+        """Teste: A API responde com br a clientes que aceitam brotli"""
+        cache.clear()
+        Brand.objects.bulk_create(
+            [Brand(description=f"MARCA {index:03d}") for index in range(100)]
+        )
+
+        response = APIClient().get(
+            reverse("api_catalog_list"), HTTP_ACCEPT_ENCODING="gzip, deflate, br"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "br")
+        body = brotli.decompress(response.content)
+        self.assertIn(b'"description":"MARCA 099"', body)
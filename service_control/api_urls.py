@@ -14,6 +14,9 @@ from .api_views import (
     EventUpdateAPIView,
     RefusalReasonsListAPIView,
     ServiceOrderAttendantMetricsAPIView,
+    ServiceOrderBoardAPIView,
+    ServiceOrderBulkTransitionAPIView,
+    ServiceOrderChangesAPIView,
     ServiceOrderClientAPIView,
     ServiceOrderCreateAPIView,
     ServiceOrderDashboardAPIView,
@@ -23,12 +26,15 @@ from .api_views import (
     ServiceOrderListByPhaseAPIView,
     ServiceOrderListByPhaseV2APIView,
     ServiceOrderFinanceSummaryAPIView,
+    ServiceOrderLeadTimeAPIView,
     ServiceOrderMarkPaidAPIView,
     ServiceOrderMarkReadyAPIView,
     ServiceOrderMarkRetrievedAPIView,
+    ServiceOrderPhaseCountsAPIView,
     ServiceOrderPreTriageAPIView,
     ServiceOrderRefuseAPIView,
     ServiceOrderReturnToPendingAPIView,
+    ServiceOrderTimeseriesAPIView,
     ServiceOrderUpdateAPIView,
     VirtualServiceOrderCreateAPIView,
 )
@@ -81,6 +87,11 @@ urlpatterns = [
         ServiceOrderAttendantMetricsAPIView.as_view(),
         name="api_service_order_attendant_metrics",
     ),
+    path(
+        "service-orders/analytics/timeseries/",
+        ServiceOrderTimeseriesAPIView.as_view(),
+        name="api_service_order_timeseries",
+    ),
     # Ordens de serviço
     path(
         "service-orders/",
@@ -137,6 +148,11 @@ urlpatterns = [
         ServiceOrderReturnToPendingAPIView.as_view(),
         name="api_service_order_return_to_pending",
     ),
+    path(
+        "service-orders/bulk-transition/",
+        ServiceOrderBulkTransitionAPIView.as_view(),
+        name="api_service_order_bulk_transition",
+    ),
     path(
         "service-orders/<int:order_id>/client/",
         ServiceOrderClientAPIView.as_view(),
@@ -153,6 +169,21 @@ urlpatterns = [
         ServiceOrderListByPhaseV2APIView.as_view(),
         name="api_service_order_by_phase_v2",
     ),
+    path(
+        "service-orders/board/",
+        ServiceOrderBoardAPIView.as_view(),
+        name="api_service_order_board",
+    ),
+    path(
+        "service-orders/phase-counts/",
+        ServiceOrderPhaseCountsAPIView.as_view(),
+        name="api_service_order_phase_counts",
+    ),
+    path(
+        "service-orders/changes/",
+        ServiceOrderChangesAPIView.as_view(),
+        name="api_service_order_changes",
+    ),
     # Listagem por cliente
     path(
         "service-orders/renter/<int:renter_id>/",
@@ -170,4 +201,9 @@ urlpatterns = [
         ServiceOrderFinanceSummaryAPIView.as_view(),
         name="api_service_order_finance_summary",
     ),
+    path(
+        "service-orders/lead-times/",
+        ServiceOrderLeadTimeAPIView.as_view(),
+        name="api_service_order_lead_times",
+    ),
 ]
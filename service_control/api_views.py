@@ -9,6 +9,7 @@ from decimal import Decimal
 logger = logging.getLogger(__name__)
 
 from django.db import models
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from drf_spectacular.types import OpenApiTypes
@@ -19,15 +20,21 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from accounts.authentication import permission_context
 from accounts.models import City, Person, PersonsAdresses, PersonsContacts, PersonType
+from accounts.services import merge_persons
 from products.models import TemporaryProduct
+from roupadegala.cache import cached_response
+from roupadegala.conditional import ConditionalListMixin
+from roupadegala.fieldsets import SparseFieldsetMixin
+from roupadegala.renderers import stream_json_array
 
+from . import changes, dimensions, listing, metrics, phases, state_machine
 from .models import (
     Event,
     EventParticipant,
     ServiceOrder,
     ServiceOrderItem,
-    ServiceOrderPhase,
 )
 from .serializers import (
     EventAddParticipantsSerializer,
@@ -39,14 +46,17 @@ from .serializers import (
     EventStatusSerializer,
     EventUpdateSerializer,
     FrontendServiceOrderUpdateSerializer,
+    ServiceOrderBulkTransitionSerializer,
     ServiceOrderClientSerializer,
     ServiceOrderDashboardResponseSerializer,
+    ServiceOrderLeadTimeSerializer,
     ServiceOrderListByPhaseSerializer,
     ServiceOrderMarkPaidSerializer,
     ServiceOrderMarkRetrievedSerializer,
     ServiceOrderRefuseSerializer,
     ServiceOrderSerializer,
     ServiceOrderFinanceSummarySerializer,
+    ServiceOrderTimeseriesSerializer,
     VirtualServiceOrderCreateSerializer,
 )
 from django.core.paginator import Paginator, EmptyPage
@@ -244,23 +254,22 @@ class ServiceOrderCreateAPIView(APIView):
                     )
 
             # Buscar fase pendente
-            service_order_phase = ServiceOrderPhase.objects.filter(
-                name="PENDENTE"
-            ).first()
+            service_order_phase_id = phases.phase_id("PENDENTE")
 
             # Criar ordem de serviço
             service_order = ServiceOrder.objects.create(
                 renter=person,
                 employee=employee,
-                attendant=request.user.person,
+                attendant_id=permission_context(request.user).person_id,
                 order_date=date.today(),
                 renter_role=order_data["papel_evento"].upper(),
                 purchase=True if order_data["tipo_servico"] in ["Compra", "Venda"] else False,
                 service_type=order_data["tipo_servico"],
                 came_from=order_data["origem"].upper(),
-                service_order_phase=service_order_phase,
+                service_order_phase_id=service_order_phase_id,
                 event=event_obj,  # Vincular evento à OS se fornecido
             )
+            state_machine.record_created([service_order], request.user)
 
             return Response(
                 {
@@ -424,50 +433,16 @@ class ServiceOrderUpdateAPIView(APIView):
                 if pessoa_temporaria:
                     # Cliente atual foi criado na triagem sem CPF
                     if existing_person_with_cpf:
-                        # CPF pertence a cliente já existente - transferir dados e vincular
-                        # Transferir contatos da pessoa temporária para a pessoa existente
-                        for contact in current_renter.contacts.all():
-                            # Verificar se já existe contato igual na pessoa destino
-                            existing = PersonsContacts.objects.filter(
-                                person=existing_person_with_cpf,
-                                email=contact.email,
-                                phone=contact.phone,
-                            ).exists()
-                            if not existing:
-                                contact.person = existing_person_with_cpf
-                                contact.save()
-                        
-                        # Transferir endereços da pessoa temporária para a pessoa existente
-                        for address in current_renter.personsadresses_set.all():
-                            # Verificar se já existe endereço igual na pessoa destino
-                            existing = PersonsAdresses.objects.filter(
-                                person=existing_person_with_cpf,
-                                street=address.street,
-                                number=address.number,
-                                cep=address.cep,
-                                neighborhood=address.neighborhood,
-                                complemento=address.complemento,
-                                city=address.city,
-                            ).exists()
-                            if not existing:
-                                address.person = existing_person_with_cpf
-                                address.save()
-                        
-                        # Atualizar nome se fornecido
+                        # CPF pertence a cliente já existente - mesclar a pessoa
+                        # temporária (contatos, endereços, OS e eventos) nela
                         if cliente_data.get("nome"):
                             existing_person_with_cpf.name = cliente_data["nome"].upper()
                             existing_person_with_cpf.save()
-                        
-                        # Verificar se pessoa temporária não está vinculada a outras OS
-                        other_os_count = ServiceOrder.objects.filter(renter=current_renter).exclude(id=service_order.id).count()
-                        
-                        # Atualizar renter da OS para a pessoa existente
+
+                        merge_persons(current_renter, existing_person_with_cpf)
+
                         person = existing_person_with_cpf
                         service_order.renter = person
-                        
-                        # Se pessoa temporária não tem outras OS, pode ser removida
-                        if other_os_count == 0:
-                            current_renter.delete()
                     else:
                         # CPF não existe - atualizar pessoa temporária com o CPF
                         current_renter.cpf = cpf_limpo
@@ -652,23 +627,12 @@ class ServiceOrderUpdateAPIView(APIView):
 
             if is_full_update:
                 # Atualização completa - mover para EM_PRODUCAO
-                em_producao_phase = ServiceOrderPhase.objects.filter(
-                    name="EM_PRODUCAO"
-                ).first()
-
-                if em_producao_phase and service_order.service_order_phase:
-                    # Só mover se não estiver já em EM_PRODUCAO, AGUARDANDO_RETIRADA ou fases posteriores
-                    current_phase_name = service_order.service_order_phase.name
-                    if current_phase_name not in [
-                        "EM_PRODUCAO",
-                        "AGUARDANDO_RETIRADA",
-                        "AGUARDANDO_DEVOLUCAO",
-                        "FINALIZADO",
-                        "RECUSADA",
-                    ]:
-                        service_order.service_order_phase = em_producao_phase
-                        service_order.production_date = date.today()
-                        service_order.save()
+                # Só move se não estiver já em EM_PRODUCAO, AGUARDANDO_RETIRADA
+                # ou fases posteriores (regras em state_machine)
+                if phases.phase_id("EM_PRODUCAO"):
+                    state_machine.apply(
+                        "start_production", [service_order], request.user
+                    )
 
             service_order.update(request.user)
 
@@ -703,23 +667,45 @@ class ServiceOrderUpdateAPIView(APIView):
             location=OpenApiParameter.QUERY,
             description="Filtrar por fase da ordem de serviço",
             required=False,
-        )
+        ),
+        OpenApiParameter(
+            name="fields",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Campos da resposta, separados por vírgula; use ponto para campos "
+                "de relações (ex.: id,order_date,renter.name,service_order_phase.name)"
+            ),
+            required=False,
+        ),
+        OpenApiParameter(
+            name="expand",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Relações devolvidas como objeto (ex.: renter,items.product); as "
+                "demais vêm só com o id. Sem o parâmetro, todas são expandidas"
+            ),
+            required=False,
+        ),
     ],
     responses={200: ServiceOrderSerializer(many=True)},
 )
-class ServiceOrderListAPIView(ListAPIView):
+class ServiceOrderListAPIView(SparseFieldsetMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ServiceOrderSerializer
 
     def get_queryset(self):
-        queryset = ServiceOrder.objects.select_related(
-            "renter", "employee", "attendant", "service_order_phase", "event"
-        ).prefetch_related("items")
+        # Relações aninhadas do serializer (contatos, itens e produtos)
+        # carregadas em lote, conforme os campos pedidos
+        queryset = self.sparse_queryset(ServiceOrder.objects.all())
 
         # Filtros
         phase = self.request.GET.get("phase")
         if phase:
-            queryset = queryset.filter(service_order_phase__name__icontains=phase)
+            queryset = queryset.filter(
+                service_order_phase_id__in=phases.search_phase_ids(phase)
+            )
 
         return queryset
 
@@ -740,269 +726,9 @@ class ServiceOrderDetailAPIView(APIView):
     def get(self, request, order_id):
         """Detalhes de uma ordem de serviço com estrutura normalizada"""
         try:
-            # Buscar a ordem de serviço específica
-            order = (
-                ServiceOrder.objects.select_related(
-                    "renter",
-                    "employee",
-                    "attendant",
-                    "renter__person_type",
-                    "event",
-                )
-                .prefetch_related("items__temporary_product", "items__product")
-                .get(id=order_id)
-            )
-
-            # Dados do cliente
-            client_data = {
-                "id": order.renter.id,
-                "name": order.renter.name,
-                "cpf": order.renter.cpf,
-                "person_type": (
-                    {
-                        "id": order.renter.person_type.id,
-                        "type": order.renter.person_type.type,
-                    }
-                    if order.renter.person_type
-                    else None
-                ),
-            }
-
-            # Contatos do cliente (apenas o mais recente)
-            contact = (
-                order.renter.contacts.filter(date_created__isnull=False)
-                .order_by("-date_created", "-id")
-                .first()
-            )
-            if not contact:
-                # Se não houver contato com date_created, buscar o mais recente por ID
-                contact = order.renter.contacts.order_by("-id").first()
-
-            client_data["contacts"] = []
-            if contact:
-                client_data["contacts"].append(
-                    {
-                        "id": contact.id,
-                        "email": contact.email,
-                        "phone": contact.phone,
-                    }
-                )
-
-            # Endereços do cliente (apenas o mais recente)
-            address = (
-                order.renter.personsadresses_set.filter(date_created__isnull=False)
-                .order_by("-date_created", "-id")
-                .first()
-            )
-            if not address:
-                # Se não houver endereço com date_created, buscar o mais recente por ID
-                address = order.renter.personsadresses_set.order_by("-id").first()
-            client_data["addresses"] = []
-            if address:
-                city_data = None
-                if address.city:
-                    city_data = {
-                        "id": address.city.id,
-                        "name": address.city.name,
-                        "uf": address.city.uf,
-                    }
-
-                client_data["addresses"].append(
-                    {
-                        "id": address.id,
-                        "cep": address.cep,
-                        "rua": address.street,
-                        "numero": address.number,
-                        "bairro": address.neighborhood,
-                        "complemento": address.complemento or "",
-                        "cidade": city_data,
-                    }
-                )
-
-            # Dados da OS
-            order_data = {
-                "id": order.id,
-                "total_value": order.total_value,
-                "advance_payment": order.advance_payment,
-                "remaining_payment": order.remaining_payment,
-                "employee_name": order.employee.name if order.employee else "",
-                "attendant_name": order.attendant.name if order.attendant else "",
-                "order_date": order.order_date,
-                "prova_date": order.prova_date,
-                "retirada_date": order.retirada_date,
-                "devolucao_date": order.devolucao_date,
-                "production_date": order.production_date,
-                "data_recusa": order.data_recusa,
-                "data_finalizado": order.data_finalizado,
-                "client": client_data,
-                "justification_refusal": order.justification_refusal,
-                "event_date": (
-                    order.event.event_date.date()
-                    if order.event
-                    and order.event.event_date
-                    and hasattr(order.event.event_date, "date")
-                    else order.event.event_date if order.event else None
-                ),
-                "event_name": order.event.name if order.event else None,
-            }
-
-            # Processar itens da OS (mesma lógica do ServiceOrderListByPhaseAPIView)
-            itens = []
-            acessorios = []
-
-            for item in order.items.all():
-                # Determinar se é produto temporário ou produto real
-                temp_product = item.temporary_product
-                product = item.product
-
-                if temp_product:
-                    # Produto temporário
-                    if temp_product.product_type in [
-                        "paleto",
-                        "camisa",
-                        "calca",
-                        "colete",
-                    ]:
-                        # Item de roupa
-                        item_data = {
-                            "tipo": temp_product.product_type,
-                            "cor": temp_product.color or "",
-                            "extras": temp_product.extras
-                            or temp_product.description
-                            or "",
-                            "venda": temp_product.venda or False,
-                            "extensor": False,  # Extensor só para passante
-                        }
-
-                        # Campos específicos por tipo
-                        if temp_product.product_type in ["paleto", "camisa"]:
-                            item_data.update(
-                                {
-                                    "numero": temp_product.size or "",
-                                    "manga": temp_product.sleeve_length or "",
-                                    "marca": temp_product.brand or "",
-                                    "ajuste": item.adjustment_notes or "",
-                                }
-                            )
-                        elif temp_product.product_type == "calca":
-                            item_data.update(
-                                {
-                                    "numero": temp_product.size,
-                                    "cintura": temp_product.waist_size or "",
-                                    "perna": temp_product.leg_length or "",
-                                    "marca": temp_product.brand or "",
-                                    "ajuste_cintura": temp_product.ajuste_cintura or "",
-                                    "ajuste_comprimento": temp_product.ajuste_comprimento
-                                    or "",
-                                }
-                            )
-                        elif temp_product.product_type == "colete":
-                            item_data.update({"marca": temp_product.brand or ""})
-
-                        itens.append(item_data)
-                    else:
-                        # Acessório
-                        acessorio_data = {
-                            "tipo": temp_product.product_type,
-                            "numero": temp_product.size or "",
-                            "cor": temp_product.color or "",
-                            "descricao": temp_product.description or "",
-                            "marca": temp_product.brand or "",
-                            "extensor": temp_product.extensor or False,
-                            "venda": temp_product.venda or False,
-                        }
-                        acessorios.append(acessorio_data)
-
-                elif product:
-                    # Produto real do estoque
-                    if product.tipo.lower() in [
-                        "paleto",
-                        "camisa",
-                        "calça",
-                        "colete",
-                    ]:
-                        # Item de roupa
-                        item_data = {
-                            "tipo": product.tipo.lower(),
-                            "cor": product.cor or "",
-                            "extras": product.nome_produto or "",
-                            "venda": False,  # Produtos do estoque não são vendidos
-                            "extensor": False,
-                        }
-
-                        # Campos específicos por tipo
-                        if product.tipo.lower() in ["paleto", "camisa"]:
-                            item_data.update(
-                                {
-                                    "numero": (
-                                        str(product.tamanho) if product.tamanho else ""
-                                    ),
-                                    "manga": "",
-                                    "marca": product.marca or "",
-                                    "ajuste": item.adjustment_notes or "",
-                                }
-                            )
-                        elif product.tipo.lower() == "calça":
-                            item_data.update(
-                                {
-                                    "numero": (
-                                        str(product.tamanho) if product.tamanho else ""
-                                    ),
-                                    "cintura": "",
-                                    "perna": "",
-                                    "marca": product.marca or "",
-                                    "ajuste_cintura": "",
-                                    "ajuste_comprimento": "",
-                                }
-                            )
-                        elif product.tipo.lower() == "colete":
-                            item_data.update({"marca": product.marca or ""})
-
-                        itens.append(item_data)
-                    else:
-                        # Acessório
-                        acessorio_data = {
-                            "tipo": product.tipo.lower(),
-                            "numero": (str(product.tamanho) if product.tamanho else ""),
-                            "cor": product.cor or "",
-                            "descricao": product.nome_produto or "",
-                            "marca": product.marca or "",
-                            "extensor": False,  # Produtos do estoque não têm extensor
-                            "venda": False,
-                        }
-                        acessorios.append(acessorio_data)
-
-            # Dados da ordem de serviço no formato esperado pelo frontend
-            ordem_servico_data = {
-                "data_pedido": order.order_date,
-                "data_evento": (
-                    order.event.event_date.date()
-                    if order.event
-                    and order.event.event_date
-                    and hasattr(order.event.event_date, "date")
-                    else order.event.event_date if order.event else None
-                ),
-                "data_retirada": order.retirada_date,
-                "data_devolucao": order.devolucao_date,
-                "modalidade": order.service_type or "Aluguel",
-                "itens": itens,
-                "acessorios": acessorios,
-                "pagamento": {
-                    "total": float(order.total_value) if order.total_value else 0,
-                    "sinal": (
-                        float(order.advance_payment) if order.advance_payment else 0
-                    ),
-                    "restante": (
-                        float(order.remaining_payment) if order.remaining_payment else 0
-                    ),
-                    "forma_pagamento": order.payment_method or "",
-                },
-            }
-
-            # Adicionar dados completos ao response
-            order_data.update({"ordem_servico": ordem_servico_data})
-
-            return Response(order_data)
+            # Buscar a ordem de serviço com cliente, contatos, endereços e itens
+            order = listing.with_related(ServiceOrder.objects).get(id=order_id)
+            return Response(listing.detail_payload(order))
 
         except ServiceOrder.DoesNotExist:
             return Response(
@@ -1038,56 +764,9 @@ class ServiceOrderMarkPaidAPIView(APIView):
         """Marcar ordem de serviço como paga e concluída"""
         try:
             service_order = get_object_or_404(ServiceOrder, id=order_id)
-
-            if not service_order.service_order_phase:
-                return Response(
-                    {"error": "OS não possui fase definida."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            if service_order.service_order_phase.name == "FINALIZADO":
-                return Response(
-                    {"error": "OS já está finalizada."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            if service_order.service_order_phase.name != "AGUARDANDO_DEVOLUCAO":
-                return Response(
-                    {
-                        "error": "OS deve estar na fase AGUARDANDO_DEVOLUCAO para ser marcada como paga."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            finalizado_phase, created = ServiceOrderPhase.objects.get_or_create(
-                name="FINALIZADO", defaults={"created_by": request.user}
-            )
-
-            user_person = getattr(request.user, "person", None)
-            is_admin = user_person and user_person.person_type.type == "ADMINISTRADOR"
-            is_employee = (
-                user_person
-                and service_order.employee
-                and user_person.id == service_order.employee.id
-            )
-            is_attendant = (
-                user_person
-                and service_order.attendant
-                and user_person.id == service_order.attendant.id
-            )
-
-            if not (is_admin or is_employee or is_attendant):
-                return Response(
-                    {
-                        "error": "Apenas o atendente responsável, recepcionista ou um administrador pode marcar uma OS como paga."
-                    },
-                    status=status.HTTP_403_FORBIDDEN,
-                )
-
-            service_order.service_order_phase = finalizado_phase
-            service_order.data_devolvido = timezone.now()
-            service_order.data_finalizado = date.today()
-            service_order.save()
+            result = state_machine.apply("mark_paid", [service_order], request.user)[0]
+            if not result.success:
+                return Response({"error": result.error}, status=result.status_code)
 
             return Response(
                 {
@@ -1161,42 +840,17 @@ class ServiceOrderRefuseAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            refused_phase, created = ServiceOrderPhase.objects.get_or_create(
-                name="RECUSADA", defaults={"created_by": request.user}
-            )
-
-            current_phase = service_order.service_order_phase
-            allowed_phases = ["PENDENTE", "EM_PRODUCAO", "AGUARDANDO_RETIRADA"]
-
-            if current_phase and current_phase.name not in allowed_phases:
-                return Response(
-                    {
-                        "error": f"OS não pode ser recusada na fase atual ({current_phase.name}). Apenas fases {', '.join(allowed_phases)} ou OS sem fase definida podem ser recusadas."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            user_person = getattr(request.user, "person", None)
-            is_admin = user_person and user_person.person_type.type == "ADMINISTRADOR"
-            is_employee = (
-                user_person
-                and service_order.employee
-                and user_person.id == service_order.employee.id
-            )
-
-            if not (is_admin or is_employee or not service_order.employee):
-                return Response(
-                    {
-                        "error": "Apenas o atendente responsável, um administrador, ou usuários autorizados para triagem podem recusar uma OS."
-                    },
-                    status=status.HTTP_403_FORBIDDEN,
-                )
-
-            service_order.service_order_phase = refused_phase
-            service_order.justification_refusal = justification
-            service_order.justification_reason = refusal_reason
-            service_order.data_recusa = date.today()
-            service_order.cancel(request.user)  # Atualiza date_canceled e canceled_by
+            result = state_machine.apply(
+                "refuse",
+                [service_order],
+                request.user,
+                changes={
+                    "justification_refusal": justification,
+                    "justification_reason_id": refusal_reason.id,
+                },
+            )[0]
+            if not result.success:
+                return Response({"error": result.error}, status=result.status_code)
 
             return Response(
                 {
@@ -1239,6 +893,7 @@ class ServiceOrderRefuseAPIView(APIView):
 class RefusalReasonsListAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @cached_response("refusal_reasons")
     def get(self, request):
         """Lista todos os motivos de recusa/cancelamento"""
         try:
@@ -1283,67 +938,10 @@ class ServiceOrderMarkRetrievedAPIView(APIView):
         """Marcar ordem de serviço como retirada"""
         try:
             service_order = get_object_or_404(ServiceOrder, id=order_id)
-
-            # Verificar se a OS pode ser marcada como retirada
-            if not service_order.service_order_phase:
-                return Response(
-                    {"error": "OS não possui fase definida."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Verificar se já está na fase AGUARDANDO_DEVOLUCAO
-            if service_order.service_order_phase.name == "AGUARDANDO_DEVOLUCAO":
-                return Response(
-                    {"error": "OS já está aguardando devolução."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Verificar se já está finalizada
-            if service_order.service_order_phase.name == "FINALIZADO":
-                return Response(
-                    {"error": "OS já está finalizada."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Verificar se está na fase EM_PRODUCAO ou AGUARDANDO_RETIRADA
-            if service_order.service_order_phase.name not in [
-                "EM_PRODUCAO",
-                "AGUARDANDO_RETIRADA",
-            ]:
-                return Response(
-                    {
-                        "error": "OS deve estar na fase EM_PRODUCAO ou AGUARDANDO_RETIRADA para ser marcada como retirada."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Buscar ou criar fase "AGUARDANDO_DEVOLUCAO"
-            aguardando_devolucao_phase, created = (
-                ServiceOrderPhase.objects.get_or_create(
-                    name="AGUARDANDO_DEVOLUCAO", defaults={"created_by": request.user}
-                )
-            )
-
-            user_person = getattr(request.user, "person", None)
-            is_admin = user_person and user_person.person_type.type == "ADMINISTRADOR"
-            is_employee = (
-                user_person
-                and service_order.employee
-                and user_person.id == service_order.employee.id
-            )
-            is_attendant = (
-                user_person
-                and service_order.attendant
-                and user_person.id == service_order.attendant.id
-            )
-
-            if not (is_admin or is_employee or is_attendant):
-                return Response(
-                    {
-                        "error": "Apenas o atendente responsável, recepcionista ou um administrador pode marcar uma OS como retirada."
-                    },
-                    status=status.HTTP_403_FORBIDDEN,
-                )
+            try:
+                state_machine.check("mark_retrieved", service_order, request.user)
+            except state_machine.TransitionError as error:
+                return Response({"error": error.message}, status=error.status_code)
 
             serializer = self.serializer_class(data=request.data)
             serializer.is_valid(raise_exception=True)
@@ -1388,9 +986,23 @@ class ServiceOrderMarkRetrievedAPIView(APIView):
                 else:
                     service_order.payment_method = formas_str
 
-            service_order.service_order_phase = aguardando_devolucao_phase
-            service_order.data_retirado = timezone.now()
-            service_order.save()
+                payment_changes = {
+                    "advance_payment": service_order.advance_payment,
+                    "payment_details": service_order.payment_details,
+                    "payment_method": service_order.payment_method,
+                }
+                if service_order.total_value is not None:
+                    payment_changes["remaining_payment"] = (
+                        service_order.total_value - service_order.advance_payment
+                    )
+            else:
+                payment_changes = None
+
+            result = state_machine.apply(
+                "mark_retrieved", [service_order], request.user, payment_changes
+            )[0]
+            if not result.success:
+                return Response({"error": result.error}, status=result.status_code)
 
             return Response(
                 {
@@ -1438,54 +1050,9 @@ class ServiceOrderMarkReadyAPIView(APIView):
         """Marcar ordem de serviço como pronta para retirada"""
         try:
             service_order = get_object_or_404(ServiceOrder, id=order_id)
-
-            # Verificar se a OS pode ser marcada como pronta
-            if not service_order.service_order_phase:
-                return Response(
-                    {"error": "OS não possui fase definida."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Verificar se está na fase EM_PRODUCAO
-            if service_order.service_order_phase.name != "EM_PRODUCAO":
-                return Response(
-                    {
-                        "error": "OS deve estar na fase EM_PRODUCAO para ser marcada como pronta."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Buscar ou criar fase "AGUARDANDO_RETIRADA"
-            aguardando_retirada_phase, created = (
-                ServiceOrderPhase.objects.get_or_create(
-                    name="AGUARDANDO_RETIRADA", defaults={"created_by": request.user}
-                )
-            )
-
-            user_person = getattr(request.user, "person", None)
-            is_admin = user_person and user_person.person_type.type == "ADMINISTRADOR"
-            is_employee = (
-                user_person
-                and service_order.employee
-                and user_person.id == service_order.employee.id
-            )
-            is_attendant = (
-                user_person
-                and service_order.attendant
-                and user_person.id == service_order.attendant.id
-            )
-
-            if not (is_admin or is_employee or is_attendant):
-                return Response(
-                    {
-                        "error": "Apenas o atendente responsável, recepcionista ou um administrador pode marcar uma OS como pronta."
-                    },
-                    status=status.HTTP_403_FORBIDDEN,
-                )
-
-            # Marcar como pronta (mover para AGUARDANDO_RETIRADA)
-            service_order.service_order_phase = aguardando_retirada_phase
-            service_order.save()
+            result = state_machine.apply("mark_ready", [service_order], request.user)[0]
+            if not result.success:
+                return Response({"error": result.error}, status=result.status_code)
 
             return Response(
                 {
@@ -1532,78 +1099,119 @@ class ServiceOrderReturnToPendingAPIView(APIView):
         """Retornar ordem de serviço para pendente"""
         try:
             service_order = get_object_or_404(ServiceOrder, id=order_id)
+            result = state_machine.apply(
+                "return_to_pending", [service_order], request.user
+            )[0]
+            if not result.success:
+                return Response({"error": result.error}, status=result.status_code)
 
-            # Verificar se a OS possui fase definida
-            if not service_order.service_order_phase:
-                return Response(
-                    {"error": "OS não possui fase definida."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Verificar se já está na fase PENDENTE
-            if service_order.service_order_phase.name == "PENDENTE":
-                return Response(
-                    {"error": "OS já está na fase PENDENTE."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Verificar se está finalizada (não permitir retornar)
-            if service_order.service_order_phase.name in ["FINALIZADO"]:
-                return Response(
-                    {"error": "OS finalizada não pode ser retornada para pendente."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Buscar ou criar fase "PENDENTE"
-            pendente_phase, created = (
-                ServiceOrderPhase.objects.get_or_create(
-                    name="PENDENTE", defaults={"created_by": request.user}
-                )
+            return Response(
+                {
+                    "success": True,
+                    "message": "OS retornada para pendente com sucesso",
+                }
             )
 
-            user_person = getattr(request.user, "person", None)
-            is_admin = user_person and user_person.person_type.type == "ADMINISTRADOR"
-            is_employee = (
-                user_person
-                and service_order.employee
-                and user_person.id == service_order.employee.id
+        except ServiceOrder.DoesNotExist:
+            return Response(
+                {"error": "Ordem de serviço não encontrada"},
+                status=status.HTTP_404_NOT_FOUND,
             )
-            is_attendant = (
-                user_person
-                and service_order.attendant
-                and user_person.id == service_order.attendant.id
+        except Exception as e:
+            return Response(
+                {"error": f"Erro ao retornar OS para pendente: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-            if not (is_admin or is_employee or is_attendant):
-                return Response(
-                    {
-                        "error": "Apenas o atendente responsável, recepcionista ou um administrador pode retornar uma OS para pendente."
+
+@extend_schema(
+    tags=["service-orders"],
+    summary="Mudar a fase de várias ordens de serviço",
+    description="Aplica a mesma mudança de fase (pronta, retirada, paga, recusada ou retorno para pendente) a uma lista de OS. Fases de origem e permissões são validadas por OS; as OS válidas são atualizadas numa transação, com um UPDATE por fase de origem. Retorna o resultado de cada OS.",
+    request=ServiceOrderBulkTransitionSerializer,
+    responses={
+        200: {
+            "description": "Resultado por OS",
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "target_phase": {"type": "string"},
+                "updated": {"type": "integer"},
+                "failed": {"type": "integer"},
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer"},
+                            "success": {"type": "boolean"},
+                            "previous_phase": {"type": "string"},
+                            "error": {"type": "string"},
+                        },
                     },
-                    status=status.HTTP_403_FORBIDDEN,
+                },
+            },
+        },
+        400: {"description": "Dados inválidos"},
+        500: {"description": "Erro interno do servidor"},
+    },
+)
+class ServiceOrderBulkTransitionAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = ServiceOrderBulkTransitionSerializer
+
+    def post(self, request):
+        """Mudar a fase de várias ordens de serviço"""
+        try:
+            from .models import RefusalReason
+
+            serializer = self.serializer_class(data=request.data)
+            if not serializer.is_valid():
+                return Response(
+                    {"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST
                 )
+            data = serializer.validated_data
+            target_phase = data["target_phase"]
 
-            # Retornar para pendente
-            service_order.service_order_phase = pendente_phase
-            # Opcional: limpar datas de produção ou retirada se necessário
-            # service_order.production_date = None
-            # service_order.data_retirado = None
-            service_order.save()
+            changes = None
+            if target_phase == "RECUSADA":
+                refusal_reason = RefusalReason.objects.filter(
+                    id=data["justification_reason_id"]
+                ).first()
+                if refusal_reason is None:
+                    return Response(
+                        {"error": "Motivo de recusa inválido."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                justification = (data.get("justification_refusal") or "").strip()
+                changes = {
+                    "justification_refusal": justification or None,
+                    "justification_reason_id": refusal_reason.id,
+                }
 
+            ordered_results = [
+                result.as_dict()
+                for result in state_machine.apply_to_ids(
+                    state_machine.BY_TARGET[target_phase],
+                    data["order_ids"],
+                    request.user,
+                    changes,
+                )
+            ]
+            updated = sum(1 for result in ordered_results if result["success"])
             return Response(
                 {
                     "success": True,
-                    "message": "OS retornada para pendente com sucesso",
+                    "target_phase": target_phase,
+                    "updated": updated,
+                    "failed": len(ordered_results) - updated,
+                    "results": ordered_results,
                 }
             )
 
-        except ServiceOrder.DoesNotExist:
-            return Response(
-                {"error": "Ordem de serviço não encontrada"},
-                status=status.HTTP_404_NOT_FOUND,
-            )
         except Exception as e:
             return Response(
-                {"error": f"Erro ao retornar OS para pendente: {str(e)}"},
+                {"error": f"Erro ao mudar fase das OS: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
@@ -1672,6 +1280,17 @@ class ServiceOrderReturnToPendingAPIView(APIView):
             description="Canal de origem (came_from) para filtrar",
             required=False,
         ),
+        OpenApiParameter(
+            name="granularity",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Use 'day' para incluir `resultados_diarios`: total pedido, "
+                "recebido e número de pedidos de cada dia do mês atual"
+            ),
+            required=False,
+            enum=["day"],
+        ),
     ],
     responses={
         200: ServiceOrderDashboardResponseSerializer,
@@ -1698,6 +1317,12 @@ class ServiceOrderDashboardAPIView(APIView):
 
             # ========== PROCESSAR FILTROS ==========
             filters = self._parse_filters(request)
+            granularity = request.query_params.get("granularity")
+            if granularity not in (None, "", "day"):
+                return Response(
+                    {"error": "granularity inválida. Use 'day'."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             
             # Datas para cálculos de período
             today = date.today()
@@ -1705,43 +1330,48 @@ class ServiceOrderDashboardAPIView(APIView):
             month_start = today.replace(day=1)
             in_10_days = today + timedelta(days=10)
             
-            # ========== BUSCAR DADOS BASE ==========
-            base_queryset = self._get_base_queryset(filters)
-            
             # ========== CALCULAR MÉTRICAS NOVAS (estilo Looker) ==========
-            kpis = self._calculate_kpis(base_queryset, filters)
-            atendentes_conversao = self._calculate_atendentes_taxa_conversao(base_queryset, filters)
-            atendentes_vendido = self._calculate_atendentes_total_vendido(base_queryset, filters)
-            grafico_tipo_cliente = self._calculate_grafico_tipo_cliente(base_queryset, filters)
-            grafico_canal_origem = self._calculate_grafico_canal_origem(base_queryset, filters)
-            grafico_aluguel_venda = self._calculate_grafico_aluguel_venda(base_queryset, filters)
-            filtros_disponiveis = self._get_available_filters()
+            # Dependem só dos filtros e do período: cache por período
+            period_metrics = metrics.period_cached(
+                "dashboard",
+                filters["data_inicio"],
+                filters["data_fim"],
+                sorted(
+                    (key, value)
+                    for key, value in filters.items()
+                    if key not in ("data_inicio", "data_fim")
+                ),
+                lambda: self._calculate_period_metrics(filters),
+            )
+            filtros_disponiveis = self._get_available_filters()
             
             # ========== CALCULAR MÉTRICAS LEGADAS (agenda e resultados) ==========
             status_metrics = self._calculate_status_metrics(today, in_10_days)
-            resultados = self._calculate_financial_metrics(today, week_start, month_start)
+            resultados, resultados_diarios = self._calculate_financial_metrics(
+                today, week_start, month_start
+            )
+
+            data = {
+                # Métricas novas (estilo Looker)
+                **period_metrics,
+                "filtros_disponiveis": filtros_disponiveis,
+                "periodo": {
+                    "data_inicio": filters["data_inicio"].isoformat(),
+                    "data_fim": filters["data_fim"].isoformat(),
+                },
+                # Métricas legadas (agenda e resultados financeiros)
+                "status": status_metrics,
+                "resultados": resultados,
+            }
+            if granularity == "day":
+                # Série diária do mês, da mesma query dos resultados
+                data["resultados_diarios"] = resultados_diarios
 
             return Response(
                 {
                     "status": 200,
                     "message": "Dados analíticos recuperados com sucesso",
-                    "data": {
-                        # Métricas novas (estilo Looker)
-                        "kpis": kpis,
-                        "atendentes_taxa_conversao": atendentes_conversao,
-                        "atendentes_total_vendido": atendentes_vendido,
-                        "grafico_tipo_cliente": grafico_tipo_cliente,
-                        "grafico_canal_origem": grafico_canal_origem,
-                        "grafico_aluguel_venda": grafico_aluguel_venda,
-                        "filtros_disponiveis": filtros_disponiveis,
-                        "periodo": {
-                            "data_inicio": filters["data_inicio"].isoformat(),
-                            "data_fim": filters["data_fim"].isoformat(),
-                        },
-                        # Métricas legadas (agenda e resultados financeiros)
-                        "status": status_metrics,
-                        "resultados": resultados,
-                    },
+                    "data": data,
                 }
             )
 
@@ -1753,6 +1383,29 @@ class ServiceOrderDashboardAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    def _calculate_period_metrics(self, filters):
+        """Métricas do período filtrado (KPIs, atendentes e gráficos)"""
+        base_queryset = self._get_base_queryset(filters)
+        dimension_rows = self._group_by_dimensions(base_queryset)
+        return {
+            "kpis": self._calculate_kpis(base_queryset, filters),
+            "atendentes_taxa_conversao": self._calculate_atendentes_taxa_conversao(
+                base_queryset, filters
+            ),
+            "atendentes_total_vendido": self._calculate_atendentes_total_vendido(
+                base_queryset, filters
+            ),
+            "grafico_tipo_cliente": self._calculate_grafico_tipo_cliente(
+                dimension_rows, filters
+            ),
+            "grafico_canal_origem": self._calculate_grafico_canal_origem(
+                dimension_rows, filters
+            ),
+            "grafico_aluguel_venda": self._calculate_grafico_aluguel_venda(
+                dimension_rows, filters
+            ),
+        }
+
     def _parse_filters(self, request):
         """Parse query parameters para filtros"""
         today = date.today()
@@ -1801,19 +1454,7 @@ class ServiceOrderDashboardAPIView(APIView):
         ).select_related("service_order_phase", "employee", "renter")
         
         # Aplicar filtros opcionais
-        if filters["atendente_id"]:
-            qs = qs.filter(employee_id=filters["atendente_id"])
-            
-        if filters["tipo_cliente"]:
-            qs = qs.filter(renter_role__iexact=filters["tipo_cliente"])
-            
-        if filters["forma_pagamento"]:
-            qs = qs.filter(payment_method__icontains=filters["forma_pagamento"])
-            
-        if filters["canal_origem"]:
-            qs = qs.filter(came_from__iexact=filters["canal_origem"])
-        
-        return qs
+        return metrics.filter_orders(qs, filters)
 
     def _calculate_kpis(self, queryset, filters):
         """
@@ -1836,12 +1477,12 @@ class ServiceOrderDashboardAPIView(APIView):
         total_atendimentos = queryset.count()
         
         # Atendimentos fechados (confirmados)
-        qs_fechados = queryset.filter(service_order_phase__name__in=fases_fechadas)
+        qs_fechados = queryset.filter(service_order_phase_id__in=phases.phase_ids(*fases_fechadas))
         atendimentos_fechados = qs_fechados.count()
         
         # Atendimentos não fechados (recusados)
         atendimentos_nao_fechados = queryset.filter(
-            service_order_phase__name="RECUSADA"
+            service_order_phase_id__in=phases.phase_ids("RECUSADA")
         ).count()
         
         # Total Vendido (valor das OS confirmadas)
@@ -1856,7 +1497,7 @@ class ServiceOrderDashboardAPIView(APIView):
             if order.advance_payment:
                 total_recebido += order.advance_payment
             # Só soma remaining_payment se a OS estiver finalizada
-            if order.service_order_phase and order.service_order_phase.name == "FINALIZADO":
+            if phases.phase_name(order.service_order_phase_id) == "FINALIZADO":
                 if order.remaining_payment:
                     total_recebido += order.remaining_payment
         
@@ -1908,7 +1549,7 @@ class ServiceOrderDashboardAPIView(APIView):
                 continue
             
             num_fechados = qs_atendente.filter(
-                service_order_phase__name__in=fases_fechadas
+                service_order_phase_id__in=phases.phase_ids(*fases_fechadas)
             ).count()
             
             taxa = round(
@@ -1944,7 +1585,7 @@ class ServiceOrderDashboardAPIView(APIView):
         ]
         
         # Buscar todos os employees distintos que têm OS fechadas no período
-        qs_fechadas = queryset.filter(service_order_phase__name__in=fases_fechadas)
+        qs_fechadas = queryset.filter(service_order_phase_id__in=phases.phase_ids(*fases_fechadas))
         employee_ids = qs_fechadas.exclude(employee__isnull=True).values_list('employee_id', flat=True).distinct()
         
         result = []
@@ -1978,134 +1619,117 @@ class ServiceOrderDashboardAPIView(APIView):
         
         return result
 
-    def _calculate_grafico_tipo_cliente(self, queryset, filters):
+    def _group_by_dimensions(self, queryset):
+        """
+        Agrega as OS do período por (tipo de cliente, canal de origem, tipo de
+        serviço), pelos ids dos valores canônicos (OrderDimension), numa
+        única query. Os gráficos somam as linhas no eixo de cada um.
+        """
+        fechadas = models.Q(
+            service_order_phase_id__in=phases.phase_ids(*metrics.CONFIRMED_PHASES)
+        )
+        return list(
+            queryset.values(
+                "renter_role_dimension_id",
+                "came_from_dimension_id",
+                "service_type_dimension_id",
+            )
+            .order_by()
+            .annotate(
+                atendimentos=models.Count("pk"),
+                atendimentos_fechados=models.Count("pk", filter=fechadas),
+                total_vendido=models.Sum("total_value", filter=fechadas),
+            )
+        )
+
+    def _calculate_grafico_tipo_cliente(self, rows, filters):
         """
         Calcula dados para gráfico de atendimentos por tipo de cliente (renter_role)
         Similar ao gráfico inferior esquerdo do Looker
         """
-        fases_fechadas = [
-            "EM_PRODUCAO",
-            "AGUARDANDO_RETIRADA",
-            "AGUARDANDO_DEVOLUCAO",
-            "FINALIZADO",
-        ]
-        
-        # Agrupar por renter_role
+        # Agrupar por renter_role (valor canônico)
         tipo_counts = {}
-        
-        for order in queryset:
-            tipo = order.renter_role.upper() if order.renter_role else "NÃO INFORMADO"
-            
-            if tipo not in tipo_counts:
-                tipo_counts[tipo] = {
-                    "atendimentos_fechados": 0,
-                    "total_vendido": Decimal("0.00"),
-                }
-            
-            # Verificar se está fechado
-            if order.service_order_phase and order.service_order_phase.name in fases_fechadas:
-                tipo_counts[tipo]["atendimentos_fechados"] += 1
-                if order.total_value:
-                    tipo_counts[tipo]["total_vendido"] += order.total_value
-        
-        # Converter para lista ordenada
-        result = []
-        for tipo, dados in tipo_counts.items():
-            result.append({
+        for row in rows:
+            tipo = (
+                dimensions.dimension_name(row["renter_role_dimension_id"])
+                or "NÃO INFORMADO"
+            )
+            dados = tipo_counts.setdefault(
+                tipo, {"atendimentos_fechados": 0, "total_vendido": Decimal("0.00")}
+            )
+            dados["atendimentos_fechados"] += row["atendimentos_fechados"]
+            dados["total_vendido"] += row["total_vendido"] or 0
+
+        result = [
+            {
                 "tipo": tipo,
                 "atendimentos_fechados": dados["atendimentos_fechados"],
                 "total_vendido": float(dados["total_vendido"]),
-            })
-        
+            }
+            for tipo, dados in tipo_counts.items()
+        ]
+
         # Ordenar por atendimentos fechados (maior primeiro)
-        result.sort(key=lambda x: x["atendimentos_fechados"], reverse=True)
+        result.sort(key=lambda x: (-x["atendimentos_fechados"], x["tipo"]))
         
         return result
 
-    def _calculate_grafico_canal_origem(self, queryset, filters):
+    def _calculate_grafico_canal_origem(self, rows, filters):
         """
         Calcula dados para gráfico de atendimentos por canal de origem (came_from)
         Similar ao gráfico inferior direito do Looker
         """
-        fases_fechadas = [
-            "EM_PRODUCAO",
-            "AGUARDANDO_RETIRADA",
-            "AGUARDANDO_DEVOLUCAO",
-            "FINALIZADO",
-        ]
-        
-        # Agrupar por canal
+        # Agrupar por canal (valor canônico)
         canal_counts = {}
-        
-        for order in queryset:
-            canal = order.came_from.upper() if order.came_from else "NÃO INFORMADO"
-            
-            if canal not in canal_counts:
-                canal_counts[canal] = {
-                    "atendimentos": 0,
-                    "atendimentos_fechados": 0,
-                }
-            
-            canal_counts[canal]["atendimentos"] += 1
-            
-            # Verificar se está fechado
-            if order.service_order_phase and order.service_order_phase.name in fases_fechadas:
-                canal_counts[canal]["atendimentos_fechados"] += 1
-        
-        # Converter para lista ordenada
-        result = []
-        for canal, dados in canal_counts.items():
-            result.append({
+        for row in rows:
+            canal = (
+                dimensions.dimension_name(row["came_from_dimension_id"])
+                or "NÃO INFORMADO"
+            )
+            dados = canal_counts.setdefault(
+                canal, {"atendimentos": 0, "atendimentos_fechados": 0}
+            )
+            dados["atendimentos"] += row["atendimentos"]
+            dados["atendimentos_fechados"] += row["atendimentos_fechados"]
+
+        result = [
+            {
                 "canal": canal,
                 "atendimentos": dados["atendimentos"],
                 "atendimentos_fechados": dados["atendimentos_fechados"],
-            })
-        
+            }
+            for canal, dados in canal_counts.items()
+        ]
+
         # Ordenar por atendimentos (maior primeiro)
-        result.sort(key=lambda x: x["atendimentos"], reverse=True)
+        result.sort(key=lambda x: (-x["atendimentos"], x["canal"]))
         
         return result
 
-    def _calculate_grafico_aluguel_venda(self, queryset, filters):
+    def _calculate_grafico_aluguel_venda(self, rows, filters):
         """
         Calcula dados para gráfico de valores por tipo de serviço (aluguel vs venda)
         Mostra valores totais de aluguel e venda no período, ignorando 'Aluguel + Venda'
         """
-        fases_fechadas = [
-            "EM_PRODUCAO",
-            "AGUARDANDO_RETIRADA",
-            "AGUARDANDO_DEVOLUCAO",
-            "FINALIZADO",
-        ]
-        
-        # Agrupar por tipo de serviço
+        # Mapear apenas Aluguel e Venda, ignorar outros (como Aluguel + Venda, Compra)
         tipo_counts = {}
-        
-        for order in queryset:
-            tipo = order.service_type
-            
-            # Mapear apenas Aluguel e Venda, ignorar outros (como Aluguel + Venda, Compra)
-            if tipo == "Aluguel":
-                tipo_key = "ALUGUEL"
-            elif tipo == "Venda":
-                tipo_key = "VENDA"
-            else:
-                continue  # Ignorar outros tipos
-            
-            if tipo_key not in tipo_counts:
-                tipo_counts[tipo_key] = {
-                    "tipo": tipo_key,
+        for row in rows:
+            tipo = dimensions.dimension_name(row["service_type_dimension_id"])
+            if tipo not in ("ALUGUEL", "VENDA"):
+                continue
+            dados = tipo_counts.setdefault(
+                tipo,
+                {
+                    "tipo": tipo,
                     "valor_total": Decimal("0.00"),
                     "quantidade_os": 0,
                     "valor_medio": Decimal("0.00"),
-                }
-            
+                },
+            )
             # Só contar valores de OS fechadas
-            if order.service_order_phase and order.service_order_phase.name in fases_fechadas:
-                if order.total_value:
-                    tipo_counts[tipo_key]["valor_total"] += order.total_value
-                tipo_counts[tipo_key]["quantidade_os"] += 1
-        
+            dados["valor_total"] += row["total_vendido"] or 0
+            dados["quantidade_os"] += row["atendimentos_fechados"]
+
         # Calcular valor médio
         result = []
         for tipo, dados in tipo_counts.items():
@@ -2114,9 +1738,9 @@ class ServiceOrderDashboardAPIView(APIView):
             dados["valor_total"] = float(dados["valor_total"])
             dados["valor_medio"] = float(dados["valor_medio"])
             result.append(dados)
-        
+
         # Ordenar por valor total (maior primeiro)
-        result.sort(key=lambda x: x["valor_total"], reverse=True)
+        result.sort(key=lambda x: (-x["valor_total"], x["tipo"]))
         
         return result
 
@@ -2124,205 +1748,25 @@ class ServiceOrderDashboardAPIView(APIView):
         """
         Retorna opções de filtros disponíveis para o frontend
         Busca atendentes a partir dos employees que têm OS, não pelo PersonType.
+        As opções ficam em cache e são atualizadas quando uma OS é salva.
         """
-        from accounts.models import Person
-        
-        # Atendentes - buscar todos os employees distintos que têm OS
-        employee_ids = ServiceOrder.objects.exclude(
-            employee__isnull=True
-        ).values_list("employee_id", flat=True).distinct()
-        
-        atendentes = []
-        for emp_id in employee_ids:
-            try:
-                p = Person.objects.get(id=emp_id)
-                atendentes.append({"id": p.id, "nome": p.name})
-            except Person.DoesNotExist:
-                continue
-        
-        # Ordenar atendentes por nome
-        atendentes.sort(key=lambda x: x["nome"])
-        
-        # Tipos de cliente (valores únicos de renter_role)
-        tipos_cliente = list(
-            ServiceOrder.objects.exclude(renter_role__isnull=True)
-            .exclude(renter_role="")
-            .values_list("renter_role", flat=True)
-            .distinct()
-        )
-        tipos_cliente = [t.upper() for t in tipos_cliente if t]
-        tipos_cliente = sorted(list(set(tipos_cliente)))
-        
-        # Formas de pagamento (valores únicos de payment_method)
-        formas_pagamento = list(
-            ServiceOrder.objects.exclude(payment_method__isnull=True)
-            .exclude(payment_method="")
-            .values_list("payment_method", flat=True)
-            .distinct()
-        )
-        formas_pagamento = [f.upper() for f in formas_pagamento if f]
-        formas_pagamento = sorted(list(set(formas_pagamento)))
-        
-        # Canais de origem (valores únicos de came_from)
-        canais_origem = list(
-            ServiceOrder.objects.exclude(came_from__isnull=True)
-            .exclude(came_from="")
-            .values_list("came_from", flat=True)
-            .distinct()
-        )
-        canais_origem = [c.upper() for c in canais_origem if c]
-        canais_origem = sorted(list(set(canais_origem)))
-        
-        return {
-            "atendentes": atendentes,
-            "tipos_cliente": tipos_cliente,
-            "formas_pagamento": formas_pagamento,
-            "canais_origem": canais_origem,
-        }
+        return metrics.filter_facets()
 
     def _calculate_status_metrics(self, today, in_10_days):
         """Calcula métricas de status e agenda (provas, retiradas, devoluções)"""
-        refused_phase = ServiceOrderPhase.objects.filter(name="RECUSADA").first()
-        atrasado_phase = ServiceOrderPhase.objects.filter(name="ATRASADO").first()
-
-        status = {
-            "em_atraso": {"provas": 0, "retiradas": 0, "devolucoes": 0},
-            "hoje": {"provas": 0, "retiradas": 0, "devolucoes": 0},
-            "proximos_10_dias": {"provas": 0, "retiradas": 0, "devolucoes": 0},
+        counts = metrics.agenda_counts(today, in_10_days)
+        return {
+            "em_atraso": counts["em_atraso"],
+            "hoje": counts["hoje"],
+            "proximos_10_dias": counts["proximos"],
         }
 
-        # Fases ativas para contagem
-        active_phases = [
-            "PENDENTE",
-            "EM_PRODUCAO",
-            "AGUARDANDO_RETIRADA",
-            "AGUARDANDO_DEVOLUCAO",
-        ]
-
-        # OS em atraso (fase ATRASADO ou RECUSADA com datas)
-        atraso_phases = []
-        if refused_phase:
-            atraso_phases.append(refused_phase)
-        if atrasado_phase:
-            atraso_phases.append(atrasado_phase)
-            
-        if atraso_phases:
-            for phase in atraso_phases:
-                status["em_atraso"]["provas"] += ServiceOrder.objects.filter(
-                    service_order_phase=phase, prova_date__isnull=False
-                ).count()
-                status["em_atraso"]["retiradas"] += ServiceOrder.objects.filter(
-                    service_order_phase=phase, retirada_date__isnull=False
-                ).count()
-                status["em_atraso"]["devolucoes"] += ServiceOrder.objects.filter(
-                    service_order_phase=phase, devolucao_date__isnull=False
-                ).count()
-
-        # Também contar OS atrasadas pela flag esta_atrasada
-        status["em_atraso"]["retiradas"] += ServiceOrder.objects.filter(
-            esta_atrasada=True,
-            retirada_date__lt=today,
-            service_order_phase__name__in=active_phases,
-        ).count()
-        status["em_atraso"]["devolucoes"] += ServiceOrder.objects.filter(
-            esta_atrasada=True,
-            devolucao_date__lt=today,
-            service_order_phase__name__in=active_phases,
-        ).count()
-
-        # OS de hoje
-        status["hoje"]["provas"] = ServiceOrder.objects.filter(
-            prova_date=today, service_order_phase__name__in=active_phases
-        ).count()
-        status["hoje"]["retiradas"] = ServiceOrder.objects.filter(
-            retirada_date=today, service_order_phase__name__in=active_phases
-        ).count()
-        status["hoje"]["devolucoes"] = ServiceOrder.objects.filter(
-            devolucao_date=today, service_order_phase__name__in=active_phases
-        ).count()
-
-        # OS próximos 10 dias
-        status["proximos_10_dias"]["provas"] = ServiceOrder.objects.filter(
-            prova_date__gt=today,
-            prova_date__lte=in_10_days,
-            service_order_phase__name__in=active_phases,
-        ).count()
-        status["proximos_10_dias"]["retiradas"] = ServiceOrder.objects.filter(
-            retirada_date__gt=today,
-            retirada_date__lte=in_10_days,
-            service_order_phase__name__in=active_phases,
-        ).count()
-        status["proximos_10_dias"]["devolucoes"] = ServiceOrder.objects.filter(
-            devolucao_date__gt=today,
-            devolucao_date__lte=in_10_days,
-            service_order_phase__name__in=active_phases,
-        ).count()
-
-        return status
-
     def _calculate_financial_metrics(self, today, week_start, month_start):
-        """Calcula métricas financeiras - dia, semana, mês"""
-        finished_phase = ServiceOrderPhase.objects.filter(name="FINALIZADO").first()
-
-        # Fases consideradas como confirmadas (OS fechadas)
-        confirmed_phases = [
-            "EM_PRODUCAO",
-            "AGUARDANDO_RETIRADA",
-            "AGUARDANDO_DEVOLUCAO",
-            "FINALIZADO",
-        ]
-
-        resultados = {
-            "dia": {"total_pedidos": 0.00, "total_recebido": 0.00, "numero_pedidos": 0},
-            "semana": {"total_pedidos": 0.00, "total_recebido": 0.00, "numero_pedidos": 0},
-            "mes": {"total_pedidos": 0.00, "total_recebido": 0.00, "numero_pedidos": 0},
-        }
-
-        # Dia - apenas OS confirmadas
-        today_orders = ServiceOrder.objects.filter(
-            order_date=today,
-            service_order_phase__name__in=confirmed_phases,
-        )
-        for order in today_orders:
-            if order.total_value:
-                resultados["dia"]["total_pedidos"] += float(order.total_value)
-                resultados["dia"]["numero_pedidos"] += 1
-            if order.advance_payment:
-                resultados["dia"]["total_recebido"] += float(order.advance_payment)
-            if order.service_order_phase == finished_phase and order.remaining_payment:
-                resultados["dia"]["total_recebido"] += float(order.remaining_payment)
-
-        # Semana - apenas OS confirmadas
-        week_orders = ServiceOrder.objects.filter(
-            order_date__gte=week_start,
-            order_date__lte=today,
-            service_order_phase__name__in=confirmed_phases,
-        )
-        for order in week_orders:
-            if order.total_value:
-                resultados["semana"]["total_pedidos"] += float(order.total_value)
-                resultados["semana"]["numero_pedidos"] += 1
-            if order.advance_payment:
-                resultados["semana"]["total_recebido"] += float(order.advance_payment)
-            if order.service_order_phase == finished_phase and order.remaining_payment:
-                resultados["semana"]["total_recebido"] += float(order.remaining_payment)
-
-        # Mês - apenas OS confirmadas
-        month_orders = ServiceOrder.objects.filter(
-            order_date__gte=month_start,
-            order_date__lte=today,
-            service_order_phase__name__in=confirmed_phases,
-        )
-        for order in month_orders:
-            if order.total_value:
-                resultados["mes"]["total_pedidos"] += float(order.total_value)
-                resultados["mes"]["numero_pedidos"] += 1
-            if order.advance_payment:
-                resultados["mes"]["total_recebido"] += float(order.advance_payment)
-            if order.service_order_phase == finished_phase and order.remaining_payment:
-                resultados["mes"]["total_recebido"] += float(order.remaining_payment)
-
-        return resultados
+        """
+        Calcula métricas financeiras - dia, semana, mês - e a série diária do
+        mês (uma única query agrupada por dia)
+        """
+        return metrics.financial_rollup(today, week_start, month_start)
 
 
 class ServiceOrderAttendantMetricsAPIView(APIView):
@@ -2395,30 +1839,30 @@ class ServiceOrderAttendantMetricsAPIView(APIView):
 
                     total_atendimentos = orders.count()
                     finalizados = orders.filter(
-                        service_order_phase__name="FINALIZADO"
+                        service_order_phase_id__in=phases.phase_ids("FINALIZADO")
                     ).count()
                     cancelados = orders.filter(
-                        service_order_phase__name="RECUSADA"
+                        service_order_phase_id__in=phases.phase_ids("RECUSADA")
                     ).count()
                     em_andamento = orders.filter(
-                        service_order_phase__name__in=[
+                        service_order_phase_id__in=phases.phase_ids(
                             "PENDENTE",
                             "EM_PRODUCAO",
                             "AGUARDANDO_RETIRADA",
                             "AGUARDANDO_DEVOLUCAO",
-                        ]
+                        )
                     ).count()
 
                     # Taxa de conversão
                     # Considera sucesso: OS que foram retiradas (AGUARDANDO_DEVOLUCAO),
                     # aguardando retirada (confirmadas), em produção ou finalizadas
                     sucesso = orders.filter(
-                        service_order_phase__name__in=[
+                        service_order_phase_id__in=phases.phase_ids(
                             "FINALIZADO",
                             "AGUARDANDO_DEVOLUCAO",
                             "AGUARDANDO_RETIRADA",
                             "EM_PRODUCAO",
-                        ]
+                        )
                     ).count()
                     taxa_conversao = round(
                         (
@@ -2508,493 +1952,169 @@ class ServiceOrderAttendantMetricsAPIView(APIView):
             )
 
 
-@extend_schema(
-    tags=["service-orders"],
-    summary="Listar ordens de serviço por fase",
-    description="Retorna a lista de ordens de serviço filtradas por fase específica com dados completos do cliente",
-    responses={
-        200: ServiceOrderListByPhaseSerializer(many=True),
-        404: {"description": "Fase não encontrada"},
-        500: {"description": "Erro interno do servidor"},
-    },
-)
-class ServiceOrderListByPhaseAPIView(APIView):
-    permission_classes = [IsAuthenticated]
-    serializer_class = ServiceOrderListByPhaseSerializer
-
-    def get(self, request, phase_name):
-        """Listar ordens de serviço por fase com dados completos do cliente"""
-        try:
-            today = date.today()
-
-            # Função para mover automaticamente para RECUSADA quem passou da data do evento
-            def move_to_refused_if_event_passed():
-                refused_phase = ServiceOrderPhase.objects.filter(
-                    name="RECUSADA"
-                ).first()
-                if not refused_phase:
-                    return
-
-                # Buscar OS que passaram da data do evento e não foram retiradas
-                overdue_orders = ServiceOrder.objects.filter(
-                    event__event_date__lt=today,
-                    data_retirado__isnull=True,  # Não foi retirada
-                    service_order_phase__name__in=[
-                        "PENDENTE",
-                        "EM_PRODUCAO",
-                        "AGUARDANDO_DEVOLUCAO",
-                        "FINALIZADO",
-                        "AGUARDANDO_RETIRADA",
-                    ],
-                    event__isnull=False,  # Só OS com evento vinculado
-                ).exclude(service_order_phase__name="RECUSADA")
-
-                for order in overdue_orders:
-                    order.service_order_phase = refused_phase
-                    order.justification_refusal = "Cliente não retirou o produto"
-                    order.save()
-                    print(
-                        f"OS {order.id} movida automaticamente para RECUSADA - Cliente não retirou o produto"
-                    )
-
-            # Executar verificação automática
-            move_to_refused_if_event_passed()
-
-            phase = ServiceOrderPhase.objects.filter(name__icontains=phase_name).first()
-            if not phase:
-                return Response(
-                    {"error": "Fase não encontrada"}, status=status.HTTP_404_NOT_FOUND
-                )
-
-            # Base queryset - exclui OSs virtuais
-            base_qs = ServiceOrder.objects.filter(is_virtual=False)
-
-            # Filtrar orders baseado na fase
-            if phase.name == "ATRASADO":
-                # Fase ATRASADO: SOMENTE OS em AGUARDANDO_DEVOLUCAO que estão atrasadas na devolução
-                # OS atrasadas em retirada ficam em AGUARDANDO_RETIRADA com flag esta_atrasada=True
-                aguardando_devolucao_phase = ServiceOrderPhase.objects.filter(
-                    name="AGUARDANDO_DEVOLUCAO"
-                ).first()
-
-                orders = (
-                    base_qs.filter(
-                        models.Q(
-                            service_order_phase=aguardando_devolucao_phase,
-                            devolucao_date__lt=today,  # Passou da data de devolução
-                            event__event_date__gt=today,  # Evento ainda não passou
-                            event__isnull=False,  # Só OS com evento vinculado
-                        )
-                        | models.Q(
-                            service_order_phase=aguardando_devolucao_phase,
-                            data_devolvido__isnull=True,  # Não foi devolvida
-                            event__event_date__lt=today,  # Evento já passou
-                            event__isnull=False,  # Só OS com evento vinculado
-                        )
-                    )
-                    .select_related(
-                        "renter",
-                        "employee",
-                        "attendant",
-                        "renter__person_type",
-                        "event",
-                        "justification_reason",
-                    )
-                    .prefetch_related("items__temporary_product", "items__product")
-                )
-
-            elif phase.name == "AGUARDANDO_DEVOLUCAO":
-                # Fase AGUARDANDO_DEVOLUCAO: todas as OS nesta fase
-                orders = (
-                    base_qs.filter(
-                        service_order_phase=phase,
-                    )
-                    .select_related(
-                        "renter",
-                        "employee",
-                        "attendant",
-                        "renter__person_type",
-                        "event",
-                        "justification_reason",
-                    )
-                    .prefetch_related("items__temporary_product", "items__product")
-                )
-
-            elif phase.name == "EM_PRODUCAO":
-                # Fase EM_PRODUCAO: todas as OS nesta fase
-                orders = (
-                    base_qs.filter(
-                        service_order_phase=phase,
-                    )
-                    .select_related(
-                        "renter",
-                        "employee",
-                        "attendant",
-                        "renter__person_type",
-                        "event",
-                        "justification_reason",
-                    )
-                    .prefetch_related("items__temporary_product", "items__product")
-                )
-
-            elif phase.name == "AGUARDANDO_RETIRADA":
-                # Fase AGUARDANDO_RETIRADA: todas as OS nesta fase
-                # Marcar com flag esta_atrasada=True as que estão atrasadas
-                orders = (
-                    base_qs.filter(
-                        service_order_phase=phase,
-                    )
-                    .select_related(
-                        "renter",
-                        "employee",
-                        "attendant",
-                        "renter__person_type",
-                        "event",
-                        "justification_reason",
-                    )
-                    .prefetch_related("items__temporary_product", "items__product")
-                )
-
-                # Atualizar flag de atraso para cada OS
-                for order in orders:
-                    esta_atrasada = False
-
-                    # Verifica se passou da data de retirada
-                    if order.retirada_date and order.retirada_date < today:
-                        esta_atrasada = True
-
-                    # Verifica se o evento já passou e ainda não foi retirada
-                    if (
-                        order.event
-                        and order.event.event_date
-                        and order.event.event_date < today
-                        and not order.data_retirado
-                    ):
-                        esta_atrasada = True
-
-                    # Atualiza a flag se mudou
-                    if order.esta_atrasada != esta_atrasada:
-                        order.esta_atrasada = esta_atrasada
-                        order.save()
-
-            else:
-                # Outras fases: comportamento normal
-                orders = (
-                    base_qs.filter(service_order_phase=phase)
-                    .select_related(
-                        "renter",
-                        "employee",
-                        "attendant",
-                        "renter__person_type",
-                        "event",
-                        "justification_reason",
-                    )
-                    .prefetch_related("items__temporary_product", "items__product")
-                )
-
-            data = []
-            for order in orders:
-                # Dados do cliente
-                client_data = {
-                    "id": order.renter.id,
-                    "name": order.renter.name,
-                    "cpf": order.renter.cpf,
-                    "person_type": (
-                        {
-                            "id": order.renter.person_type.id,
-                            "type": order.renter.person_type.type,
-                        }
-                        if order.renter.person_type
-                        else None
-                    ),
-                }
-
-                # Contatos do cliente (apenas o mais recente)
-                contact = order.renter.contacts.order_by("-date_created", "-id").first()
-                client_data["contacts"] = []
-                if contact:
-                    client_data["contacts"].append(
-                        {
-                            "id": contact.id,
-                            "email": contact.email,
-                            "phone": contact.phone,
-                        }
-                    )
-
-                # Endereços do cliente (apenas o mais recente)
-                address = order.renter.personsadresses_set.order_by(
-                    "-date_created", "-id"
-                ).first()
-                client_data["addresses"] = []
-                if address:
-                    city_data = None
-                    if address.city:
-                        city_data = {
-                            "id": address.city.id,
-                            "name": address.city.name,
-                            "uf": address.city.uf,
-                        }
-
-                    client_data["addresses"].append(
-                        {
-                            "id": address.id,
-                            "cep": address.cep,
-                            "rua": address.street,
-                            "numero": address.number,
-                            "bairro": address.neighborhood,
-                            "complemento": address.complemento or "",
-                            "cidade": city_data,
-                        }
-                    )
-
-                # Dados da OS
-                order_data = {
-                    "id": order.id,
-                    "total_value": order.total_value,
-                    "advance_payment": order.advance_payment,
-                    "remaining_payment": order.remaining_payment,
-                    "esta_atrasada": order.esta_atrasada,
-                    "employee_name": order.employee.name if order.employee else "",
-                    "attendant_name": order.attendant.name if order.attendant else "",
-                    "order_date": order.order_date,
-                    "prova_date": order.prova_date,
-                    "retirada_date": order.retirada_date,
-                    "devolucao_date": order.devolucao_date,
-                    "production_date": order.production_date,
-                    "data_recusa": order.data_recusa,
-                    "data_finalizado": order.data_finalizado,
-                    "client": client_data,
-                    "justification_refusal": order.justification_refusal,
-                    "justification_reason": (
-                        order.justification_reason.name
-                        if order.justification_reason
-                        else None
-                    ),
-                    "event_date": (
-                        order.event.event_date.date()
-                        if order.event
-                        and order.event.event_date
-                        and hasattr(order.event.event_date, "date")
-                        else order.event.event_date if order.event else None
-                    ),
-                    "event_name": order.event.name if order.event else None,
-                }
-
-                # Calcular justificativa do atraso para fase ATRASADO
-                if phase.name == "ATRASADO":
-                    # Para fase ATRASADO, determinar a justificativa baseada nas datas
-                    event_date = None
-                    if order.event and order.event.event_date:
-                        # Garantir que event_date seja datetime.date para comparação
-                        if hasattr(order.event.event_date, "date"):
-                            event_date = order.event.event_date.date()
-                        else:
-                            event_date = order.event.event_date
-
-                    if (
-                        order.devolucao_date
-                        and order.devolucao_date < today
-                        and event_date
-                        and event_date > today
-                    ):
-                        order_data["justificativa_atraso"] = (
-                            "Cliente ainda não devolveu"
-                        )
-                    elif (
-                        order.retirada_date
-                        and order.retirada_date < today
-                        and event_date
-                        and event_date > today
-                    ):
-                        order_data["justificativa_atraso"] = "Cliente não retirou"
-                    elif (
-                        order.data_devolvido is None
-                        and event_date
-                        and event_date < today
-                    ):
-                        order_data["justificativa_atraso"] = (
-                            "Cliente ainda não devolveu (evento passou)"
-                        )
-                    else:
-                        order_data["justificativa_atraso"] = None
-                else:
-                    order_data["justificativa_atraso"] = None
+def move_to_refused_if_event_passed(today):
+    """
+    Move automaticamente para RECUSADA as OS cujo evento já passou sem que o
+    cliente tenha retirado o produto (executado pelas listagens por fase)
+    """
+    refused_phase_id = phases.phase_id("RECUSADA")
+    if not refused_phase_id:
+        return
+
+    # Buscar OS que passaram da data do evento e não foram retiradas
+    overdue_orders = ServiceOrder.objects.filter(
+        event__event_date__lt=today,
+        data_retirado__isnull=True,  # Não foi retirada
+        service_order_phase_id__in=phases.phase_ids(
+            "PENDENTE",
+            "EM_PRODUCAO",
+            "AGUARDANDO_DEVOLUCAO",
+            "FINALIZADO",
+            "AGUARDANDO_RETIRADA",
+        ),
+        event__isnull=False,  # Só OS com evento vinculado
+    ).exclude(service_order_phase_id__in=phases.phase_ids("RECUSADA"))
 
-                # Processar itens da OS
-                itens = []
-                acessorios = []
+    results = state_machine.apply_to_queryset(
+        "expire",
+        overdue_orders,
+        changes={"justification_refusal": "Cliente não retirou o produto"},
+    )
+    if results:
+        logger.info(
+            "%d OS movidas automaticamente para RECUSADA - Cliente não retirou o produto",
+            sum(1 for result in results if result.success),
+        )
 
-                for item in order.items.all():
-                    # Determinar se é produto temporário ou produto real
-                    temp_product = item.temporary_product
-                    product = item.product
 
-                    if temp_product:
-                        # Produto temporário
-                        if temp_product.product_type in [
-                            "paleto",
-                            "camisa",
-                            "calca",
-                            "colete",
-                        ]:
-                            # Item de roupa
-                            item_data = {
-                                "tipo": temp_product.product_type,
-                                "cor": temp_product.color or "",
-                                "extras": temp_product.extras
-                                or temp_product.description
-                                or "",
-                                "venda": temp_product.venda or False,
-                                "extensor": False,  # Extensor só para passante
-                            }
+@extend_schema(
+    tags=["service-orders"],
+    summary="Listar ordens de serviço por fase",
+    description="Retorna a lista de ordens de serviço filtradas por fase específica com dados completos do cliente",
+    parameters=[
+        OpenApiParameter(
+            name="stream",
+            type=OpenApiTypes.BOOL,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Emite o array JSON em streaming, OS a OS, sem montar a lista "
+                "inteira em memória (indicado para FINALIZADO e RECUSADA)"
+            ),
+            required=False,
+        )
+    ],
+    responses={
+        200: ServiceOrderListByPhaseSerializer(many=True),
+        404: {"description": "Fase não encontrada"},
+        500: {"description": "Erro interno do servidor"},
+    },
+)
+class ServiceOrderListByPhaseAPIView(ConditionalListMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = ServiceOrderListByPhaseSerializer
+    conditional_related = (
+        "renter",
+        "renter__contacts",
+        "renter__personsadresses",
+        "event",
+        "items",
+    )
 
-                            # Campos específicos por tipo
-                            if temp_product.product_type in ["paleto", "camisa"]:
-                                item_data.update(
-                                    {
-                                        "numero": temp_product.size
-                                        or "",  # ✅ Campo "numero" retorna o "size" do banco
-                                        "manga": temp_product.sleeve_length or "",
-                                        "marca": temp_product.brand or "",
-                                        "ajuste": item.adjustment_notes or "",
-                                    }
-                                )
-                            elif temp_product.product_type == "calca":
-                                item_data.update(
-                                    {
-                                        "numero": temp_product.size,
-                                        "cintura": temp_product.waist_size or "",
-                                        "perna": temp_product.leg_length or "",
-                                        "marca": temp_product.brand or "",
-                                        "ajuste_cintura": temp_product.ajuste_cintura
-                                        or "",
-                                        "ajuste_comprimento": temp_product.ajuste_comprimento
-                                        or "",
-                                    }
-                                )
-                            elif temp_product.product_type == "colete":
-                                item_data.update({"marca": temp_product.brand or ""})
+    def get(self, request, phase_name):
+        """Listar ordens de serviço por fase com dados completos do cliente"""
+        try:
+            today = date.today()
 
-                            print(
-                                f"DEBUG ITEM: Retornando item - tipo: {item_data['tipo']}, numero: '{item_data.get('numero', '')}'"
-                            )
-                            itens.append(item_data)
-                        else:
-                            # Acessório
-                            acessorio_data = {
-                                "tipo": temp_product.product_type,
-                                "numero": temp_product.size
-                                or "",  # ✅ Campo "numero" retorna o "size" do banco
-                                "cor": temp_product.color or "",
-                                "descricao": temp_product.description or "",
-                                "marca": temp_product.brand or "",
-                                "extensor": temp_product.extensor or False,
-                                "venda": temp_product.venda or False,
-                            }
-                            print(
-                                f"DEBUG ACESSORIO: Retornando acessório - tipo: {acessorio_data['tipo']}, numero: '{acessorio_data['numero']}'"
-                            )
-                            acessorios.append(acessorio_data)
+            # Executar verificação automática
+            move_to_refused_if_event_passed(today)
 
-                    elif product:
-                        # Produto real do estoque
-                        if product.tipo.lower() in [
-                            "paleto",
-                            "camisa",
-                            "calça",
-                            "colete",
-                        ]:
-                            # Item de roupa
-                            item_data = {
-                                "tipo": product.tipo.lower(),
-                                "cor": product.cor or "",
-                                "extras": product.nome_produto or "",
-                                "venda": False,  # Produtos do estoque não são vendidos
-                                "extensor": False,
-                            }
+            phase_id = phases.search_phase_id(phase_name)
+            if not phase_id:
+                return Response(
+                    {"error": "Fase não encontrada"}, status=status.HTTP_404_NOT_FOUND
+                )
+            current_phase = phases.phase_name(phase_id)
 
-                            # Campos específicos por tipo
-                            if product.tipo.lower() in ["paleto", "camisa"]:
-                                item_data.update(
-                                    {
-                                        "numero": (
-                                            str(product.tamanho)
-                                            if product.tamanho
-                                            else ""
-                                        ),  # ✅ Campo "numero" retorna o "tamanho" do produto do estoque
-                                        "manga": "",
-                                        "marca": product.marca or "",
-                                        "ajuste": item.adjustment_notes or "",
-                                    }
-                                )
-                            elif product.tipo.lower() == "calça":
-                                item_data.update(
-                                    {
-                                        "numero": (
-                                            str(product.tamanho)
-                                            if product.tamanho
-                                            else ""
-                                        ),  # ✅ Campo "numero" retorna o "tamanho" do produto do estoque
-                                        "cintura": "",
-                                        "perna": "",
-                                        "marca": product.marca or "",
-                                        "ajuste_cintura": "",
-                                        "ajuste_comprimento": "",
-                                    }
-                                )
-                            elif product.tipo.lower() == "colete":
-                                item_data.update({"marca": product.marca or ""})
+            # Base queryset - exclui OSs virtuais
+            base_qs = ServiceOrder.objects.filter(is_virtual=False)
 
-                            itens.append(item_data)
-                        else:
-                            # Acessório
-                            acessorio_data = {
-                                "tipo": product.tipo.lower(),
-                                "numero": (
-                                    str(product.tamanho) if product.tamanho else ""
-                                ),  # ✅ Campo "numero" retorna o "tamanho" do produto do estoque
-                                "cor": product.cor or "",
-                                "descricao": product.nome_produto or "",
-                                "marca": product.marca or "",
-                                "extensor": False,  # Produtos do estoque não têm extensor
-                                "venda": False,
-                            }
-                            acessorios.append(acessorio_data)
+            # Filtrar orders baseado na fase
+            if current_phase == "ATRASADO":
+                # Fase ATRASADO: SOMENTE OS em AGUARDANDO_DEVOLUCAO que estão atrasadas na devolução
+                # OS atrasadas em retirada ficam em AGUARDANDO_RETIRADA com flag esta_atrasada=True
+                aguardando_devolucao_phase_id = phases.phase_id("AGUARDANDO_DEVOLUCAO")
+
+                orders = base_qs.filter(
+                    models.Q(
+                        service_order_phase_id=aguardando_devolucao_phase_id,
+                        devolucao_date__lt=today,  # Passou da data de devolução
+                        event__event_date__gt=today,  # Evento ainda não passou
+                        event__isnull=False,  # Só OS com evento vinculado
+                    )
+                    | models.Q(
+                        service_order_phase_id=aguardando_devolucao_phase_id,
+                        data_devolvido__isnull=True,  # Não foi devolvida
+                        event__event_date__lt=today,  # Evento já passou
+                        event__isnull=False,  # Só OS com evento vinculado
+                    )
+                )
 
-                # Dados da ordem de serviço no formato esperado pelo frontend
-                ordem_servico_data = {
-                    "data_pedido": order.order_date,
-                    "data_evento": (
-                        order.event.event_date.date()
-                        if order.event
+            elif current_phase == "AGUARDANDO_RETIRADA":
+                # Fase AGUARDANDO_RETIRADA: todas as OS nesta fase
+                # Marcar com flag esta_atrasada=True as que estão atrasadas
+                orders = base_qs.filter(service_order_phase_id=phase_id)
+
+                # Atualizar flag de atraso para cada OS
+                for order in orders.select_related("event").iterator(
+                    chunk_size=listing.STREAM_CHUNK_SIZE
+                ):
+                    esta_atrasada = False
+
+                    # Verifica se passou da data de retirada
+                    if order.retirada_date and order.retirada_date < today:
+                        esta_atrasada = True
+
+                    # Verifica se o evento já passou e ainda não foi retirada
+                    if (
+                        order.event
                         and order.event.event_date
-                        and hasattr(order.event.event_date, "date")
-                        else order.event.event_date if order.event else None
-                    ),
-                    "data_retirada": order.retirada_date,
-                    "data_devolucao": order.devolucao_date,
-                    "modalidade": order.service_type or "Aluguel",
-                    "itens": itens,
-                    "acessorios": acessorios,
-                    "pagamento": {
-                        "total": float(order.total_value) if order.total_value else 0,
-                        "sinal": (
-                            float(order.advance_payment) if order.advance_payment else 0
-                        ),
-                        "restante": (
-                            float(order.remaining_payment)
-                            if order.remaining_payment
-                            else 0
-                        ),
-                    },
-                }
+                        and order.event.event_date < today
+                        and not order.data_retirado
+                    ):
+                        esta_atrasada = True
 
-                # Adicionar dados completos ao response
-                order_data.update({"ordem_servico": ordem_servico_data})
+                    # Atualiza a flag se mudou
+                    if order.esta_atrasada != esta_atrasada:
+                        order.esta_atrasada = esta_atrasada
+                        order.save()
 
-                data.append(order_data)
+            else:
+                # Demais fases: todas as OS nesta fase
+                orders = base_qs.filter(service_order_phase_id=phase_id)
+
+            # ETag sobre as OS da fase (hoje entra porque atrasos dependem da data)
+            validators = self.list_validators(request, orders, extra=(today,))
+            not_modified = self.not_modified(request, validators)
+            if not_modified is not None:
+                return not_modified
+
+            orders = listing.with_related(orders)
+            if request.GET.get("stream", "").lower() in ("1", "true"):
+                # Array JSON emitido OS a OS, com prefetch por lote: a memória
+                # não cresce com o número de OS da fase
+                rows = (
+                    listing.order_payload(order, current_phase, today)
+                    for order in orders.iterator(chunk_size=listing.STREAM_CHUNK_SIZE)
+                )
+                response = StreamingHttpResponse(
+                    stream_json_array(rows), content_type="application/json"
+                )
+                return self.conditional(response, validators)
 
-            return Response(data)
+            data = [
+                listing.order_payload(order, current_phase, today) for order in orders
+            ]
+            return self.conditional(Response(data), validators)
 
         except Exception as e:
             return Response(
@@ -3094,11 +2214,18 @@ class ServiceOrderListByPhaseAPIView(APIView):
         )
     ],
 )
-class ServiceOrderListByPhaseV2APIView(APIView):
+class ServiceOrderListByPhaseV2APIView(ConditionalListMixin, APIView):
     """Versão V2 com paginação simples para a listagem por fase."""
 
     permission_classes = [IsAuthenticated]
     serializer_class = ServiceOrderListByPhaseSerializer
+    conditional_related = (
+        "renter",
+        "renter__contacts",
+        "renter__personsadresses",
+        "event",
+        "items",
+    )
 
     def get(self, request, phase_name):
         try:
@@ -3119,58 +2246,32 @@ class ServiceOrderListByPhaseV2APIView(APIView):
             today = date.today()
 
             # Reaplicar a mesma lógica automática de recusa por evento passado
-            def move_to_refused_if_event_passed():
-                refused_phase = ServiceOrderPhase.objects.filter(
-                    name="RECUSADA"
-                ).first()
-                if not refused_phase:
-                    return
-
-                overdue_orders = ServiceOrder.objects.filter(
-                    event__event_date__lt=today,
-                    data_retirado__isnull=True,
-                    service_order_phase__name__in=[
-                        "PENDENTE",
-                        "EM_PRODUCAO",
-                        "AGUARDANDO_DEVOLUCAO",
-                        "FINALIZADO",
-                        "AGUARDANDO_RETIRADA",
-                    ],
-                    event__isnull=False,
-                ).exclude(service_order_phase__name="RECUSADA")
-
-                for order in overdue_orders:
-                    order.service_order_phase = refused_phase
-                    order.justification_refusal = "Cliente não retirou o produto"
-                    order.save()
+            move_to_refused_if_event_passed(today)
 
-            move_to_refused_if_event_passed()
-
-            phase = ServiceOrderPhase.objects.filter(name__icontains=phase_name).first()
-            if not phase:
+            phase_id = phases.search_phase_id(phase_name)
+            if not phase_id:
                 return Response(
                     {"error": "Fase não encontrada"}, status=status.HTTP_404_NOT_FOUND
                 )
+            current_phase = phases.phase_name(phase_id)
 
             # Base queryset - exclui OSs virtuais
             base_qs = ServiceOrder.objects.filter(is_virtual=False)
 
             # Filtrar orders baseado na fase (mesma lógica que V1)
-            if phase.name == "ATRASADO":
-                aguardando_devolucao_phase = ServiceOrderPhase.objects.filter(
-                    name="AGUARDANDO_DEVOLUCAO"
-                ).first()
+            if current_phase == "ATRASADO":
+                aguardando_devolucao_phase_id = phases.phase_id("AGUARDANDO_DEVOLUCAO")
 
                 orders_qs = (
                     base_qs.filter(
                         models.Q(
-                            service_order_phase=aguardando_devolucao_phase,
+                            service_order_phase_id=aguardando_devolucao_phase_id,
                             devolucao_date__lt=today,
                             event__event_date__gt=today,
                             event__isnull=False,
                         )
                         | models.Q(
-                            service_order_phase=aguardando_devolucao_phase,
+                            service_order_phase_id=aguardando_devolucao_phase_id,
                             data_devolvido__isnull=True,
                             event__event_date__lt=today,
                             event__isnull=False,
@@ -3187,14 +2288,14 @@ class ServiceOrderListByPhaseV2APIView(APIView):
                     .prefetch_related("items__temporary_product", "items__product")
                 )
 
-            elif phase.name in [
+            elif current_phase in [
                 "AGUARDANDO_DEVOLUCAO",
                 "EM_PRODUCAO",
                 "AGUARDANDO_RETIRADA",
             ]:
                 orders_qs = (
                     base_qs.filter(
-                        service_order_phase=phase,
+                        service_order_phase_id=phase_id,
                     )
                     .select_related(
                         "renter",
@@ -3208,7 +2309,7 @@ class ServiceOrderListByPhaseV2APIView(APIView):
                 )
 
                 # Para AGUARDANDO_RETIRADA atualizar flag de atraso globalmente
-                if phase.name == "AGUARDANDO_RETIRADA":
+                if current_phase == "AGUARDANDO_RETIRADA":
                     for order in orders_qs:
                         esta_atrasada = False
 
@@ -3229,7 +2330,7 @@ class ServiceOrderListByPhaseV2APIView(APIView):
 
             else:
                 orders_qs = (
-                    base_qs.filter(service_order_phase=phase)
+                    base_qs.filter(service_order_phase_id=phase_id)
                     .select_related(
                         "renter",
                         "employee",
@@ -3283,6 +2384,11 @@ class ServiceOrderListByPhaseV2APIView(APIView):
                 # Use distinct to avoid duplicate ServiceOrder rows due to joins
                 orders_qs = orders_qs.filter(q).distinct()
 
+            validators = self.list_validators(request, orders_qs, extra=(today,))
+            not_modified = self.not_modified(request, validators)
+            if not_modified is not None:
+                return not_modified
+
             # Paginação
             paginator = Paginator(orders_qs, page_size)
             try:
@@ -3376,7 +2482,7 @@ class ServiceOrderListByPhaseV2APIView(APIView):
                 }
 
                 # Calcular justificativa do atraso como no V1
-                if phase.name == "ATRASADO":
+                if current_phase == "ATRASADO":
                     event_date = None
                     if order.event and order.event.event_date:
                         if hasattr(order.event.event_date, "date"):
@@ -3559,22 +2665,189 @@ class ServiceOrderListByPhaseV2APIView(APIView):
                     },
                 }
 
-                order_data.update({"ordem_servico": ordem_servico_data})
-                results.append(order_data)
+                order_data.update({"ordem_servico": ordem_servico_data})
+                results.append(order_data)
+
+            response = {
+                "count": paginator.count,
+                "page": page,
+                "page_size": page_size,
+                "total_pages": paginator.num_pages,
+                "results": results,
+            }
+
+            return self.conditional(Response(response), validators)
+
+        except Exception as e:
+            return Response(
+                {"error": f"Erro ao listar OS (v2): {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+@extend_schema(
+    tags=["service-orders"],
+    summary="Quadro de OS por fase",
+    description=(
+        "Retorna, numa única chamada, as OS mais recentes (por data do pedido) "
+        "e o total de cada fase do quadro, incluindo a fase virtual ATRASADO. "
+        "Cada OS vem no mesmo formato da listagem por fase."
+    ),
+    parameters=[
+        OpenApiParameter(
+            name="limit",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Número de OS por fase (padrão 20, máximo 100)",
+            required=False,
+        )
+    ],
+    responses={
+        200: {
+            "type": "object",
+            "description": (
+                "Objeto com `limit` e `phases`: lista de `phase`, `count` e `results`"
+            ),
+        },
+        400: {"description": "Parâmetros inválidos"},
+        500: {"description": "Erro interno do servidor"},
+    },
+)
+class ServiceOrderBoardAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    def get(self, request):
+        """Primeiras OS e total de cada fase do quadro"""
+        try:
+            limit = request.GET.get("limit") or str(self.DEFAULT_LIMIT)
+            if not limit.isdigit() or not 1 <= int(limit) <= self.MAX_LIMIT:
+                return Response(
+                    {"error": f"limit deve ser um inteiro entre 1 e {self.MAX_LIMIT}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            limit = int(limit)
+
+            today = date.today()
+            move_to_refused_if_event_passed(today)
+
+            columns = listing.board(limit, today)
+            return Response(
+                {
+                    "limit": limit,
+                    "phases": [
+                        {"phase": name, **column} for name, column in columns.items()
+                    ],
+                }
+            )
+
+        except Exception as e:
+            return Response(
+                {"error": f"Erro ao montar o quadro de OS: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
 
-            response = {
-                "count": paginator.count,
-                "page": page,
-                "page_size": page_size,
-                "total_pages": paginator.num_pages,
-                "results": results,
-            }
 
-            return Response(response)
+@extend_schema(
+    tags=["service-orders"],
+    summary="Contadores de OS por fase",
+    description=(
+        "Retorna o número de OS em cada fase das abas (PENDENTE, EM_PRODUCAO, "
+        "AGUARDANDO_RETIRADA, AGUARDANDO_DEVOLUCAO, ATRASADO, FINALIZADO e "
+        "RECUSADA), com a fase virtual ATRASADO pelas regras da listagem por "
+        "fase. Os contadores ficam em cache, são ajustados a cada mudança de "
+        "fase e recalculados periodicamente."
+    ),
+    responses={
+        200: {
+            "type": "object",
+            "description": "Objeto com `data` e `counts` (fase -> número de OS)",
+        },
+        500: {"description": "Erro interno do servidor"},
+    },
+)
+class ServiceOrderPhaseCountsAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Número de OS em cada fase das abas"""
+        try:
+            today = date.today()
+            return Response({"data": today, "counts": metrics.phase_counts(today)})
 
         except Exception as e:
             return Response(
-                {"error": f"Erro ao listar OS (v2): {str(e)}"},
+                {"error": f"Erro ao contar OS por fase: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+@extend_schema(
+    tags=["service-orders"],
+    summary="Feed de alterações das OS",
+    description=(
+        "Retorna as OS criadas ou alteradas depois do cursor `since`, em ordem "
+        "de alteração, no formato do detalhe da OS. OS recusadas vêm como "
+        "tombstone (`tombstone: true`, sem `order`). A resposta traz o "
+        "`cursor` para a próxima chamada e `has_more` quando há mais páginas; "
+        "sem `since`, o feed começa do início."
+    ),
+    parameters=[
+        OpenApiParameter(
+            name="since",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Cursor devolvido pela chamada anterior",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="limit",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Número máximo de OS na resposta (padrão 100, máximo 500)",
+            required=False,
+        ),
+    ],
+    responses={
+        200: {
+            "type": "object",
+            "description": "Objeto com `results`, `cursor` e `has_more`",
+        },
+        400: {"description": "Parâmetros inválidos"},
+        500: {"description": "Erro interno do servidor"},
+    },
+)
+class ServiceOrderChangesAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """OS alteradas depois do cursor"""
+        try:
+            limit = request.GET.get("limit") or str(changes.DEFAULT_LIMIT)
+            if not limit.isdigit() or not 1 <= int(limit) <= changes.MAX_LIMIT:
+                return Response(
+                    {
+                        "error": (
+                            f"limit deve ser um inteiro entre 1 e {changes.MAX_LIMIT}."
+                        )
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            try:
+                data = changes.changes(request.GET.get("since"), int(limit))
+            except changes.InvalidCursor:
+                return Response(
+                    {"error": "Cursor since inválido."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return Response(data)
+
+        except Exception as e:
+            return Response(
+                {"error": f"Erro ao listar alterações de OS: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
@@ -3703,6 +2976,243 @@ class VirtualServiceOrderCreateAPIView(APIView):
             )
 
 
+@extend_schema(
+    tags=["service-orders"],
+    summary="Tempo de permanência por fase",
+    description=(
+        "Calcula, a partir do histórico de mudanças de fase, quanto tempo as OS "
+        "ficam em cada fase: média e percentis p50/p90/p95 em horas. Considera as "
+        "entradas em fase ocorridas entre `data_inicio` e `data_fim` (padrão: "
+        "últimos 90 dias); entradas ainda sem saída aparecem em `em_aberto`."
+    ),
+    parameters=[
+        OpenApiParameter(
+            name="data_inicio",
+            type=OpenApiTypes.DATE,
+            location=OpenApiParameter.QUERY,
+            description="Data inicial do período (YYYY-MM-DD). Default: 90 dias atrás",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="data_fim",
+            type=OpenApiTypes.DATE,
+            location=OpenApiParameter.QUERY,
+            description="Data final do período (YYYY-MM-DD). Default: hoje",
+            required=False,
+        ),
+    ],
+    responses={
+        200: ServiceOrderLeadTimeSerializer,
+        400: {"description": "Datas inválidas"},
+        500: {"description": "Erro interno do servidor"},
+    },
+)
+class ServiceOrderLeadTimeAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Tempo de permanência por fase"""
+        try:
+            try:
+                data_fim = date.fromisoformat(
+                    request.GET.get("data_fim") or date.today().isoformat()
+                )
+                data_inicio = date.fromisoformat(
+                    request.GET.get("data_inicio")
+                    or (data_fim - timedelta(days=90)).isoformat()
+                )
+            except ValueError:
+                return Response(
+                    {"error": "Datas devem estar no formato YYYY-MM-DD."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if data_inicio > data_fim:
+                return Response(
+                    {"error": "data_inicio não pode ser posterior a data_fim."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            return Response(
+                ServiceOrderLeadTimeSerializer(
+                    {
+                        "data_inicio": data_inicio,
+                        "data_fim": data_fim,
+                        "fases": metrics.phase_lead_times(data_inicio, data_fim),
+                    }
+                ).data
+            )
+
+        except Exception as e:
+            return Response(
+                {"error": f"Erro ao calcular tempo por fase: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+@extend_schema(
+    tags=["service-orders"],
+    summary="Série temporal de pedidos e faturamento",
+    description=(
+        "Série por dia, semana ou mês de uma métrica das OS pela data do pedido: "
+        "`orders` (número de OS), `vendido` (valor das OS confirmadas) ou "
+        "`recebido` (sinais das OS confirmadas mais o restante das finalizadas). "
+        "Períodos sem OS vêm com zero. Aceita os mesmos filtros do dashboard. "
+        "Séries de períodos já encerrados ficam em cache."
+    ),
+    parameters=[
+        OpenApiParameter(
+            name="bucket",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Agrupamento: day, week ou month. Default: day",
+            required=False,
+            enum=list(metrics.TIMESERIES_BUCKETS),
+        ),
+        OpenApiParameter(
+            name="metric",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Métrica: orders, vendido ou recebido. Default: orders",
+            required=False,
+            enum=list(metrics.TIMESERIES_METRICS),
+        ),
+        OpenApiParameter(
+            name="data_inicio",
+            type=OpenApiTypes.DATE,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Data inicial (YYYY-MM-DD). Default: 30 dias, 12 semanas ou 12 "
+                "meses antes de data_fim, conforme o bucket"
+            ),
+            required=False,
+        ),
+        OpenApiParameter(
+            name="data_fim",
+            type=OpenApiTypes.DATE,
+            location=OpenApiParameter.QUERY,
+            description="Data final (YYYY-MM-DD). Default: hoje",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="atendente_id",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="ID do atendente para filtrar",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="tipo_cliente",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Tipo de cliente (renter_role) para filtrar",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="canal_origem",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Canal de origem (came_from) para filtrar",
+            required=False,
+        ),
+    ],
+    responses={
+        200: ServiceOrderTimeseriesSerializer,
+        400: {"description": "Parâmetros inválidos"},
+        500: {"description": "Erro interno do servidor"},
+    },
+)
+class ServiceOrderTimeseriesAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # Períodos padrão por bucket e tamanho máximo do período
+    DEFAULT_SPAN = {"day": 30, "week": 12, "month": 12}
+    MAX_DAYS = 5 * 366
+
+    def get(self, request):
+        """Série temporal de uma métrica das OS"""
+        try:
+            params = request.GET
+            bucket = params.get("bucket") or "day"
+            metric = params.get("metric") or "orders"
+            if bucket not in metrics.TIMESERIES_BUCKETS:
+                return Response(
+                    {"error": "bucket inválido. Use day, week ou month."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if metric not in metrics.TIMESERIES_METRICS:
+                return Response(
+                    {"error": "metric inválida. Use orders, vendido ou recebido."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            try:
+                data_fim = date.fromisoformat(
+                    params.get("data_fim") or date.today().isoformat()
+                )
+                if params.get("data_inicio"):
+                    data_inicio = date.fromisoformat(params["data_inicio"])
+                else:
+                    data_inicio = self._default_start(data_fim, bucket)
+            except ValueError:
+                return Response(
+                    {"error": "Datas devem estar no formato YYYY-MM-DD."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if data_inicio > data_fim:
+                return Response(
+                    {"error": "data_inicio não pode ser posterior a data_fim."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if (data_fim - data_inicio).days > self.MAX_DAYS:
+                return Response(
+                    {"error": "Período muito longo: máximo de 5 anos."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            atendente_id = params.get("atendente_id")
+            if atendente_id and not atendente_id.isdigit():
+                return Response(
+                    {"error": "atendente_id deve ser um número inteiro."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            filters = {
+                "atendente_id": int(atendente_id) if atendente_id else None,
+                "tipo_cliente": (params.get("tipo_cliente") or "").upper() or None,
+                "canal_origem": (params.get("canal_origem") or "").upper() or None,
+            }
+
+            serie = metrics.revenue_timeseries(
+                data_inicio, data_fim, bucket, metric, filters
+            )
+            return Response(
+                ServiceOrderTimeseriesSerializer(
+                    {
+                        "bucket": bucket,
+                        "metric": metric,
+                        "data_inicio": data_inicio,
+                        "data_fim": data_fim,
+                        "total": sum(point["valor"] for point in serie),
+                        "serie": serie,
+                    }
+                ).data
+            )
+
+        except Exception as e:
+            return Response(
+                {"error": f"Erro ao gerar série temporal: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    def _default_start(self, data_fim, bucket):
+        span = self.DEFAULT_SPAN[bucket]
+        if bucket == "day":
+            return data_fim - timedelta(days=span - 1)
+        if bucket == "week":
+            return metrics.bucket_start(data_fim, "week") - timedelta(weeks=span - 1)
+        month = data_fim.year * 12 + data_fim.month - span
+        return date(month // 12, month % 12 + 1, 1)
+
+
 @extend_schema(
     tags=["service-orders"],
     summary="Resumo financeiro - transações por forma de pagamento",
@@ -3801,19 +3311,16 @@ class ServiceOrderFinanceSummaryAPIView(APIView):
         total_amount = Decimal("0")
 
         CANDIDATE_EXCLUDED = {"RECUSADA", "CANCELADO", "CANCELADA", "CONCLUÍDO"}
-        existing_excluded = set(
-            ServiceOrderPhase.objects.filter(name__in=CANDIDATE_EXCLUDED).values_list(
-                "name", flat=True
-            )
-        )
+        existing_excluded = {
+            name for name in CANDIDATE_EXCLUDED if phases.phase_ids(name)
+        }
 
         # Fallback to 'RECUSADA' if nothing found (defensive)
         EXCLUDED_PHASES = existing_excluded or {"RECUSADA"}
 
         for order in orders:
             if (
-                order.service_order_phase
-                and order.service_order_phase.name in EXCLUDED_PHASES
+                phases.phase_name(order.service_order_phase_id) in EXCLUDED_PHASES
             ):
                 continue
 
@@ -3860,8 +3367,7 @@ class ServiceOrderFinanceSummaryAPIView(APIView):
                     total_amount += amt
 
             if (
-                order.service_order_phase
-                and order.service_order_phase.name == "FINALIZADO"
+                phases.phase_name(order.service_order_phase_id) == "FINALIZADO"
             ):
                 try:
                     rem = (
@@ -3976,14 +3482,10 @@ class ServiceOrderListByClientAPIView(APIView):
                     "data_finalizado": order.data_finalizado,
                     "justification_refusal": order.justification_refusal,
                     "phase": (
-                        order.service_order_phase.name
-                        if order.service_order_phase
-                        else None
+                        phases.phase_name(order.service_order_phase_id)
                     ),
                     "phase_status": (
-                        order.service_order_phase.name
-                        if order.service_order_phase
-                        else None
+                        phases.phase_name(order.service_order_phase_id)
                     ),
                     "event_date": (
                         order.event.event_date.date()
@@ -4397,9 +3899,7 @@ class ServiceOrderPreTriageAPIView(APIView):
                         status=status.HTTP_400_BAD_REQUEST,
                     )
 
-            service_order_phase = ServiceOrderPhase.objects.filter(
-                name="PENDENTE"
-            ).first()
+            service_order_phase_id = phases.phase_id("PENDENTE")
 
             # tipo_servico é opcional na triagem - será definido posteriormente via modalidade
             tipo_servico = data.get("tipo_servico")
@@ -4408,15 +3908,16 @@ class ServiceOrderPreTriageAPIView(APIView):
             service_order = ServiceOrder.objects.create(
                 renter=person,
                 employee=atendente,
-                attendant=request.user.person,
+                attendant_id=permission_context(request.user).person_id,
                 order_date=date.today(),
                 renter_role=data.get("papel_evento", "").upper(),
                 purchase=purchase,
                 service_type=tipo_servico,  # Pode ser None
                 came_from=data.get("origem", "").upper(),
-                service_order_phase=service_order_phase,
+                service_order_phase_id=service_order_phase_id,
                 event=event_obj,
             )
+            state_machine.record_created([service_order], request.user)
             return Response(
                 {
                     "success": True,
@@ -4564,7 +4065,7 @@ class EventOpenListAPIView(APIView):
                 service_order_phase__isnull=False,
                 date_canceled__isnull=True,
             )
-            .exclude(service_order_phase__name__in=finalizadas)
+            .exclude(service_order_phase_id__in=phases.phase_ids(*finalizadas))
             .values_list("event_id", flat=True)
             .distinct()
         )
@@ -4630,8 +4131,9 @@ class EventLinkServiceOrderAPIView(APIView):
             )
 
 
-class EventListWithStatusAPIView(APIView):
+class EventListWithStatusAPIView(ConditionalListMixin, APIView):
     permission_classes = [IsAuthenticated]
+    conditional_related = ("service_orders",)
 
     @extend_schema(
         tags=["events"],
@@ -4723,6 +4225,12 @@ class EventListWithStatusAPIView(APIView):
                     models.Q(name__icontains=search) | models.Q(description__icontains=search)
                 )
 
+            # ETag sobre eventos e OS vinculadas (status depende da data de hoje)
+            validators = self.list_validators(request, events, extra=(today,))
+            not_modified = self.not_modified(request, validators)
+            if not_modified is not None:
+                return not_modified
+
             result_data = []
 
             for event in events:
@@ -4768,7 +4276,7 @@ class EventListWithStatusAPIView(APIView):
                 "events": paginated_events,
             }
 
-            return Response(summary)
+            return self.conditional(Response(summary), validators)
 
         except Exception as e:
             return Response(
@@ -4799,16 +4307,16 @@ class EventListWithStatusAPIView(APIView):
 
         # Verificar status das OS vinculadas
         os_finalizadas = service_orders.filter(
-            service_order_phase__name="FINALIZADO"
+            service_order_phase_id__in=phases.phase_ids("FINALIZADO")
         ).count()
 
         os_em_andamento = service_orders.filter(
-            service_order_phase__name__in=[
+            service_order_phase_id__in=phases.phase_ids(
                 "PENDENTE",
                 "EM_PRODUCAO",
                 "AGUARDANDO_RETIRADA",
                 "AGUARDANDO_DEVOLUCAO",
-            ]
+            )
         ).count()
 
         # Se todas as OS foram finalizadas
@@ -4915,9 +4423,7 @@ class EventDetailAPIView(APIView):
                     "id": order.id,
                     "date_created": order.date_created,  # date_created com hora completa (datetime)
                     "phase": (
-                        order.service_order_phase.name
-                        if order.service_order_phase
-                        else None
+                        phases.phase_name(order.service_order_phase_id)
                     ),
                     "total_value": (
                         float(order.total_value) if order.total_value else 0.0
@@ -4972,16 +4478,16 @@ class EventDetailAPIView(APIView):
 
         # Verificar status das OS vinculadas
         os_finalizadas = service_orders.filter(
-            service_order_phase__name="FINALIZADO"
+            service_order_phase_id__in=phases.phase_ids("FINALIZADO")
         ).count()
 
         os_em_andamento = service_orders.filter(
-            service_order_phase__name__in=[
+            service_order_phase_id__in=phases.phase_ids(
                 "PENDENTE",
                 "EM_PRODUCAO",
                 "AGUARDANDO_RETIRADA",
                 "AGUARDANDO_DEVOLUCAO",
-            ]
+            )
         ).count()
 
         # Se todas as OS foram finalizadas
@@ -0,0 +1,114 @@
+"""
+Feed de alterações das OS (sincronização incremental dos tablets)
+
+Toda gravação de OS carimba date_updated (ServiceOrder.save(), máquina de
+estados e UPDATEs em lote), então o par (date_updated, id), indexado, é
+uma chave crescente: o cursor devolvido é o par da última OS entregue e a
+chamada seguinte lê só o que veio depois dele. OS recusadas saem como
+tombstone (sem os dados), para o cliente removê-las das listas; as demais
+vêm no formato do detalhe da OS. OS virtuais não entram no feed.
+
+Um carimbo gravado dentro de uma transação só fica visível no commit, com
+valor anterior a ele. O feed não entrega alterações dos últimos
+SETTLE_SECONDS, para que o cursor não passe de uma transação ainda aberta;
+isso cobre as gravações de uma requisição. Operações que podem passar desse
+limite (mesclagem de pessoas, comandos em lote) chamam `touch_on_commit`,
+que carimba as OS de novo depois do commit.
+"""
+
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import listing, phases
+from .models import ServiceOrder
+
+SETTLE_SECONDS = 5
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+# Fases entregues como tombstone
+TOMBSTONE_PHASES = ("RECUSADA",)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class InvalidCursor(ValueError):
+    """Cursor que não foi gerado por `encode_cursor`"""
+
+
+def encode_cursor(stamp, pk):
+    """'<microssegundos desde 1970>_<id>'"""
+    return f"{(stamp - _EPOCH) // _MICROSECOND}_{pk}"
+
+
+def decode_cursor(cursor):
+    """(date_updated, id) de um cursor; levanta InvalidCursor"""
+    micros, _, pk = cursor.partition("_")
+    if not (micros.isdigit() and pk.isdigit()):
+        raise InvalidCursor(cursor)
+    try:
+        return _EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except OverflowError as error:
+        raise InvalidCursor(cursor) from error
+
+
+def touch_on_commit(order_ids):
+    """
+    Carimba date_updated das OS de novo quando a transação atual for
+    confirmada, com um UPDATE fora dela, para que alterações gravadas em
+    transações longas não fiquem atrás de um cursor já entregue
+    """
+    order_ids = list(order_ids)
+    if order_ids:
+        transaction.on_commit(
+            lambda: ServiceOrder.objects.filter(id__in=order_ids).update(
+                date_updated=timezone.now()
+            )
+        )
+
+
+def _entry(order, tombstone_ids):
+    tombstone = order.service_order_phase_id in tombstone_ids
+    return {
+        "id": order.id,
+        "phase": phases.phase_name(order.service_order_phase_id),
+        "date_updated": order.date_updated,
+        "tombstone": tombstone,
+        "order": None if tombstone else listing.detail_payload(order),
+    }
+
+
+def changes(cursor=None, limit=DEFAULT_LIMIT, now=None):
+    """
+    Até `limit` OS alteradas depois do cursor (todas, sem cursor), em ordem
+    de (date_updated, id). Retorna os resultados, o cursor para a próxima
+    chamada (o mesmo, sem resultados) e se ainda há alterações a ler.
+    """
+    now = now or timezone.now()
+    orders = ServiceOrder.objects.filter(
+        is_virtual=False,
+        date_updated__lte=now - timedelta(seconds=SETTLE_SECONDS),
+    )
+    if cursor:
+        stamp, pk = decode_cursor(cursor)
+        orders = orders.filter(
+            Q(date_updated__gt=stamp) | Q(date_updated=stamp, id__gt=pk)
+        )
+
+    orders = listing.with_related(orders).order_by("date_updated", "id")
+    page = list(orders[: limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    tombstone_ids = set(phases.phase_ids(*TOMBSTONE_PHASES))
+    return {
+        "results": [_entry(order, tombstone_ids) for order in page],
+        "cursor": (
+            encode_cursor(page[-1].date_updated, page[-1].id) if page else cursor
+        ),
+        "has_more": has_more,
+    }
@@ -0,0 +1,162 @@
+"""
+Registro em memória dos valores canônicos das colunas de texto livre da OS
+(OrderDimension: tipo de cliente, canal de origem, tipo de serviço e forma
+de pagamento)
+
+Como o registro de fases, a tabela é pequena: é carregada uma vez por
+processo e invalidada pelos signals de OrderDimension. Um valor não
+encontrado força no máximo uma recarga a cada RELOAD_INTERVAL segundos, o
+que cobre valores criados por outros workers.
+
+Enquanto a transação que gravou um valor está aberta, as consultas dessa
+thread leem a tabela sem guardar o resultado: se a transação for revertida
+o on_commit que recarregaria o registro é descartado, e o id de uma linha
+que nunca existiu ficaria no registro do processo.
+"""
+
+import threading
+import time
+
+from django.db import IntegrityError, connection, transaction
+
+from .models import OrderDimension
+
+RELOAD_INTERVAL = 60
+
+_lock = threading.Lock()
+_ids = None
+_names = None
+_loaded_at = 0.0
+_local = threading.local()
+
+
+def canonical(value):
+    """Valor canônico: maiúsculas e espaços normalizados; vazio vira None"""
+    if value is None:
+        return None
+    value = " ".join(str(value).split()).upper()
+    return value or None
+
+
+def _in_transaction():
+    # Os blocos atomic do TestCase não são transações da aplicação
+    return any(not block._from_testcase for block in connection.atomic_blocks)
+
+
+def _uncommitted():
+    """Se esta thread tem gravações na tabela ainda não confirmadas"""
+    if not getattr(_local, "uncommitted", False):
+        return False
+    if _in_transaction():
+        return True
+    # A transação terminou (confirmada ou revertida)
+    _local.uncommitted = False
+    return False
+
+
+def _fetch():
+    ids = {}
+    names = {}
+    rows = OrderDimension.objects.values_list("id", "kind", "name")
+    for pk, kind, name in rows:
+        ids[(kind, name)] = pk
+        names[pk] = name
+    return ids, names
+
+
+def _load():
+    global _ids, _names, _loaded_at
+
+    ids, names = _fetch()
+    if _uncommitted():
+        return ids, names
+
+    with _lock:
+        _ids = ids
+        _names = names
+        _loaded_at = time.monotonic()
+    return ids, names
+
+
+def _registry():
+    ids, names = _ids, _names
+    if ids is None or names is None or _uncommitted():
+        return _load()
+    return ids, names
+
+
+def _reload_on_miss():
+    if _uncommitted() or time.monotonic() - _loaded_at < RELOAD_INTERVAL:
+        return None
+    return _load()
+
+
+def invalidate(**kwargs):
+    """Descarta o registro; a próxima consulta recarrega a tabela"""
+    global _ids, _names
+
+    with _lock:
+        _ids = None
+        _names = None
+    _local.uncommitted = _in_transaction()
+
+
+def dimension_id(kind, value, create=False):
+    """
+    Id do valor canônico de `value` na coluna `kind`, ou None para valores
+    vazios. Com create=True o valor é criado caso não exista.
+    """
+    name = canonical(value)
+    if name is None:
+        return None
+    ids, _ = _registry()
+    pk = ids.get((kind, name))
+    if pk is None:
+        reloaded = _reload_on_miss()
+        if reloaded:
+            pk = reloaded[0].get((kind, name))
+    if pk is not None or not create:
+        return pk
+
+    try:
+        with transaction.atomic():
+            pk = OrderDimension.objects.create(kind=kind, name=name).id
+    except IntegrityError:
+        # Criado por outra requisição entre a leitura e o INSERT
+        pk = OrderDimension.objects.get(kind=kind, name=name).id
+    invalidate()
+    return pk
+
+
+def dimension_name(pk):
+    """Valor canônico pelo id, ou None"""
+    if pk is None:
+        return None
+    _, names = _registry()
+    name = names.get(pk)
+    if name is None:
+        reloaded = _reload_on_miss()
+        if reloaded:
+            name = reloaded[1].get(pk)
+    return name
+
+
+def _search(ids, kind, term):
+    return sorted(
+        pk for (found, name), pk in ids.items() if found == kind and term in name
+    )
+
+
+def search_dimension_ids(kind, term):
+    """
+    Ids dos valores da coluna que contêm o termo, sem diferenciar maiúsculas
+    (equivalente a `<coluna>__icontains` sobre os valores canônicos)
+    """
+    term = canonical(term) or ""
+    ids, _ = _registry()
+    found = _search(ids, kind, term)
+    if not found:
+        reloaded = _reload_on_miss()
+        if reloaded:
+            found = _search(reloaded[0], kind, term)
+    return found
@@ -0,0 +1,473 @@
+"""
+Montagem da listagem de OS por fase (formato do frontend)
+
+`with_related` carrega em lote tudo o que `order_payload` lê de cada OS:
+cliente, funcionários, evento, motivo de recusa, itens com produtos e o
+contato e o endereço mais recentes do cliente. O carregamento funciona
+tanto com o queryset inteiro quanto com `.iterator(chunk_size=...)`, em
+que o prefetch é feito a cada lote.
+
+`board` monta o quadro de fases: as primeiras OS e o total de cada fase
+numa única query com ROW_NUMBER() por fase.
+"""
+
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    F,
+    Prefetch,
+    Q,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import RowNumber
+
+from accounts.models import PersonsAdresses, PersonsContacts
+
+from . import phases
+from .models import ServiceOrder, ServiceOrderItem
+
+# OS por lote na listagem em streaming (uma rodada de prefetch por lote)
+STREAM_CHUNK_SIZE = 200
+
+# Colunas do quadro, na ordem do frontend (ATRASADO é uma fase virtual)
+BOARD_PHASES = (
+    "PENDENTE",
+    "EM_PRODUCAO",
+    "AGUARDANDO_RETIRADA",
+    "AGUARDANDO_DEVOLUCAO",
+    "ATRASADO",
+    "FINALIZADO",
+    "RECUSADA",
+)
+BOARD_ORDERING = (F("order_date").desc(nulls_last=True), F("id").desc())
+
+
+def with_related(queryset):
+    """Relações usadas por `order_payload`, sem queries por OS"""
+    return queryset.select_related(
+        "renter",
+        "employee",
+        "attendant",
+        "renter__person_type",
+        "event",
+        "justification_reason",
+    ).prefetch_related(
+        Prefetch(
+            "renter__contacts",
+            queryset=PersonsContacts.objects.order_by("-date_created", "-id"),
+            to_attr="latest_contacts",
+        ),
+        Prefetch(
+            "renter__personsadresses_set",
+            queryset=PersonsAdresses.objects.select_related("city").order_by(
+                "-date_created", "-id"
+            ),
+            to_attr="latest_addresses",
+        ),
+        Prefetch(
+            "items",
+            queryset=ServiceOrderItem.objects.select_related(
+                "temporary_product", "product"
+            ),
+        ),
+    )
+
+
+def _latest(person, attr, manager):
+    """Registro mais recente (prefetchado em `attr`, ou buscado no banco)"""
+    prefetched = getattr(person, attr, None)
+    if prefetched is not None:
+        return prefetched[0] if prefetched else None
+    return getattr(person, manager).order_by("-date_created", "-id").first()
+
+
+def _latest_dated(person, attr, manager):
+    """
+    Registro escolhido pelo detalhe da OS: o mais recente entre os que têm
+    date_created, senão o de maior id (prefetchado em `attr`, ou do banco)
+    """
+    records = getattr(person, attr, None)
+    if records is None:
+        records = list(getattr(person, manager).order_by("-date_created", "-id"))
+    dated = [record for record in records if record.date_created is not None]
+    if dated:
+        return dated[0]
+    return max(records, key=lambda record: record.id, default=None)
+
+
+def client_payload(renter, latest=_latest):
+    """Dados do cliente com o contato e o endereço escolhidos por `latest`"""
+    client_data = {
+        "id": renter.id,
+        "name": renter.name,
+        "cpf": renter.cpf,
+        "person_type": (
+            {
+                "id": renter.person_type.id,
+                "type": renter.person_type.type,
+            }
+            if renter.person_type
+            else None
+        ),
+    }
+
+    # Contatos do cliente (apenas o mais recente)
+    contact = latest(renter, "latest_contacts", "contacts")
+    client_data["contacts"] = []
+    if contact:
+        client_data["contacts"].append(
+            {
+                "id": contact.id,
+                "email": contact.email,
+                "phone": contact.phone,
+            }
+        )
+
+    # Endereços do cliente (apenas o mais recente)
+    address = latest(renter, "latest_addresses", "personsadresses_set")
+    client_data["addresses"] = []
+    if address:
+        city_data = None
+        if address.city:
+            city_data = {
+                "id": address.city.id,
+                "name": address.city.name,
+                "uf": address.city.uf,
+            }
+
+        client_data["addresses"].append(
+            {
+                "id": address.id,
+                "cep": address.cep,
+                "rua": address.street,
+                "numero": address.number,
+                "bairro": address.neighborhood,
+                "complemento": address.complemento or "",
+                "cidade": city_data,
+            }
+        )
+    return client_data
+
+
+def order_payload(order, current_phase, today, latest=_latest):
+    """Dados de uma OS no formato da listagem por fase"""
+    client_data = client_payload(order.renter, latest)
+
+    # Dados da OS
+    order_data = {
+        "id": order.id,
+        "total_value": order.total_value,
+        "advance_payment": order.advance_payment,
+        "remaining_payment": order.remaining_payment,
+        "esta_atrasada": order.esta_atrasada,
+        "employee_name": order.employee.name if order.employee else "",
+        "attendant_name": order.attendant.name if order.attendant else "",
+        "order_date": order.order_date,
+        "prova_date": order.prova_date,
+        "retirada_date": order.retirada_date,
+        "devolucao_date": order.devolucao_date,
+        "production_date": order.production_date,
+        "data_recusa": order.data_recusa,
+        "data_finalizado": order.data_finalizado,
+        "client": client_data,
+        "justification_refusal": order.justification_refusal,
+        "justification_reason": (
+            order.justification_reason.name if order.justification_reason else None
+        ),
+        "event_date": (
+            order.event.event_date.date()
+            if order.event
+            and order.event.event_date
+            and hasattr(order.event.event_date, "date")
+            else order.event.event_date if order.event else None
+        ),
+        "event_name": order.event.name if order.event else None,
+    }
+
+    # Calcular justificativa do atraso para fase ATRASADO
+    if current_phase == "ATRASADO":
+        # Para fase ATRASADO, determinar a justificativa baseada nas datas
+        event_date = None
+        if order.event and order.event.event_date:
+            # Garantir que event_date seja datetime.date para comparação
+            if hasattr(order.event.event_date, "date"):
+                event_date = order.event.event_date.date()
+            else:
+                event_date = order.event.event_date
+
+        if (
+            order.devolucao_date
+            and order.devolucao_date < today
+            and event_date
+            and event_date > today
+        ):
+            order_data["justificativa_atraso"] = "Cliente ainda não devolveu"
+        elif (
+            order.retirada_date
+            and order.retirada_date < today
+            and event_date
+            and event_date > today
+        ):
+            order_data["justificativa_atraso"] = "Cliente não retirou"
+        elif order.data_devolvido is None and event_date and event_date < today:
+            order_data["justificativa_atraso"] = (
+                "Cliente ainda não devolveu (evento passou)"
+            )
+        else:
+            order_data["justificativa_atraso"] = None
+    else:
+        order_data["justificativa_atraso"] = None
+
+    # Processar itens da OS
+    itens = []
+    acessorios = []
+
+    for item in order.items.all():
+        # Determinar se é produto temporário ou produto real
+        temp_product = item.temporary_product
+        product = item.product
+
+        if temp_product:
+            # Produto temporário
+            if temp_product.product_type in [
+                "paleto",
+                "camisa",
+                "calca",
+                "colete",
+            ]:
+                # Item de roupa
+                item_data = {
+                    "tipo": temp_product.product_type,
+                    "cor": temp_product.color or "",
+                    "extras": temp_product.extras or temp_product.description or "",
+                    "venda": temp_product.venda or False,
+                    "extensor": False,  # Extensor só para passante
+                }
+
+                # Campos específicos por tipo
+                if temp_product.product_type in ["paleto", "camisa"]:
+                    item_data.update(
+                        {
+                            "numero": temp_product.size
+                            or "",  # ✅ Campo "numero" retorna o "size" do banco
+                            "manga": temp_product.sleeve_length or "",
+                            "marca": temp_product.brand or "",
+                            "ajuste": item.adjustment_notes or "",
+                        }
+                    )
+                elif temp_product.product_type == "calca":
+                    item_data.update(
+                        {
+                            "numero": temp_product.size,
+                            "cintura": temp_product.waist_size or "",
+                            "perna": temp_product.leg_length or "",
+                            "marca": temp_product.brand or "",
+                            "ajuste_cintura": temp_product.ajuste_cintura or "",
+                            "ajuste_comprimento": temp_product.ajuste_comprimento or "",
+                        }
+                    )
+                elif temp_product.product_type == "colete":
+                    item_data.update({"marca": temp_product.brand or ""})
+
+                itens.append(item_data)
+            else:
+                # Acessório
+                acessorio_data = {
+                    "tipo": temp_product.product_type,
+                    "numero": temp_product.size
+                    or "",  # ✅ Campo "numero" retorna o "size" do banco
+                    "cor": temp_product.color or "",
+                    "descricao": temp_product.description or "",
+                    "marca": temp_product.brand or "",
+                    "extensor": temp_product.extensor or False,
+                    "venda": temp_product.venda or False,
+                }
+                acessorios.append(acessorio_data)
+
+        elif product:
+            # Produto real do estoque
+            if product.tipo.lower() in [
+                "paleto",
+                "camisa",
+                "calça",
+                "colete",
+            ]:
+                # Item de roupa
+                item_data = {
+                    "tipo": product.tipo.lower(),
+                    "cor": product.cor or "",
+                    "extras": product.nome_produto or "",
+                    "venda": False,  # Produtos do estoque não são vendidos
+                    "extensor": False,
+                }
+
+                # Campos específicos por tipo
+                if product.tipo.lower() in ["paleto", "camisa"]:
+                    item_data.update(
+                        {
+                            "numero": (
+                                str(product.tamanho) if product.tamanho else ""
+                            ),  # ✅ Campo "numero" retorna o "tamanho" do produto do estoque
+                            "manga": "",
+                            "marca": product.marca or "",
+                            "ajuste": item.adjustment_notes or "",
+                        }
+                    )
+                elif product.tipo.lower() == "calça":
+                    item_data.update(
+                        {
+                            "numero": (
+                                str(product.tamanho) if product.tamanho else ""
+                            ),  # ✅ Campo "numero" retorna o "tamanho" do produto do estoque
+                            "cintura": "",
+                            "perna": "",
+                            "marca": product.marca or "",
+                            "ajuste_cintura": "",
+                            "ajuste_comprimento": "",
+                        }
+                    )
+                elif product.tipo.lower() == "colete":
+                    item_data.update({"marca": product.marca or ""})
+
+                itens.append(item_data)
+            else:
+                # Acessório
+                acessorio_data = {
+                    "tipo": product.tipo.lower(),
+                    "numero": (
+                        str(product.tamanho) if product.tamanho else ""
+                    ),  # ✅ Campo "numero" retorna o "tamanho" do produto do estoque
+                    "cor": product.cor or "",
+                    "descricao": product.nome_produto or "",
+                    "marca": product.marca or "",
+                    "extensor": False,  # Produtos do estoque não têm extensor
+                    "venda": False,
+                }
+                acessorios.append(acessorio_data)
+
+    # Dados da ordem de serviço no formato esperado pelo frontend
+    ordem_servico_data = {
+        "data_pedido": order.order_date,
+        "data_evento": (
+            order.event.event_date.date()
+            if order.event
+            and order.event.event_date
+            and hasattr(order.event.event_date, "date")
+            else order.event.event_date if order.event else None
+        ),
+        "data_retirada": order.retirada_date,
+        "data_devolucao": order.devolucao_date,
+        "modalidade": order.service_type or "Aluguel",
+        "itens": itens,
+        "acessorios": acessorios,
+        "pagamento": {
+            "total": float(order.total_value) if order.total_value else 0,
+            "sinal": (float(order.advance_payment) if order.advance_payment else 0),
+            "restante": (
+                float(order.remaining_payment) if order.remaining_payment else 0
+            ),
+        },
+    }
+
+    # Adicionar dados completos ao response
+    order_data.update({"ordem_servico": ordem_servico_data})
+    return order_data
+
+
+def detail_payload(order):
+    """
+    Dados de uma OS no formato do detalhe (ServiceOrderDetailAPIView): o da
+    listagem sem os campos de atraso e de motivo de recusa, com a forma de
+    pagamento e o contato/endereço escolhidos como no detalhe
+    """
+    data = order_payload(order, None, None, latest=_latest_dated)
+    for key in ("esta_atrasada", "justification_reason", "justificativa_atraso"):
+        del data[key]
+    data["ordem_servico"]["pagamento"]["forma_pagamento"] = order.payment_method or ""
+    return data
+
+
+def late_return_q(today):
+    """
+    OS da fase virtual ATRASADO: em AGUARDANDO_DEVOLUCAO, com a devolução
+    vencida antes do evento ou sem devolução depois do evento
+    """
+    waiting_return = Q(
+        service_order_phase_id=phases.phase_id("AGUARDANDO_DEVOLUCAO"),
+        event__isnull=False,
+    )
+    return waiting_return & (
+        Q(devolucao_date__lt=today, event__event_date__gt=today)
+        | Q(data_devolvido__isnull=True, event__event_date__lt=today)
+    )
+
+
+def late_pickup(order, today):
+    """Flag esta_atrasada de uma OS em AGUARDANDO_RETIRADA"""
+    if order.retirada_date and order.retirada_date < today:
+        return True
+    event_date = order.event.event_date if order.event else None
+    return bool(event_date and event_date < today and not order.data_retirado)
+
+
+def board(limit, today):
+    """
+    Quadro de fases: {fase: {"count": total, "results": [payloads]}} com as
+    `limit` OS mais recentes de cada fase de BOARD_PHASES. Uma query numera
+    as OS por fase (e, à parte, as da fase virtual ATRASADO) e traz o total
+    de cada partição; as relações vêm em lote pelo `with_related`.
+    """
+    names = [name for name in BOARD_PHASES if name != "ATRASADO"]
+    partition = F("service_order_phase_id")
+    orders = with_related(
+        ServiceOrder.objects.filter(
+            is_virtual=False, service_order_phase_id__in=phases.phase_ids(*names)
+        )
+        .annotate(
+            atrasado=Case(
+                When(late_return_q(today), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
+        )
+        .annotate(
+            phase_rank=Window(
+                RowNumber(), partition_by=[partition], order_by=BOARD_ORDERING
+            ),
+            phase_total=Window(Count("id"), partition_by=[partition]),
+            late_rank=Window(
+                RowNumber(), partition_by=[F("atrasado")], order_by=BOARD_ORDERING
+            ),
+            late_total=Window(Count("id"), partition_by=[F("atrasado")]),
+        )
+        .filter(Q(phase_rank__lte=limit) | Q(atrasado=True, late_rank__lte=limit))
+        .order_by(*BOARD_ORDERING)
+    )
+
+    columns = {name: {"count": 0, "orders": []} for name in BOARD_PHASES}
+    for order in orders:
+        name = phases.phase_name(order.service_order_phase_id)
+        if name == "AGUARDANDO_RETIRADA":
+            # Mesma regra da listagem por fase, sem gravar a flag
+            order.esta_atrasada = late_pickup(order, today)
+        if order.phase_rank <= limit:
+            column = columns[name]
+            column["count"] = max(column["count"], order.phase_total)
+            column["orders"].append(order)
+        if order.atrasado and order.late_rank <= limit:
+            column = columns["ATRASADO"]
+            column["count"] = order.late_total
+            column["orders"].append(order)
+
+    return {
+        name: {
+            "count": column["count"],
+            "results": [
+                order_payload(order, name, today) for order in column["orders"][:limit]
+            ],
+        }
+        for name, column in columns.items()
+    }
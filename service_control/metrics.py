@@ -0,0 +1,795 @@
+"""
+Consultas agregadas de ordens de serviço (relatórios e métricas)
+"""
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, Lead, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from accounts.models import Person
+from roupadegala import cache as response_cache
+
+from . import dimensions, listing, phases
+from .models import ServiceOrder, ServiceOrderPhase, ServiceOrderPhaseHistory
+
+LEAD_TIME_PERCENTILES = (0.5, 0.9, 0.95)
+
+# Tempo de permanência em cada fase: a entrada é uma linha do histórico e a
+# saída é a linha seguinte da mesma OS (LEAD). A janela roda sobre todo o
+# histórico das OS que entraram em alguma fase no período, para que saídas
+# depois do fim do período ainda contem.
+LEAD_TIME_SQL = """
+WITH spans AS (
+    SELECT
+        h.to_phase_id AS phase_id,
+        h.date_created AS entered_at,
+        EXTRACT(EPOCH FROM (
+            LEAD(h.date_created) OVER (
+                PARTITION BY h.service_order_id ORDER BY h.date_created, h.id
+            ) - h.date_created
+        )) AS seconds
+    FROM {history} h
+    WHERE h.service_order_id IN (
+        SELECT service_order_id FROM {history}
+        WHERE date_created >= %(start)s AND date_created < %(end)s
+    )
+)
+SELECT
+    p.name,
+    COUNT(s.seconds) AS exits,
+    COUNT(*) - COUNT(s.seconds) AS open,
+    AVG(s.seconds) AS mean,
+    percentile_cont(%(percentiles)s::float8[]) WITHIN GROUP (ORDER BY s.seconds)
+        AS percentiles
+FROM spans s
+JOIN {phase} p ON p.id = s.phase_id
+WHERE s.entered_at >= %(start)s AND s.entered_at < %(end)s
+GROUP BY p.name
+ORDER BY p.name
+"""
+
+
+def _bounds(start_date, end_date):
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start, end
+
+
+def _percentile(values, q):
+    """Percentil com interpolação linear (mesma definição de percentile_cont)"""
+    if not values:
+        return None
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _lead_times_postgres(start, end):
+    sql = LEAD_TIME_SQL.format(
+        history=ServiceOrderPhaseHistory._meta.db_table,
+        phase=ServiceOrderPhase._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            {"start": start, "end": end, "percentiles": list(LEAD_TIME_PERCENTILES)},
+        )
+        return [
+            (name, exits, open_count, mean, percentiles or [None] * 3)
+            for name, exits, open_count, mean, percentiles in cursor.fetchall()
+        ]
+
+
+def _lead_times_orm(start, end):
+    """Mesmo cálculo para outros bancos: LEAD no ORM, percentis em Python"""
+    order_ids = ServiceOrderPhaseHistory.objects.filter(
+        date_created__gte=start, date_created__lt=end
+    ).values("service_order_id")
+    rows = (
+        ServiceOrderPhaseHistory.objects.filter(service_order_id__in=order_ids)
+        .annotate(
+            left_at=Window(
+                Lead("date_created"),
+                partition_by=[F("service_order_id")],
+                order_by=[F("date_created").asc(), F("id").asc()],
+            )
+        )
+        .values_list("to_phase__name", "date_created", "left_at")
+    )
+    spans = {}
+    for name, entered_at, left_at in rows:
+        if name is None or not (start <= entered_at < end):
+            continue
+        phase = spans.setdefault(name, {"seconds": [], "open": 0})
+        if left_at is None:
+            phase["open"] += 1
+        else:
+            phase["seconds"].append((left_at - entered_at).total_seconds())
+
+    result = []
+    for name in sorted(spans):
+        seconds = sorted(spans[name]["seconds"])
+        result.append(
+            (
+                name,
+                len(seconds),
+                spans[name]["open"],
+                sum(seconds) / len(seconds) if seconds else None,
+                [_percentile(seconds, q) for q in LEAD_TIME_PERCENTILES],
+            )
+        )
+    return result
+
+
+def phase_lead_times(start_date, end_date):
+    """
+    Permanência por fase das entradas ocorridas entre as datas (inclusive):
+    quantidade de saídas, entradas ainda em aberto, média e percentis
+    (p50/p90/p95) em horas.
+    """
+    start, end = _bounds(start_date, end_date)
+    if connection.vendor == "postgresql":
+        rows = _lead_times_postgres(start, end)
+    else:
+        rows = _lead_times_orm(start, end)
+
+    def hours(seconds):
+        return round(float(seconds) / 3600, 2) if seconds is not None else None
+
+    return [
+        {
+            "fase": name,
+            "quantidade": exits,
+            "em_aberto": open_count,
+            "media_horas": hours(mean),
+            "p50_horas": hours(percentiles[0]),
+            "p90_horas": hours(percentiles[1]),
+            "p95_horas": hours(percentiles[2]),
+        }
+        for name, exits, open_count, mean, percentiles in rows
+    ]
+
+
+# Agenda: tipo de compromisso -> coluna de data da OS
+AGENDA_DATES = {
+    "provas": "prova_date",
+    "retiradas": "retirada_date",
+    "devolucoes": "devolucao_date",
+}
+AGENDA_ACTIVE_PHASES = (
+    "PENDENTE",
+    "EM_PRODUCAO",
+    "AGUARDANDO_RETIRADA",
+    "AGUARDANDO_DEVOLUCAO",
+)
+
+
+def agenda_counts(today, horizon):
+    """
+    Contadores da agenda por tipo (provas, retiradas, devoluções), numa
+    única query de agregação condicional:
+
+    - em_atraso: OS em RECUSADA/ATRASADO com a data preenchida, mais OS
+      ativas marcadas como atrasadas com a data (retirada ou devolução)
+      anterior a hoje;
+    - hoje: OS ativas com a data igual a hoje;
+    - proximos: OS ativas com a data depois de hoje e até `horizon`.
+
+    Fora as fases de atraso, a varredura fica limitada às OS ativas com
+    alguma data entre hoje e `horizon` ou com a flag de atraso (índices nas
+    colunas de data).
+    """
+    active = phases.phase_ids(*AGENDA_ACTIVE_PHASES)
+    overdue = [
+        pk for pk in (phases.phase_id("RECUSADA"), phases.phase_id("ATRASADO")) if pk
+    ]
+    counts = {
+        bucket: dict.fromkeys(AGENDA_DATES, 0)
+        for bucket in ("em_atraso", "hoje", "proximos")
+    }
+
+    in_active = Q(service_order_phase_id__in=active)
+    in_overdue = Q(service_order_phase_id__in=overdue)
+    aggregates = {}
+    for kind, column in AGENDA_DATES.items():
+        late = []
+        if overdue:
+            late.append(in_overdue & Q(**{f"{column}__isnull": False}))
+        if active:
+            if kind != "provas":
+                late.append(
+                    in_active & Q(esta_atrasada=True, **{f"{column}__lt": today})
+                )
+            aggregates[f"hoje_{kind}"] = Count(
+                "pk", filter=in_active & Q(**{column: today})
+            )
+            aggregates[f"proximos_{kind}"] = Count(
+                "pk",
+                filter=in_active
+                & Q(**{f"{column}__gt": today, f"{column}__lte": horizon}),
+            )
+        if late:
+            condition = late[0]
+            for extra in late[1:]:
+                condition |= extra
+            aggregates[f"em_atraso_{kind}"] = Count("pk", filter=condition)
+    if not aggregates:
+        return counts
+
+    scan = Q()
+    if active:
+        window = Q(esta_atrasada=True)
+        for column in AGENDA_DATES.values():
+            window |= Q(**{f"{column}__gte": today, f"{column}__lte": horizon})
+        scan |= in_active & window
+    if overdue:
+        scan |= in_overdue
+
+    row = ServiceOrder.objects.filter(scan).aggregate(**aggregates)
+    for key, value in row.items():
+        bucket, kind = key.rsplit("_", 1)
+        counts[bucket][kind] = value
+    return counts
+
+
+# Fases de OS confirmadas (fechadas) nos resultados financeiros
+CONFIRMED_PHASES = (
+    "EM_PRODUCAO",
+    "AGUARDANDO_RETIRADA",
+    "AGUARDANDO_DEVOLUCAO",
+    "FINALIZADO",
+)
+
+
+def _money(value):
+    return float(value or 0)
+
+
+def financial_rollup(today, week_start, month_start):
+    """
+    Resultados financeiros do dia, da semana e do mês (OS confirmadas, por
+    data do pedido) e a série diária do mês, a partir de uma única query
+    agrupada por dia sobre a janela mais longa. As somas são feitas em
+    Decimal e convertidas para número só no fim.
+
+    - total_pedidos / numero_pedidos: valor e quantidade de OS com valor;
+    - total_recebido: sinais, mais o restante das OS finalizadas.
+
+    Retorna (resultados por período, série diária de month_start a today).
+    """
+    start = min(week_start, month_start)
+    has_total = Q(total_value__isnull=False) & ~Q(total_value=0)
+    rows = (
+        ServiceOrder.objects.filter(
+            order_date__gte=start,
+            order_date__lte=today,
+            service_order_phase_id__in=phases.phase_ids(*CONFIRMED_PHASES),
+        )
+        .values("order_date")
+        .order_by("order_date")
+        .annotate(
+            total_pedidos=Sum("total_value", filter=has_total),
+            numero_pedidos=Count("pk", filter=has_total),
+            sinal=Sum("advance_payment"),
+            restante=Sum(
+                "remaining_payment",
+                filter=Q(service_order_phase_id=phases.phase_id("FINALIZADO")),
+            ),
+        )
+    )
+
+    periods = {"dia": today, "semana": week_start, "mes": month_start}
+    totals = {
+        name: {
+            "total_pedidos": Decimal(0),
+            "total_recebido": Decimal(0),
+            "numero_pedidos": 0,
+        }
+        for name in periods
+    }
+    by_day = {}
+    for row in rows:
+        day = {
+            "total_pedidos": row["total_pedidos"] or Decimal(0),
+            "total_recebido": (row["sinal"] or Decimal(0))
+            + (row["restante"] or Decimal(0)),
+            "numero_pedidos": row["numero_pedidos"],
+        }
+        by_day[row["order_date"]] = day
+        for name, period_start in periods.items():
+            if row["order_date"] >= period_start:
+                for key, value in day.items():
+                    totals[name][key] += value
+
+    resultados = {
+        name: {
+            "total_pedidos": _money(values["total_pedidos"]),
+            "total_recebido": _money(values["total_recebido"]),
+            "numero_pedidos": values["numero_pedidos"],
+        }
+        for name, values in totals.items()
+    }
+    serie = []
+    day = month_start
+    while day <= today:
+        values = by_day.get(day)
+        serie.append(
+            {
+                "data": day,
+                "total_pedidos": _money(values and values["total_pedidos"]),
+                "total_recebido": _money(values and values["total_recebido"]),
+                "numero_pedidos": values["numero_pedidos"] if values else 0,
+            }
+        )
+        day += timedelta(days=1)
+    return resultados, serie
+
+
+# Cache de resultados por período (data do pedido). A chave inclui a geração
+# de cada mês coberto; salvar, excluir ou mudar a fase de uma OS troca a
+# geração do mês da OS (signals), então, com cache compartilhado, resultados
+# de períodos encerrados não expiram. Com cache por processo (locmem) a troca
+# de geração não chega aos outros workers: os períodos encerrados expiram em
+# PERIOD_CACHE_CLOSED_TIMEOUT. O período em aberto (até hoje) expira em pouco
+# tempo, para cobrir escritas que não passam por esses caminhos.
+PERIOD_CACHE_OPEN_TIMEOUT = 60
+PERIOD_CACHE_CLOSED_TIMEOUT = 10 * 60
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        # Valor ainda como veio da requisição, antes de ser relido do banco
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _month_namespace(day):
+    return f"orders-month:{day:%Y-%m}"
+
+
+def month_namespaces(start, end):
+    """Namespaces de geração dos meses entre as datas (inclusive)"""
+    namespaces = []
+    month = start.replace(day=1)
+    while month <= end:
+        namespaces.append(_month_namespace(month))
+        month = (month + timedelta(days=32)).replace(day=1)
+    return namespaces
+
+
+def invalidate_months(*order_dates):
+    """Troca a geração dos meses das datas de pedido (None é ignorado)"""
+    namespaces = {
+        _month_namespace(_as_date(day)) for day in order_dates if day is not None
+    }
+    if namespaces:
+        response_cache.bump(*sorted(namespaces))
+
+
+def invalidate_employee_months(person):
+    """Troca a geração dos meses que têm OS atendidas pela pessoa"""
+    months = ServiceOrder.objects.filter(employee=person).dates("order_date", "month")
+    invalidate_months(*months)
+
+
+def period_cached(name, start, end, params, compute):
+    """
+    Resultado de `compute()` para o período de OS entre `start` e `end`,
+    guardado por (name, período, params) com as gerações dos meses do
+    período. Períodos encerrados (end antes de hoje) não expiram com cache
+    compartilhado e duram PERIOD_CACHE_CLOSED_TIMEOUT com cache por
+    processo; o período em aberto dura PERIOD_CACHE_OPEN_TIMEOUT segundos.
+    """
+    key = response_cache.data_key(
+        name,
+        start,
+        end,
+        params,
+        response_cache.versions(month_namespaces(start, end)),
+    )
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        if end >= date.today():
+            timeout = PERIOD_CACHE_OPEN_TIMEOUT
+        elif response_cache.is_shared():
+            timeout = None
+        else:
+            timeout = PERIOD_CACHE_CLOSED_TIMEOUT
+        cache.set(key, value, timeout)
+    return value
+
+
+def _dimension_ids(column, value):
+    pk = dimensions.dimension_id(column, value)
+    return [pk] if pk is not None else []
+
+
+def filter_orders(queryset, filters):
+    """
+    Filtros opcionais do dashboard (atendente_id, tipo_cliente,
+    forma_pagamento, canal_origem) aplicados ao queryset de OS. Os valores
+    de texto são comparados pelo id do valor canônico (OrderDimension):
+    igualdade para tipo de cliente e canal, "contém" para forma de pagamento.
+    """
+    if filters.get("atendente_id"):
+        queryset = queryset.filter(employee_id=filters["atendente_id"])
+    if filters.get("tipo_cliente"):
+        queryset = queryset.filter(
+            renter_role_dimension_id__in=_dimension_ids(
+                "renter_role", filters["tipo_cliente"]
+            )
+        )
+    if filters.get("forma_pagamento"):
+        queryset = queryset.filter(
+            payment_method_dimension_id__in=dimensions.search_dimension_ids(
+                "payment_method", filters["forma_pagamento"]
+            )
+        )
+    if filters.get("canal_origem"):
+        queryset = queryset.filter(
+            came_from_dimension_id__in=_dimension_ids(
+                "came_from", filters["canal_origem"]
+            )
+        )
+    return queryset
+
+
+# Série temporal: agrupamento -> (Trunc, intervalo do generate_series)
+TIMESERIES_BUCKETS = {
+    "day": (TruncDay, "1 day"),
+    "week": (TruncWeek, "1 week"),
+    "month": (TruncMonth, "1 month"),
+}
+TIMESERIES_METRICS = ("orders", "vendido", "recebido")
+
+# Preenche com zero os períodos sem OS: generate_series com LEFT JOIN na
+# query agrupada do ORM
+TIMESERIES_SQL = """
+SELECT s.bucket::date, COALESCE(t.value, 0)
+FROM generate_series(%s::date, %s::date, %s::interval) AS s(bucket)
+LEFT JOIN ({rows}) t ON t.bucket::date = s.bucket::date
+ORDER BY 1
+"""
+
+
+def bucket_start(day, bucket):
+    """Início do período (dia, semana ISO ou mês) que contém `day`"""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(day, bucket):
+    if bucket == "week":
+        return day + timedelta(days=7)
+    if bucket == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _timeseries_value(metric):
+    zero = Value(Decimal(0))
+    if metric == "orders":
+        return Count("pk")
+    if metric == "vendido":
+        return Coalesce(Sum("total_value"), zero)
+    return Coalesce(Sum("advance_payment"), zero) + Coalesce(
+        Sum(
+            "remaining_payment",
+            filter=Q(service_order_phase_id=phases.phase_id("FINALIZADO")),
+        ),
+        zero,
+    )
+
+
+def _timeseries_postgres(rows, first, end, bucket):
+    sql, params = rows.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            TIMESERIES_SQL.format(rows=sql),
+            [first, end, TIMESERIES_BUCKETS[bucket][1], *params],
+        )
+        return cursor.fetchall()
+
+
+def _timeseries_orm(rows, first, end, bucket):
+    """Mesmo resultado para outros bancos: lacunas preenchidas em Python"""
+    values = {row["bucket"]: row["value"] for row in rows}
+    result = []
+    day = first
+    while day <= end:
+        result.append((day, values.get(day, 0)))
+        day = _next_bucket(day, bucket)
+    return result
+
+
+def revenue_timeseries(start, end, bucket="day", metric="orders", filters=None):
+    """
+    Série por período (dia, semana ou mês) das OS com data de pedido entre
+    `start` e `end` (inclusive), numa única query agrupada por Trunc, com os
+    períodos sem OS preenchidos com zero. Métricas:
+
+    - orders: número de OS (atendimentos);
+    - vendido: valor das OS confirmadas;
+    - recebido: sinais das OS confirmadas, mais o restante das finalizadas.
+
+    `filters` aceita os filtros do dashboard (`filter_orders`). O primeiro
+    período começa no início do período de `start`. O resultado fica no
+    cache de períodos (`period_cached`).
+    """
+    filters = filters or {}
+    return period_cached(
+        "timeseries",
+        start,
+        end,
+        (bucket, metric, sorted(filters.items())),
+        lambda: _revenue_timeseries(start, end, bucket, metric, filters),
+    )
+
+
+def _revenue_timeseries(start, end, bucket, metric, filters):
+    queryset = filter_orders(
+        ServiceOrder.objects.filter(order_date__gte=start, order_date__lte=end),
+        filters,
+    )
+    if metric != "orders":
+        queryset = queryset.filter(
+            service_order_phase_id__in=phases.phase_ids(*CONFIRMED_PHASES)
+        )
+    trunc = TIMESERIES_BUCKETS[bucket][0]
+    rows = (
+        queryset.annotate(bucket=trunc("order_date"))
+        .values("bucket")
+        .order_by()
+        .annotate(value=_timeseries_value(metric))
+    )
+
+    first = bucket_start(start, bucket)
+    if connection.vendor == "postgresql":
+        points = _timeseries_postgres(rows, first, end, bucket)
+    else:
+        points = _timeseries_orm(rows, first, end, bucket)
+    return [
+        {
+            "periodo": day,
+            "valor": int(value) if metric == "orders" else _money(value),
+        }
+        for day, value in points
+    ]
+
+
+# Opções dos filtros do dashboard: chave da resposta -> coluna da OS
+FACET_COLUMNS = {
+    "tipos_cliente": "renter_role",
+    "formas_pagamento": "payment_method",
+    "canais_origem": "came_from",
+}
+# As opções são mantidas no cache a cada OS salva ou removida
+# (`add_order_facets` / `remove_order_facets`) e descartadas pelas gravações
+# em lote que mexem nelas (pessoas mescladas, transições com forma de
+# pagamento); o timeout recompõe o que muda por caminhos sem signal
+FACETS_CACHE_KEY = "dashboard:facets"
+FACETS_CACHE_TIMEOUT = 6 * 60 * 60
+
+
+def _facet_value(value):
+    return value.upper() if value else None
+
+
+def _build_facets():
+    atendentes = [
+        {"id": pk, "nome": name}
+        for pk, name in Person.objects.filter(employee_service_orders__isnull=False)
+        .values_list("id", "name")
+        .distinct()
+        .order_by("name", "id")
+    ]
+
+    # Valores distintos das três colunas numa única query (UNION)
+    queries = [
+        ServiceOrder.objects.exclude(**{f"{column}__isnull": True})
+        .exclude(**{column: ""})
+        .annotate(facet=Value(key), value=F(column))
+        .values_list("facet", "value")
+        .order_by()
+        for key, column in FACET_COLUMNS.items()
+    ]
+    values = {key: set() for key in FACET_COLUMNS}
+    for key, value in queries[0].union(*queries[1:]):
+        values[key].add(_facet_value(value))
+
+    return {
+        "atendentes": atendentes,
+        **{key: sorted(found) for key, found in values.items()},
+    }
+
+
+def filter_facets():
+    """
+    Opções dos filtros do dashboard: atendentes com OS (id e nome, por nome)
+    e os valores distintos, em maiúsculas, de tipo de cliente, forma de
+    pagamento e canal de origem. Servidas do cache; montadas com duas
+    queries quando ausentes.
+    """
+    facets = cache.get(FACETS_CACHE_KEY)
+    if facets is None:
+        facets = _build_facets()
+        cache.set(FACETS_CACHE_KEY, facets, FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+def add_order_facets(order):
+    """
+    Acrescenta às opções em cache os valores novos de uma OS salva. Sem
+    opções em cache não faz nada: a próxima leitura monta tudo do banco.
+    """
+    facets = cache.get(FACETS_CACHE_KEY)
+    if facets is None:
+        return
+    changed = False
+    for key, column in FACET_COLUMNS.items():
+        value = _facet_value(getattr(order, column))
+        if value and value not in facets[key]:
+            facets[key] = sorted([*facets[key], value])
+            changed = True
+
+    if order.employee_id and order.employee_id not in {
+        atendente["id"] for atendente in facets["atendentes"]
+    }:
+        name = (
+            Person.objects.filter(id=order.employee_id)
+            .values_list("name", flat=True)
+            .first()
+        )
+        if name is not None:
+            facets["atendentes"] = sorted(
+                [*facets["atendentes"], {"id": order.employee_id, "nome": name}],
+                key=lambda atendente: (atendente["nome"], atendente["id"]),
+            )
+            changed = True
+
+    if changed:
+        cache.set(FACETS_CACHE_KEY, facets, FACETS_CACHE_TIMEOUT)
+
+
+def remove_order_facets(values):
+    """
+    Retira das opções em cache os valores antigos (coluna -> valor) de uma
+    OS editada ou removida que nenhuma outra OS usa mais. Uma query EXISTS
+    por valor que está nas opções.
+    """
+    facets = cache.get(FACETS_CACHE_KEY)
+    if facets is None or not values:
+        return
+    changed = False
+    for key, column in FACET_COLUMNS.items():
+        value = _facet_value(values.get(column))
+        if value not in facets[key]:
+            continue
+        if not ServiceOrder.objects.filter(**{f"{column}__iexact": value}).exists():
+            facets[key] = [found for found in facets[key] if found != value]
+            changed = True
+
+    employee_id = values.get("employee_id")
+    atendentes = facets["atendentes"]
+    if (
+        employee_id
+        and any(atendente["id"] == employee_id for atendente in atendentes)
+        and not ServiceOrder.objects.filter(employee_id=employee_id).exists()
+    ):
+        facets["atendentes"] = [a for a in atendentes if a["id"] != employee_id]
+        changed = True
+
+    if changed:
+        cache.set(FACETS_CACHE_KEY, facets, FACETS_CACHE_TIMEOUT)
+
+
+def invalidate_facets():
+    """Descarta as opções em cache; a próxima leitura monta tudo do banco"""
+    cache.delete(FACETS_CACHE_KEY)
+    # De novo após o commit, para não manter opções montadas por outra
+    # requisição antes dele
+    transaction.on_commit(lambda: cache.delete(FACETS_CACHE_KEY))
+
+
+def rename_facet_attendant(person):
+    """Atualiza o nome de um atendente nas opções em cache, se ele estiver lá"""
+    facets = cache.get(FACETS_CACHE_KEY)
+    if facets is None:
+        return
+    atendentes = facets["atendentes"]
+    for atendente in atendentes:
+        if atendente["id"] == person.id:
+            if atendente["nome"] != person.name:
+                atendente["nome"] = person.name
+                atendentes.sort(key=lambda item: (item["nome"], item["id"]))
+                cache.set(FACETS_CACHE_KEY, facets, FACETS_CACHE_TIMEOUT)
+            return
+
+
+# Contadores das abas de fase (listing.BOARD_PHASES, com a fase virtual
+# ATRASADO). Cada fase tem sua chave, ajustada com incr/decr nas mudanças de
+# fase; o timeout recalcula tudo do banco periodicamente, corrigindo o que
+# mudou por caminhos sem signal (bulk_create, UPDATE direto, OS virtuais).
+PHASE_COUNTS_TIMEOUT = 5 * 60
+
+
+def _phase_count_keys(today):
+    return {
+        name: f"phase-counts:{today.isoformat()}:{name}"
+        for name in listing.BOARD_PHASES
+    }
+
+
+def _count_phases(today):
+    names = [name for name in listing.BOARD_PHASES if name != "ATRASADO"]
+    rows = (
+        ServiceOrder.objects.filter(
+            is_virtual=False, service_order_phase_id__in=phases.phase_ids(*names)
+        )
+        .values("service_order_phase_id")
+        .order_by()
+        .annotate(
+            total=Count("pk"),
+            atrasado=Count("pk", filter=listing.late_return_q(today)),
+        )
+    )
+    counts = dict.fromkeys(listing.BOARD_PHASES, 0)
+    for row in rows:
+        counts[phases.phase_name(row["service_order_phase_id"])] += row["total"]
+        counts["ATRASADO"] += row["atrasado"]
+    return counts
+
+
+def phase_counts(today):
+    """
+    Número de OS (não virtuais) em cada fase das abas, incluindo ATRASADO
+    pelas regras da listagem por fase. Servido do cache; calculado com uma
+    única query agrupada por fase quando falta alguma chave.
+    """
+    keys = _phase_count_keys(today)
+    found = cache.get_many(keys.values())
+    if len(found) == len(keys):
+        return {name: found[key] for name, key in keys.items()}
+
+    counts = _count_phases(today)
+    cache.set_many(
+        {keys[name]: count for name, count in counts.items()}, PHASE_COUNTS_TIMEOUT
+    )
+    return counts
+
+
+def invalidate_phase_counts(today=None):
+    """Descarta os contadores; a próxima leitura recalcula do banco"""
+    cache.delete_many(_phase_count_keys(today or date.today()).values())
+
+
+def adjust_phase_counts(source, target, amount):
+    """
+    Move `amount` OS da fase `source` para `target` (None para OS criadas ou
+    removidas) nos contadores em cache. Mudanças que envolvem
+    AGUARDANDO_DEVOLUCAO descartam os contadores: a fase virtual ATRASADO
+    depende das datas de cada OS.
+    """
+    today = date.today()
+    if "AGUARDANDO_DEVOLUCAO" in (source, target):
+        invalidate_phase_counts(today)
+        return
+    keys = _phase_count_keys(today)
+    for name, delta in ((source, -amount), (target, amount)):
+        if name not in keys:
+            continue
+        try:
+            cache.incr(keys[name], delta)
+        except ValueError:
+            # Chave ausente: a próxima leitura recalcula todas
+            pass
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('service_control', '0030_alter_renter_nullable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceOrderPhaseHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True)),
+                ('date_updated', models.DateTimeField(blank=True, null=True)),
+                ('date_canceled', models.DateTimeField(blank=True, null=True)),
+                ('transition', models.CharField(help_text="Nome da transição (state_machine) ou 'create'", max_length=50)),
+                ('canceled_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='canceled_%(class)s', to=settings.AUTH_USER_MODEL)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='created_%(class)s', to=settings.AUTH_USER_MODEL)),
+                ('from_phase', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='service_control.serviceorderphase')),
+                ('service_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='phase_history', to='service_control.serviceorder')),
+                ('to_phase', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='service_control.serviceorderphase')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='updated_%(class)s', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'service_order_phase_history',
+                'indexes': [models.Index(fields=['date_created'], name='service_ord_date_cr_4ea1cb_idx'), models.Index(fields=['service_order', 'date_created'], name='service_ord_service_973f31_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.11 on 2026-10-19 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_control', '0031_serviceorderphasehistory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='serviceorder',
+            index=models.Index(fields=['prova_date'], name='service_ord_prova_d_0b8d76_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceorder',
+            index=models.Index(fields=['retirada_date'], name='service_ord_retirad_49f77d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceorder',
+            index=models.Index(fields=['devolucao_date'], name='service_ord_devoluc_ab51ed_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.11 on 2026-10-19 01:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('service_control', '0032_service_order_agenda_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDimension',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True)),
+                ('date_updated', models.DateTimeField(blank=True, null=True)),
+                ('date_canceled', models.DateTimeField(blank=True, null=True)),
+                ('kind', models.CharField(choices=[('renter_role', 'Tipo de cliente'), ('came_from', 'Canal de origem'), ('service_type', 'Tipo de serviço'), ('payment_method', 'Forma de pagamento')], max_length=20)),
+                ('name', models.CharField(max_length=255)),
+            ],
+            options={
+                'db_table': 'order_dimensions',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='serviceorder',
+            index=models.Index(fields=['order_date'], name='service_ord_order_d_1447c4_idx'),
+        ),
+        migrations.AddField(
+            model_name='orderdimension',
+            name='canceled_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='canceled_%(class)s', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='orderdimension',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='created_%(class)s', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='orderdimension',
+            name='updated_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='updated_%(class)s', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='serviceorder',
+            name='came_from_dimension',
+            field=models.ForeignKey(blank=True, help_text='Valor canônico de came_from (preenchido ao salvar)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='service_control.orderdimension'),
+        ),
+        migrations.AddField(
+            model_name='serviceorder',
+            name='payment_method_dimension',
+            field=models.ForeignKey(blank=True, help_text='Valor canônico de payment_method (preenchido ao salvar)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='service_control.orderdimension'),
+        ),
+        migrations.AddField(
+            model_name='serviceorder',
+            name='renter_role_dimension',
+            field=models.ForeignKey(blank=True, help_text='Valor canônico de renter_role (preenchido ao salvar)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='service_control.orderdimension'),
+        ),
+        migrations.AddField(
+            model_name='serviceorder',
+            name='service_type_dimension',
+            field=models.ForeignKey(blank=True, help_text='Valor canônico de service_type (preenchido ao salvar)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='service_control.orderdimension'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderdimension',
+            constraint=models.UniqueConstraint(fields=('kind', 'name'), name='order_dimension_kind_name_unique'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+from django.db import migrations
+
+# OS por lote; cada lote é gravado com um UPDATE por valor distinto
+BATCH_SIZE = 2000
+
+COLUMNS = ("renter_role", "came_from", "service_type", "payment_method")
+
+
+def canonical(value):
+    """Mesma regra de service_control.dimensions.canonical"""
+    if value is None:
+        return None
+    value = " ".join(str(value).split()).upper()
+    return value or None
+
+
+def backfill_order_dimensions(apps, schema_editor):
+    """
+    Cria os valores canônicos das colunas de texto livre e aponta as OS
+    existentes para eles, em lotes por id. Sem transação única
+    (atomic = False): cada lote é gravado por conta própria e a migration
+    pode ser executada de novo depois de uma interrupção.
+    """
+    ServiceOrder = apps.get_model("service_control", "ServiceOrder")
+    OrderDimension = apps.get_model("service_control", "OrderDimension")
+
+    ids = {
+        (kind, name): pk
+        for pk, kind, name in OrderDimension.objects.values_list("id", "kind", "name")
+    }
+
+    def dimension_id(kind, value):
+        name = canonical(value)
+        if name is None:
+            return None
+        if (kind, name) not in ids:
+            ids[(kind, name)] = OrderDimension.objects.get_or_create(
+                kind=kind, name=name
+            )[0].id
+        return ids[(kind, name)]
+
+    last_id = 0
+    total = 0
+    while True:
+        batch = list(
+            ServiceOrder.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", *COLUMNS)[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        updates = {}
+        for order_id, *values in batch:
+            for column, value in zip(COLUMNS, values):
+                pk = dimension_id(column, value)
+                if pk is not None:
+                    updates.setdefault((column, pk), []).append(order_id)
+        for (column, pk), order_ids in updates.items():
+            ServiceOrder.objects.filter(id__in=order_ids).update(
+                **{f"{column}_dimension_id": pk}
+            )
+        total += len(batch)
+
+    if total:
+        print(f"Total: {total} OS com valores canônicos preenchidos")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("service_control", "0033_order_dimensions"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_order_dimensions, migrations.RunPython.noop, elidable=True
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-19 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_control', '0034_backfill_order_dimensions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='serviceorder',
+            index=models.Index(fields=['date_updated', 'id'], name='service_ord_date_up_1d1568_idx'),
+        ),
+    ]
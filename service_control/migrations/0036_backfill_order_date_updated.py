@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# OS por lote; cada lote é gravado com um único UPDATE
+BATCH_SIZE = 2000
+
+
+def backfill_date_updated(apps, schema_editor):
+    """
+    Preenche date_updated das OS que nunca foram carimbadas com a data de
+    criação (ou o momento da migration, sem ela), para que todas entrem no
+    cursor do feed de alterações. Em lotes por id, sem transação única
+    (atomic = False), como 0034.
+    """
+    ServiceOrder = apps.get_model("service_control", "ServiceOrder")
+    now = timezone.now()
+
+    last_id = 0
+    total = 0
+    while True:
+        ids = list(
+            ServiceOrder.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        total += ServiceOrder.objects.filter(
+            id__in=ids, date_updated__isnull=True
+        ).update(date_updated=Coalesce(F("date_created"), Value(now)))
+
+    if total:
+        print(f"Total: {total} OS com date_updated preenchido")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("service_control", "0035_serviceorder_changes_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_date_updated, migrations.RunPython.noop, elidable=True
+        ),
+    ]
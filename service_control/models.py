@@ -26,6 +26,50 @@ class RefusalReason(BaseModel):
         return self.name
 
 
+class OrderDimension(BaseModel):
+    """
+    Valores canônicos (maiúsculas, espaços normalizados) das colunas de texto
+    livre da OS usadas em filtros e agrupamentos do dashboard. Cada OS aponta
+    para o valor da sua coluna (ServiceOrder.<coluna>_dimension).
+    """
+
+    KIND_CHOICES = [
+        ("renter_role", "Tipo de cliente"),
+        ("came_from", "Canal de origem"),
+        ("service_type", "Tipo de serviço"),
+        ("payment_method", "Forma de pagamento"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        db_table = "order_dimensions"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "name"], name="order_dimension_kind_name_unique"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.name}"
+
+
+# Colunas de texto livre da OS com valor canônico em OrderDimension
+DIMENSION_COLUMNS = ("renter_role", "came_from", "service_type", "payment_method")
+
+
+def _dimension_field(column):
+    return models.ForeignKey(
+        OrderDimension,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text=f"Valor canônico de {column} (preenchido ao salvar)",
+    )
+
+
 class ServiceOrder(BaseModel):
     renter = models.ForeignKey(
         Person, on_delete=models.CASCADE, related_name="service_orders", null=True, blank=True
@@ -115,18 +159,87 @@ class ServiceOrder(BaseModel):
         default=False,
         help_text="OS virtual apenas para registro de pagamento",
     )
+    # Valores canônicos das colunas de texto livre (filtros e agrupamentos)
+    renter_role_dimension = _dimension_field("renter_role")
+    came_from_dimension = _dimension_field("came_from")
+    service_type_dimension = _dimension_field("service_type")
+    payment_method_dimension = _dimension_field("payment_method")
 
     class Meta:
         db_table = "service_orders"
+        indexes = [
+            # Agenda do dashboard (metrics.agenda_counts)
+            models.Index(fields=["prova_date"]),
+            models.Index(fields=["retirada_date"]),
+            models.Index(fields=["devolucao_date"]),
+            # Período do dashboard e das séries (metrics); os agrupamentos
+            # usam as FKs *_dimension, já indexadas
+            models.Index(fields=["order_date"]),
+            # Cursor do feed de alterações (changes.py)
+            models.Index(fields=["date_updated", "id"]),
+        ]
+
+    # Colunas que aparecem nas opções de filtro do dashboard
+    # (metrics.filter_facets); os valores lidos do banco ficam em
+    # `_loaded_facets` para detectar valores trocados no save
+    FACET_FIELDS = ("renter_role", "payment_method", "came_from", "employee_id")
 
     def __str__(self):
         return f"OS {self.id} - {self.renter.name}"
 
+    def facet_values(self):
+        return {
+            field: self.__dict__[field]
+            for field in self.FACET_FIELDS
+            if field in self.__dict__
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_facets = instance.facet_values()
+        # Data do pedido como está no banco, para invalidar o cache de
+        # períodos também do mês antigo quando ela mudar (signals)
+        instance._loaded_order_date = instance.__dict__.get("order_date")
+        # Fase como está no banco, para os contadores por fase (signals)
+        instance._loaded_phase_id = instance.__dict__.get("service_order_phase_id")
+        return instance
+
     def save(self, *args, **kwargs):
         # Calcula automaticamente o valor restante
         if self.total_value is not None and self.advance_payment is not None:
             self.remaining_payment = self.total_value - self.advance_payment
+        # BaseModel carimba as alterações; o feed (changes.py) também precisa
+        # do carimbo na criação
+        if self._state.adding:
+            self.date_updated = timezone.now()
+        kwargs["update_fields"] = self.canonicalize_dimensions(
+            kwargs.get("update_fields")
+        )
         super().save(*args, **kwargs)
+        self._loaded_order_date = self.order_date
+        self._loaded_phase_id = self.service_order_phase_id
+        self._loaded_facets = self.facet_values()
+
+    def canonicalize_dimensions(self, update_fields=None):
+        """
+        Aponta as colunas *_dimension para o valor canônico das colunas de
+        texto. Com update_fields, só as colunas salvas são tratadas (e as
+        *_dimension correspondentes entram na lista).
+        """
+        from . import dimensions
+
+        for column in DIMENSION_COLUMNS:
+            if update_fields is not None and column not in update_fields:
+                continue
+            setattr(
+                self,
+                f"{column}_dimension_id",
+                dimensions.dimension_id(column, getattr(self, column), create=True),
+            )
+            if update_fields is not None:
+                update_fields = [*update_fields, f"{column}_dimension"]
+        return update_fields
 
     def is_atrasada(self):
         today = timezone.now().date()
@@ -170,6 +283,44 @@ class ServiceOrder(BaseModel):
         return "outro"
 
 
+class ServiceOrderPhaseHistory(BaseModel):
+    """
+    Histórico de mudanças de fase da OS (somente inserção). Cada linha marca a
+    entrada da OS em `to_phase`; date_created é o instante da mudança e
+    created_by quem a aplicou.
+    """
+
+    service_order = models.ForeignKey(
+        ServiceOrder, related_name="phase_history", on_delete=models.CASCADE
+    )
+    from_phase = models.ForeignKey(
+        ServiceOrderPhase,
+        related_name="+",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    to_phase = models.ForeignKey(
+        ServiceOrderPhase,
+        related_name="+",
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    transition = models.CharField(
+        max_length=50, help_text="Nome da transição (state_machine) ou 'create'"
+    )
+
+    class Meta:
+        db_table = "service_order_phase_history"
+        indexes = [
+            models.Index(fields=["date_created"]),
+            models.Index(fields=["service_order", "date_created"]),
+        ]
+
+    def __str__(self):
+        return f"OS {self.service_order_id}: {self.from_phase_id} -> {self.to_phase_id}"
+
+
 class ServiceOrderItem(BaseModel):
     service_order = models.ForeignKey(
         ServiceOrder, related_name="items", on_delete=models.CASCADE
@@ -0,0 +1,154 @@
+"""
+Registro em memória das fases de ordem de serviço (nome <-> id)
+
+A tabela de fases é pequena e praticamente estática, então ela é carregada
+uma única vez por processo e invalidada pelos signals de ServiceOrderPhase.
+Uma fase não encontrada força no máximo uma recarga a cada
+RELOAD_INTERVAL segundos, o que cobre fases criadas por outros workers.
+
+Enquanto a transação que gravou uma fase está aberta, as consultas dessa
+thread leem a tabela sem guardar o resultado: se a transação for revertida
+o on_commit que recarregaria o registro é descartado, e o id de uma fase
+que nunca existiu ficaria no registro do processo.
+"""
+
+import threading
+import time
+
+from django.db import connection
+
+from .models import ServiceOrderPhase
+
+RELOAD_INTERVAL = 60
+
+_lock = threading.Lock()
+_ids_by_name = None
+_names_by_id = None
+_loaded_at = 0.0
+_local = threading.local()
+
+
+def _in_transaction():
+    # Os blocos atomic do TestCase não são transações da aplicação
+    return any(not block._from_testcase for block in connection.atomic_blocks)
+
+
+def _uncommitted():
+    """Se esta thread tem gravações na tabela de fases ainda não confirmadas"""
+    if not getattr(_local, "uncommitted", False):
+        return False
+    if _in_transaction():
+        return True
+    # A transação terminou (confirmada ou revertida)
+    _local.uncommitted = False
+    return False
+
+
+def _fetch():
+    ids_by_name = {}
+    names_by_id = {}
+    for pk, name in ServiceOrderPhase.objects.order_by("id").values_list("id", "name"):
+        ids_by_name.setdefault(name, []).append(pk)
+        names_by_id[pk] = name
+    return ids_by_name, names_by_id
+
+
+def _load():
+    global _ids_by_name, _names_by_id, _loaded_at
+
+    ids_by_name, names_by_id = _fetch()
+    if _uncommitted():
+        return ids_by_name, names_by_id
+
+    with _lock:
+        _ids_by_name = ids_by_name
+        _names_by_id = names_by_id
+        _loaded_at = time.monotonic()
+    return ids_by_name, names_by_id
+
+
+def _registry():
+    ids_by_name, names_by_id = _ids_by_name, _names_by_id
+    if ids_by_name is None or names_by_id is None or _uncommitted():
+        return _load()
+    return ids_by_name, names_by_id
+
+
+def _reload_on_miss():
+    """
+    Recarrega o registro se a última carga for mais antiga que o intervalo.
+    Retorna o registro recarregado ou None.
+    """
+    if _uncommitted() or time.monotonic() - _loaded_at < RELOAD_INTERVAL:
+        return None
+    return _load()
+
+
+def invalidate(**kwargs):
+    """Descarta o registro; a próxima consulta recarrega a tabela"""
+    global _ids_by_name, _names_by_id
+
+    with _lock:
+        _ids_by_name = None
+        _names_by_id = None
+    _local.uncommitted = _in_transaction()
+
+
+def phase_id(name, create=False, user=None):
+    """
+    Retorna o id da fase com o nome informado (o menor id, como `.first()`).
+    Com create=True a fase é criada caso não exista.
+    """
+    ids_by_name, _ = _registry()
+    ids = ids_by_name.get(name)
+    if ids is None:
+        reloaded = _reload_on_miss()
+        if reloaded:
+            ids = reloaded[0].get(name)
+    if ids:
+        return ids[0]
+    if not create:
+        return None
+
+    phase, _ = ServiceOrderPhase.objects.get_or_create(
+        name=name, defaults={"created_by": user}
+    )
+    invalidate()
+    return phase.id
+
+
+def phase_ids(*names):
+    """Ids de todas as fases com os nomes informados"""
+    ids_by_name, _ = _registry()
+    return [pk for name in names for pk in ids_by_name.get(name, ())]
+
+
+def phase_name(pk):
+    """Nome da fase pelo id, ou None"""
+    if pk is None:
+        return None
+    _, names_by_id = _registry()
+    name = names_by_id.get(pk)
+    if name is None:
+        reloaded = _reload_on_miss()
+        if reloaded:
+            name = reloaded[1].get(pk)
+    return name
+
+
+def search_phase_ids(term):
+    """
+    Ids das fases cujo nome contém o termo, sem diferenciar maiúsculas
+    (equivalente a `name__icontains`), em ordem de id
+    """
+    term = term.upper()
+    _, names_by_id = _registry()
+    return [pk for pk in sorted(names_by_id) if term in names_by_id[pk].upper()]
+
+
+def search_phase_id(term):
+    """
+    Equivalente a `ServiceOrderPhase.objects.filter(name__icontains=term).first()`
+    """
+    ids = search_phase_ids(term)
+    return ids[0] if ids else None
@@ -9,6 +9,7 @@ from products.serializers import (
 )
 
 from .models import (
+    DIMENSION_COLUMNS,
     Event,
     EventParticipant,
     RefusalReason,
@@ -53,7 +54,13 @@ class ServiceOrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ServiceOrder
-        fields = "__all__"
+        # Valores canônicos são internos (filtros e agrupamentos do dashboard)
+        exclude = [f"{column}_dimension" for column in DIMENSION_COLUMNS]
+        # Colunas usadas pelos campos calculados (?fields=, roupadegala.fieldsets)
+        sparse_sources = {
+            "event_date": ["event__event_date"],
+            "event_name": ["event__name"],
+        }
 
     @extend_schema_field(OpenApiTypes.DATE)
     def get_event_date(self, obj):
@@ -230,6 +237,45 @@ class ServiceOrderRefuseSerializer(serializers.Serializer):
     )
 
 
+class ServiceOrderBulkTransitionSerializer(serializers.Serializer):
+    """Serializer para mudar a fase de várias ordens de serviço de uma vez"""
+
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=500,
+        help_text="IDs das ordens de serviço",
+    )
+    target_phase = serializers.ChoiceField(
+        choices=[
+            "PENDENTE",
+            "AGUARDANDO_RETIRADA",
+            "AGUARDANDO_DEVOLUCAO",
+            "FINALIZADO",
+            "RECUSADA",
+        ],
+        help_text="Fase de destino",
+    )
+    justification_refusal = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Justificativa detalhada da recusa (opcional, apenas RECUSADA)",
+    )
+    justification_reason_id = serializers.IntegerField(
+        required=False,
+        help_text="ID do motivo de recusa (obrigatório para RECUSADA)",
+    )
+
+    def validate(self, attrs):
+        if attrs["target_phase"] == "RECUSADA" and not attrs.get(
+            "justification_reason_id"
+        ):
+            raise serializers.ValidationError(
+                {"justification_reason_id": "Motivo de recusa é obrigatório."}
+            )
+        return attrs
+
+
 class PaymentFormItemSerializer(serializers.Serializer):
     """Item de forma de pagamento"""
     amount = serializers.DecimalField(max_digits=10, decimal_places=2, help_text="Valor do pagamento")
@@ -596,6 +642,40 @@ class ServiceOrderFinanceSummarySerializer(serializers.Serializer):
     )
 
 
+class PhaseLeadTimeSerializer(serializers.Serializer):
+    fase = serializers.CharField(help_text="Nome da fase")
+    quantidade = serializers.IntegerField(help_text="Entradas na fase que já saíram dela")
+    em_aberto = serializers.IntegerField(help_text="Entradas na fase ainda sem saída")
+    media_horas = serializers.FloatField(allow_null=True, help_text="Permanência média (horas)")
+    p50_horas = serializers.FloatField(allow_null=True, help_text="Mediana da permanência (horas)")
+    p90_horas = serializers.FloatField(allow_null=True, help_text="Percentil 90 da permanência (horas)")
+    p95_horas = serializers.FloatField(allow_null=True, help_text="Percentil 95 da permanência (horas)")
+
+
+class ServiceOrderLeadTimeSerializer(serializers.Serializer):
+    data_inicio = serializers.DateField(help_text="Início do período (entradas na fase)")
+    data_fim = serializers.DateField(help_text="Fim do período (inclusive)")
+    fases = PhaseLeadTimeSerializer(many=True, help_text="Permanência por fase")
+
+
+class TimeseriesPointSerializer(serializers.Serializer):
+    periodo = serializers.DateField(help_text="Início do período (dia, semana ou mês)")
+    valor = serializers.FloatField(help_text="Valor da métrica no período")
+
+
+class ServiceOrderTimeseriesSerializer(serializers.Serializer):
+    bucket = serializers.ChoiceField(
+        choices=["day", "week", "month"], help_text="Agrupamento dos períodos"
+    )
+    metric = serializers.ChoiceField(
+        choices=["orders", "vendido", "recebido"], help_text="Métrica da série"
+    )
+    data_inicio = serializers.DateField(help_text="Início do período (data do pedido)")
+    data_fim = serializers.DateField(help_text="Fim do período (inclusive)")
+    total = serializers.FloatField(help_text="Soma da métrica no período")
+    serie = TimeseriesPointSerializer(many=True, help_text="Valores por período")
+
+
 # --- Eventos ---
 
 
@@ -0,0 +1,126 @@
+"""
+Signals do app service_control
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from accounts.models import Person
+from roupadegala import cache as response_cache
+
+from . import dimensions, metrics, phases
+from .models import OrderDimension, RefusalReason, ServiceOrder, ServiceOrderPhase
+
+# Enviado pela máquina de estados depois de cada UPDATE de fase, dentro da
+# transação. Argumentos: transition (nome), source e target (nomes das
+# fases), order_ids (lista), order_dates (datas de pedido das mesmas OS) e
+# user (quem aplicou; None para o sistema).
+post_transition = Signal()
+
+
+@receiver(post_save, sender=ServiceOrderPhase)
+@receiver(post_delete, sender=ServiceOrderPhase)
+def invalidate_phase_registry(sender, **kwargs):
+    phases.invalidate()
+    # Recarrega de novo após o commit para descartar o registro que outras
+    # threads carregaram antes da gravação. Uma transação revertida não
+    # chama o on_commit; por isso o registro não guarda o que é lido enquanto
+    # a transação que gravou está aberta (veja phases._uncommitted)
+    transaction.on_commit(phases.invalidate)
+
+
+@receiver(post_save, sender=OrderDimension)
+@receiver(post_delete, sender=OrderDimension)
+def invalidate_dimension_registry(sender, **kwargs):
+    dimensions.invalidate()
+    transaction.on_commit(dimensions.invalidate)
+
+
+@receiver(post_save, sender=RefusalReason)
+@receiver(post_delete, sender=RefusalReason)
+def invalidate_refusal_reasons(sender, **kwargs):
+    response_cache.bump("refusal_reasons")
+
+
+@receiver(post_save, sender=ServiceOrder)
+@receiver(post_delete, sender=ServiceOrder)
+def invalidate_order_periods(sender, instance, **kwargs):
+    # Resultados por período em cache do mês da OS (e do mês antigo, se a
+    # data do pedido mudou)
+    metrics.invalidate_months(
+        instance.order_date, getattr(instance, "_loaded_order_date", None)
+    )
+
+
+@receiver(post_save, sender=ServiceOrder)
+def adjust_saved_order_phase_count(sender, instance, created, **kwargs):
+    fields = instance.__dict__
+    if fields.get("is_virtual") or "service_order_phase_id" not in fields:
+        # OS virtual, ou fase não carregada (e portanto não gravada)
+        return
+    target = phases.phase_name(instance.service_order_phase_id)
+    if created:
+        source = None
+    else:
+        loaded = getattr(instance, "_loaded_phase_id", None)
+        if loaded is None:
+            transaction.on_commit(metrics.invalidate_phase_counts)
+            return
+        source = phases.phase_name(loaded)
+        if source == target and target != "AGUARDANDO_DEVOLUCAO":
+            return
+    # Só depois do commit: um incr de uma transação revertida não se desfaz
+    transaction.on_commit(lambda: metrics.adjust_phase_counts(source, target, 1))
+
+
+@receiver(post_delete, sender=ServiceOrder)
+def adjust_deleted_order_phase_count(sender, instance, **kwargs):
+    if instance.__dict__.get("is_virtual"):
+        return
+    source = phases.phase_name(instance.__dict__.get("service_order_phase_id"))
+    if source is None:
+        transaction.on_commit(metrics.invalidate_phase_counts)
+        return
+    transaction.on_commit(lambda: metrics.adjust_phase_counts(source, None, 1))
+
+
+@receiver(post_save, sender=ServiceOrder)
+def update_filter_facets(sender, instance, **kwargs):
+    metrics.add_order_facets(instance)
+    # Valores trocados podem ter sido os últimos com aquele texto
+    loaded = getattr(instance, "_loaded_facets", None) or {}
+    current = instance.facet_values()
+    metrics.remove_order_facets(
+        {
+            field: value
+            for field, value in loaded.items()
+            if current.get(field, value) != value
+        }
+    )
+
+
+@receiver(post_delete, sender=ServiceOrder)
+def remove_deleted_order_facets(sender, instance, **kwargs):
+    metrics.remove_order_facets(instance.facet_values())
+
+
+@receiver(post_save, sender=Person)
+def rename_filter_facet_attendant(sender, instance, created, **kwargs):
+    metrics.rename_facet_attendant(instance)
+    # Os rankings de atendentes do dashboard em cache trazem o nome
+    if not created and getattr(instance, "_loaded_name", None) != instance.name:
+        metrics.invalidate_employee_months(instance)
+
+
+@receiver(post_transition)
+def invalidate_transition_periods(sender, order_dates=(), **kwargs):
+    # Mudar de fase muda vendido/recebido (fases confirmadas/finalizada)
+    metrics.invalidate_months(*order_dates)
+
+
+@receiver(post_transition)
+def adjust_transition_phase_counts(sender, source, target, order_ids, **kwargs):
+    transaction.on_commit(
+        lambda: metrics.adjust_phase_counts(source, target, len(order_ids))
+    )
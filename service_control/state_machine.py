@@ -0,0 +1,441 @@
+"""
+Máquina de estados das fases de ordem de serviço
+
+Cada transição declara a fase de destino, as fases de origem aceitas, quem
+pode aplicá-la e as colunas preenchidas junto com a mudança de fase (datas
+de retirada, devolução, finalização, recusa e produção). A mesma tabela
+atende a mudança de uma OS e a mudança em lote: as OS são validadas em
+memória (registro de fases + ids de atendente/recepcionista) e gravadas com
+um único UPDATE por fase de origem. Cada mudança também é registrada em
+ServiceOrderPhaseHistory (um INSERT em lote por aplicação) e, depois de cada
+UPDATE, é enviado o signal `post_transition`, para rollups e caches.
+"""
+
+from datetime import date
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from accounts.authentication import permission_context
+
+from . import dimensions, metrics, phases
+from .models import DIMENSION_COLUMNS, ServiceOrder, ServiceOrderPhaseHistory
+from .signals import post_transition
+
+# Colunas carregadas para validar uma transição
+TRANSITION_FIELDS = (
+    "id",
+    "service_order_phase_id",
+    "employee_id",
+    "attendant_id",
+    "order_date",
+)
+
+# Valores dos carimbos de uma transição, calculados uma vez por aplicação
+_STAMPS = {
+    "now": lambda context: context["now"],
+    "today": lambda context: context["today"],
+    "user": lambda context: context["user_id"],
+}
+
+
+class TransitionError(Exception):
+    """Transição recusada para uma OS (fase de origem ou permissão)"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class Actor:
+    """
+    Quem aplica a transição: pessoa e papel vêm do contexto de permissão do
+    usuário (claims do token + cache), sem consultar Person.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.user_id = getattr(user, "id", None)
+
+    @cached_property
+    def context(self):
+        return permission_context(self.user) if self.user is not None else None
+
+    @cached_property
+    def person_id(self):
+        return self.context.person_id if self.context else None
+
+    @cached_property
+    def is_admin(self):
+        return bool(self.context and self.context.is_admin)
+
+
+class Transition:
+    """
+    Uma transição de fase.
+
+    sources: fases de origem aceitas (None na lista = OS sem fase); com
+        sources=None qualquer fase é aceita, exceto as de `excluded`.
+    permission: "responsavel" (administrador, atendente ou recepcionista da
+        OS), "triagem" (administrador, atendente da OS ou OS sem atendente)
+        ou None (transição do sistema, sem verificação).
+    stamps: coluna -> "now" | "today" | "user", gravadas junto com a fase.
+    phase_errors: mensagens específicas por fase atual, verificadas antes da
+        mensagem geral `phase_error` (que aceita o marcador {phase}).
+    """
+
+    def __init__(
+        self,
+        name,
+        target,
+        sources=None,
+        excluded=(),
+        permission="responsavel",
+        stamps=None,
+        phase_error="",
+        phase_errors=None,
+        permission_error="",
+    ):
+        self.name = name
+        self.target = target
+        self.sources = frozenset(sources) if sources is not None else None
+        self.excluded = frozenset(excluded)
+        self.permission = permission
+        self.stamps = dict(stamps or {})
+        self.phase_error = phase_error
+        self.phase_errors = dict(phase_errors or {})
+        self.permission_error = permission_error
+
+    def allows(self, phase_name):
+        if self.sources is None:
+            return phase_name not in self.excluded
+        return phase_name in self.sources
+
+    def permits(self, order, actor):
+        if self.permission is None or actor.is_admin:
+            return True
+        if self.permission == "triagem":
+            return order.employee_id is None or order.employee_id == actor.person_id
+        return actor.person_id is not None and actor.person_id in (
+            order.employee_id,
+            order.attendant_id,
+        )
+
+    def check(self, order, actor):
+        """Levanta TransitionError se a OS não pode fazer esta transição"""
+        current_phase = phases.phase_name(order.service_order_phase_id)
+        if current_phase in self.phase_errors:
+            raise TransitionError(self.phase_errors[current_phase])
+        if not self.allows(current_phase):
+            raise TransitionError(self.phase_error.format(phase=current_phase))
+        if not self.permits(order, actor):
+            raise TransitionError(self.permission_error, status_code=403)
+        return current_phase
+
+    def changes(self, user_id, extra=None):
+        """Colunas do UPDATE: carimbos da transição, auditoria e `extra`"""
+        now = timezone.now()
+        context = {"now": now, "today": date.today(), "user_id": user_id}
+        values = {field: _STAMPS[kind](context) for field, kind in self.stamps.items()}
+        values["date_updated"] = now
+        if user_id is not None:
+            values["updated_by_id"] = user_id
+        values.update(extra or {})
+        # Colunas de texto livre gravadas junto com a transição apontam para
+        # o valor canônico no mesmo UPDATE (como ServiceOrder.save())
+        for column in DIMENSION_COLUMNS:
+            if column in values:
+                values[f"{column}_dimension_id"] = dimensions.dimension_id(
+                    column, values[column], create=True
+                )
+        return values
+
+
+RESPONSIBLE_ERROR = (
+    "Apenas o atendente responsável, recepcionista ou um administrador pode {action}."
+)
+
+TRANSITIONS = {
+    transition.name: transition
+    for transition in [
+        Transition(
+            "start_production",
+            "EM_PRODUCAO",
+            excluded={
+                None,
+                "EM_PRODUCAO",
+                "AGUARDANDO_RETIRADA",
+                "AGUARDANDO_DEVOLUCAO",
+                "FINALIZADO",
+                "RECUSADA",
+            },
+            permission=None,
+            stamps={"production_date": "today"},
+            phase_error="OS não pode ir para produção na fase atual ({phase}).",
+        ),
+        Transition(
+            "mark_ready",
+            "AGUARDANDO_RETIRADA",
+            sources={"EM_PRODUCAO"},
+            phase_errors={None: "OS não possui fase definida."},
+            phase_error="OS deve estar na fase EM_PRODUCAO para ser marcada como pronta.",
+            permission_error=RESPONSIBLE_ERROR.format(
+                action="marcar uma OS como pronta"
+            ),
+        ),
+        Transition(
+            "mark_retrieved",
+            "AGUARDANDO_DEVOLUCAO",
+            sources={"EM_PRODUCAO", "AGUARDANDO_RETIRADA"},
+            stamps={"data_retirado": "now"},
+            phase_errors={
+                None: "OS não possui fase definida.",
+                "AGUARDANDO_DEVOLUCAO": "OS já está aguardando devolução.",
+                "FINALIZADO": "OS já está finalizada.",
+            },
+            phase_error="OS deve estar na fase EM_PRODUCAO ou AGUARDANDO_RETIRADA para ser marcada como retirada.",
+            permission_error=RESPONSIBLE_ERROR.format(
+                action="marcar uma OS como retirada"
+            ),
+        ),
+        Transition(
+            "mark_paid",
+            "FINALIZADO",
+            sources={"AGUARDANDO_DEVOLUCAO"},
+            stamps={"data_devolvido": "now", "data_finalizado": "today"},
+            phase_errors={
+                None: "OS não possui fase definida.",
+                "FINALIZADO": "OS já está finalizada.",
+            },
+            phase_error="OS deve estar na fase AGUARDANDO_DEVOLUCAO para ser marcada como paga.",
+            permission_error=RESPONSIBLE_ERROR.format(action="marcar uma OS como paga"),
+        ),
+        Transition(
+            "refuse",
+            "RECUSADA",
+            sources={None, "PENDENTE", "EM_PRODUCAO", "AGUARDANDO_RETIRADA"},
+            permission="triagem",
+            stamps={
+                "data_recusa": "today",
+                "date_canceled": "now",
+                "canceled_by_id": "user",
+            },
+            phase_error="OS não pode ser recusada na fase atual ({phase}). Apenas fases PENDENTE, EM_PRODUCAO, AGUARDANDO_RETIRADA ou OS sem fase definida podem ser recusadas.",
+            permission_error="Apenas o atendente responsável, um administrador, ou usuários autorizados para triagem podem recusar uma OS.",
+        ),
+        Transition(
+            "return_to_pending",
+            "PENDENTE",
+            excluded={None, "PENDENTE", "FINALIZADO"},
+            phase_errors={
+                None: "OS não possui fase definida.",
+                "PENDENTE": "OS já está na fase PENDENTE.",
+                "FINALIZADO": "OS finalizada não pode ser retornada para pendente.",
+            },
+            permission_error=RESPONSIBLE_ERROR.format(
+                action="retornar uma OS para pendente"
+            ),
+        ),
+        # OS com evento já realizado e que não foram retiradas
+        Transition(
+            "expire",
+            "RECUSADA",
+            sources={
+                "PENDENTE",
+                "EM_PRODUCAO",
+                "AGUARDANDO_RETIRADA",
+                "AGUARDANDO_DEVOLUCAO",
+                "FINALIZADO",
+            },
+            permission=None,
+            phase_error="OS não pode ser recusada automaticamente na fase atual ({phase}).",
+        ),
+    ]
+}
+
+# Transição usada para cada fase de destino na mudança em lote
+BY_TARGET = {
+    "AGUARDANDO_RETIRADA": "mark_ready",
+    "AGUARDANDO_DEVOLUCAO": "mark_retrieved",
+    "FINALIZADO": "mark_paid",
+    "RECUSADA": "refuse",
+    "PENDENTE": "return_to_pending",
+}
+
+
+class TransitionResult:
+    __slots__ = ("id", "success", "previous_phase", "error", "status_code")
+
+    def __init__(self, id, success, previous_phase=None, error=None, status_code=200):
+        self.id = id
+        self.success = success
+        self.previous_phase = previous_phase
+        self.error = error
+        self.status_code = status_code
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "success": self.success,
+            "previous_phase": self.previous_phase,
+            "error": self.error,
+        }
+
+
+def check(name, order, user=None, actor=None):
+    """
+    Valida a transição de uma OS sem gravar nada. Levanta TransitionError;
+    retorna o nome da fase atual.
+    """
+    return TRANSITIONS[name].check(order, actor or Actor(user))
+
+
+STALE_ERROR = "OS alterada por outra requisição. Tente novamente."
+
+
+def _discard_stale(orders, target_id, values, results):
+    """
+    OS que o UPDATE não alcançou mudaram de fase entre a leitura e a
+    gravação (sem trava, em outra requisição): o resultado delas vira falha
+    (409) e ficam fora do histórico e do signal. Retorna as gravadas.
+    """
+    written = set(
+        ServiceOrder.objects.filter(
+            id__in=[order.id for order in orders],
+            service_order_phase_id=target_id,
+            date_updated=values["date_updated"],
+        ).values_list("id", flat=True)
+    )
+    stale = {order.id for order in orders if order.id not in written}
+    for index, result in enumerate(results):
+        if result.id in stale and result.success:
+            results[index] = TransitionResult(
+                result.id, False, result.previous_phase, STALE_ERROR, 409
+            )
+    return [order for order in orders if order.id in written]
+
+
+def apply(name, orders, user=None, changes=None, actor=None):
+    """
+    Aplica a transição às OS (instâncias já carregadas, com ao menos
+    TRANSITION_FIELDS). As válidas são gravadas com um UPDATE por fase de
+    origem e as instâncias recebem os novos valores; OS que mudaram de fase
+    desde a leitura não são gravadas e voltam como falha (409). Retorna um
+    TransitionResult por OS, na ordem recebida.
+    """
+    transition = TRANSITIONS[name]
+    actor = actor or Actor(user)
+    results = []
+    by_source = {}
+    for order in orders:
+        try:
+            previous_phase = transition.check(order, actor)
+        except TransitionError as error:
+            results.append(
+                TransitionResult(
+                    order.id,
+                    False,
+                    phases.phase_name(order.service_order_phase_id),
+                    error.message,
+                    error.status_code,
+                )
+            )
+            continue
+        results.append(TransitionResult(order.id, True, previous_phase))
+        by_source.setdefault(order.service_order_phase_id, []).append(order)
+
+    if not by_source:
+        return results
+
+    target_id = phases.phase_id(transition.target, create=True, user=user)
+    values = transition.changes(actor.user_id, changes)
+    values["service_order_phase_id"] = target_id
+    history = []
+    with transaction.atomic(savepoint=False):
+        for source_id, source_orders in by_source.items():
+            ids = [order.id for order in source_orders]
+            updated = ServiceOrder.objects.filter(
+                id__in=ids, service_order_phase_id=source_id
+            ).update(**values)
+            if updated < len(ids):
+                source_orders = _discard_stale(
+                    source_orders, target_id, values, results
+                )
+                if not source_orders:
+                    continue
+                ids = [order.id for order in source_orders]
+            for order in source_orders:
+                for field, value in values.items():
+                    setattr(order, field, value)
+                history.append(
+                    ServiceOrderPhaseHistory(
+                        service_order_id=order.id,
+                        from_phase_id=source_id,
+                        to_phase_id=target_id,
+                        transition=transition.name,
+                        created_by_id=actor.user_id,
+                    )
+                )
+            post_transition.send(
+                sender=ServiceOrder,
+                transition=transition.name,
+                source=phases.phase_name(source_id),
+                target=transition.target,
+                order_ids=ids,
+                order_dates=[order.order_date for order in source_orders],
+                user=user,
+            )
+        ServiceOrderPhaseHistory.objects.bulk_create(history)
+        if history and values.keys() & ServiceOrder.FACET_FIELDS:
+            metrics.invalidate_facets()
+    return results
+
+
+def record_created(orders, user=None):
+    """Registra no histórico a fase inicial de OS recém-criadas"""
+    ServiceOrderPhaseHistory.objects.bulk_create(
+        [
+            ServiceOrderPhaseHistory(
+                service_order_id=order.id,
+                to_phase_id=order.service_order_phase_id,
+                transition="create",
+                created_by_id=getattr(user, "id", None),
+            )
+            for order in orders
+            if order.service_order_phase_id
+        ]
+    )
+
+
+def apply_to_ids(name, order_ids, user=None, changes=None, actor=None):
+    """
+    Carrega e trava (SELECT ... FOR UPDATE) as OS pelos ids e aplica a
+    transição. Ids inexistentes voltam como falha com status 404.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    with transaction.atomic(savepoint=False):
+        orders = (
+            ServiceOrder.objects.select_for_update()
+            .filter(id__in=order_ids)
+            .only(*TRANSITION_FIELDS)
+        )
+        found = {
+            result.id: result
+            for result in apply(name, list(orders), user, changes, actor)
+        }
+    return [
+        found.get(order_id)
+        or TransitionResult(
+            order_id, False, error="Ordem de serviço não encontrada", status_code=404
+        )
+        for order_id in order_ids
+    ]
+
+
+def apply_to_queryset(name, queryset, user=None, changes=None):
+    """Aplica uma transição do sistema às OS do queryset (trava as linhas)"""
+    with transaction.atomic(savepoint=False):
+        orders = list(queryset.select_for_update().only(*TRANSITION_FIELDS))
+        return apply(name, orders, user, changes)
@@ -0,0 +1,1723 @@
+"""
+Testes para os endpoints de ordens de serviço
+"""
+
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from accounts.models import Person, PersonsContacts
+from accounts.services import merge_persons
+from products.models import Product
+from roupadegala.testing import StoreFactory
+
+from . import changes, dimensions, listing, metrics, phases, state_machine
+from .models import (
+    OrderDimension,
+    ServiceOrder,
+    ServiceOrderItem,
+    ServiceOrderPhase,
+    ServiceOrderPhaseHistory,
+)
+from .serializers import ServiceOrderSerializer
+from .signals import post_transition
+
+
+class BulkTransitionTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.client = APIClient()
+        self.store = StoreFactory()
+        self.store.grow(orders=24)
+        self.url = reverse("api_service_order_bulk_transition")
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def phase_of(self, order):
+        order.refresh_from_db()
+        return phases.phase_name(order.service_order_phase_id)
+
+    def test_bulk_mark_ready(self):
+        """Teste: OS em produção vão para AGUARDANDO_RETIRADA; as demais falham"""
+        self.client.force_authenticate(self.store.admin.user)
+        ready = self.store.orders["EM_PRODUCAO"][:3]
+        pending = self.store.orders["PENDENTE"][0]
+
+        response = self.client.post(
+            self.url,
+            {
+                "order_ids": [o.id for o in ready] + [pending.id, 999999],
+                "target_phase": "AGUARDANDO_RETIRADA",
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["updated"], 3)
+        self.assertEqual(response.data["failed"], 2)
+        results = {r["id"]: r for r in response.data["results"]}
+        self.assertEqual(results[pending.id]["previous_phase"], "PENDENTE")
+        self.assertFalse(results[999999]["success"])
+        for order in ready:
+            self.assertTrue(results[order.id]["success"])
+            self.assertEqual(self.phase_of(order), "AGUARDANDO_RETIRADA")
+        self.assertEqual(self.phase_of(pending), "PENDENTE")
+
+    def test_bulk_mark_paid_stamps_dates(self):
+        """Teste: Marcar como paga em lote registra devolução e finalização"""
+        self.client.force_authenticate(self.store.admin.user)
+        orders = self.store.orders["AGUARDANDO_DEVOLUCAO"][:2]
+
+        response = self.client.post(
+            self.url,
+            {"order_ids": [o.id for o in orders], "target_phase": "FINALIZADO"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["updated"], 2)
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.data_finalizado, date.today())
+            self.assertIsNotNone(order.data_devolvido)
+            self.assertEqual(order.updated_by, self.store.admin.user)
+
+    def test_bulk_transition_checks_permission_per_order(self):
+        """Teste: Atendente só muda a fase das OS em que é responsável"""
+        attendant, other = self.store.attendants[:2]
+        self.client.force_authenticate(attendant.user)
+        orders = self.store.orders["EM_PRODUCAO"][:3]
+        own = [orders[0].id]
+        others = [o.id for o in orders[1:]]
+        ServiceOrder.objects.filter(id__in=own).update(employee=attendant)
+        ServiceOrder.objects.filter(id__in=others).update(employee=other)
+
+        response = self.client.post(
+            self.url,
+            {"order_ids": own + others, "target_phase": "AGUARDANDO_RETIRADA"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["updated"], len(own))
+        self.assertEqual(response.data["failed"], len(others))
+
+    def test_bulk_refuse_requires_reason(self):
+        """Teste: Recusa em lote exige motivo de recusa"""
+        self.client.force_authenticate(self.store.admin.user)
+
+        response = self.client.post(
+            self.url,
+            {
+                "order_ids": [self.store.orders["PENDENTE"][0].id],
+                "target_phase": "RECUSADA",
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StateMachineTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.store = StoreFactory()
+        self.store.grow(orders=12)
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def test_apply_sends_post_transition(self):
+        """Teste: Cada UPDATE de fase envia post_transition com as OS alteradas"""
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(kwargs)
+
+        post_transition.connect(receiver)
+        self.addCleanup(post_transition.disconnect, receiver)
+        orders = self.store.orders["EM_PRODUCAO"][:2]
+
+        results = state_machine.apply("mark_retrieved", orders, self.store.admin.user)
+
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]["source"], "EM_PRODUCAO")
+        self.assertEqual(received[0]["target"], "AGUARDANDO_DEVOLUCAO")
+        self.assertEqual(received[0]["order_ids"], [o.id for o in orders])
+        for order in orders:
+            order.refresh_from_db()
+            self.assertIsNotNone(order.data_retirado)
+
+    def test_apply_skips_orders_changed_concurrently(self):
+        """Teste: OS que mudou de fase depois de carregada falha sem histórico"""
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(kwargs)
+
+        post_transition.connect(receiver)
+        self.addCleanup(post_transition.disconnect, receiver)
+        stale, current = self.store.orders["EM_PRODUCAO"][:2]
+        # Outra requisição move a OS depois que esta foi carregada
+        ServiceOrder.objects.filter(id=stale.id).update(
+            service_order_phase_id=phases.phase_id("RECUSADA")
+        )
+        ServiceOrderPhaseHistory.objects.all().delete()
+
+        results = state_machine.apply(
+            "mark_ready", [stale, current], self.store.admin.user
+        )
+
+        self.assertEqual(
+            [(r.id, r.success, r.status_code) for r in results],
+            [(stale.id, False, 409), (current.id, True, 200)],
+        )
+        self.assertEqual(received[0]["order_ids"], [current.id])
+        self.assertEqual(
+            list(
+                ServiceOrderPhaseHistory.objects.values_list(
+                    "service_order_id", flat=True
+                )
+            ),
+            [current.id],
+        )
+        stale.refresh_from_db()
+        self.assertEqual(phases.phase_name(stale.service_order_phase_id), "RECUSADA")
+
+        received.clear()
+        ServiceOrder.objects.filter(id=current.id).update(
+            service_order_phase_id=phases.phase_id("FINALIZADO")
+        )
+        results = state_machine.apply("refuse", [current], self.store.admin.user)
+        self.assertFalse(results[0].success)
+        self.assertEqual(received, [])
+
+    def test_check_rejects_wrong_phase_and_permission(self):
+        """Teste: Fase de origem inválida é 400; usuário sem vínculo é 403"""
+        pending = self.store.orders["PENDENTE"][0]
+        with self.assertRaises(state_machine.TransitionError) as error:
+            state_machine.check("mark_paid", pending, self.store.admin.user)
+        self.assertEqual(error.exception.status_code, 400)
+
+        order = self.store.orders["EM_PRODUCAO"][0]
+        ServiceOrder.objects.filter(id=order.id).update(
+            employee=self.store.attendants[1], attendant=self.store.attendants[1]
+        )
+        order.refresh_from_db()
+        with self.assertRaises(state_machine.TransitionError) as error:
+            state_machine.check("mark_ready", order, self.store.attendants[0].user)
+        self.assertEqual(error.exception.status_code, 403)
+
+
+class PhaseHistoryTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.client = APIClient()
+        self.store = StoreFactory()
+        self.store.grow(orders=12)
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def test_transition_writes_history_in_one_insert(self):
+        """Teste: Uma transição em lote grava o histórico com um único INSERT"""
+        orders = self.store.orders["EM_PRODUCAO"][:3]
+        ServiceOrderPhaseHistory.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as ctx:
+            state_machine.apply("mark_ready", orders, self.store.admin.user)
+
+        inserts = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith("INSERT") and "phase_history" in q["sql"]
+        ]
+        self.assertEqual(len(inserts), 1)
+        history = ServiceOrderPhaseHistory.objects.order_by("service_order_id")
+        self.assertEqual(
+            [(h.service_order_id, h.transition) for h in history],
+            [(o.id, "mark_ready") for o in orders],
+        )
+        for row in history:
+            self.assertEqual(phases.phase_name(row.from_phase_id), "EM_PRODUCAO")
+            self.assertEqual(phases.phase_name(row.to_phase_id), "AGUARDANDO_RETIRADA")
+            self.assertEqual(row.created_by, self.store.admin.user)
+
+    def test_lead_times_report(self):
+        """Teste: Relatório calcula a permanência por fase a partir do histórico"""
+        ServiceOrderPhaseHistory.objects.all().delete()
+        order = self.store.orders["PENDENTE"][0]
+        state_machine.record_created([order], self.store.admin.user)
+        state_machine.apply("start_production", [order], self.store.admin.user)
+        entered = ServiceOrderPhaseHistory.objects.get(transition="create")
+        ServiceOrderPhaseHistory.objects.filter(id=entered.id).update(
+            date_created=entered.date_created - timedelta(hours=5)
+        )
+        self.client.force_authenticate(self.store.admin.user)
+
+        response = self.client.get(reverse("api_service_order_lead_times"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        fases = {f["fase"]: f for f in response.data["fases"]}
+        self.assertEqual(fases["PENDENTE"]["quantidade"], 1)
+        self.assertAlmostEqual(fases["PENDENTE"]["p50_horas"], 5.0, places=1)
+        self.assertEqual(fases["EM_PRODUCAO"]["quantidade"], 0)
+        self.assertEqual(fases["EM_PRODUCAO"]["em_aberto"], 1)
+
+    def test_lead_times_invalid_dates(self):
+        """Teste: Datas inválidas retornam 400"""
+        self.client.force_authenticate(self.store.admin.user)
+        response = self.client.get(
+            reverse("api_service_order_lead_times"), {"data_inicio": "2024-13-01"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PhaseRegistryTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.pending = ServiceOrderPhase.objects.create(name="PENDENTE")
+        self.finished = ServiceOrderPhase.objects.create(name="FINALIZADO")
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def test_loads_once(self):
+        """Teste: O registro é carregado numa consulta e reaproveitado"""
+        with self.assertNumQueries(1):
+            self.assertEqual(phases.phase_id("PENDENTE"), self.pending.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(phases.phase_name(self.finished.id), "FINALIZADO")
+            self.assertEqual(
+                phases.phase_ids("PENDENTE", "FINALIZADO"),
+                [self.pending.id, self.finished.id],
+            )
+            self.assertEqual(phases.search_phase_id("finali"), self.finished.id)
+
+    def test_save_and_delete_invalidate(self):
+        """Teste: Criar, renomear ou excluir uma fase atualiza o registro"""
+        self.assertIsNone(phases.phase_id("ATRASADO"))
+
+        late = ServiceOrderPhase.objects.create(name="ATRASADO")
+        self.assertEqual(phases.phase_id("ATRASADO"), late.id)
+
+        late.name = "VENCIDO"
+        late.save()
+        self.assertIsNone(phases.phase_id("ATRASADO"))
+        self.assertEqual(phases.phase_name(late.id), "VENCIDO")
+
+        pk = late.id
+        late.delete()
+        self.assertIsNone(phases.phase_name(pk))
+        self.assertIsNone(phases.phase_id("VENCIDO"))
+
+    def test_reloads_on_miss_after_interval(self):
+        """Teste: Fase criada em outro worker aparece após RELOAD_INTERVAL"""
+        self.assertIsNone(phases.phase_id("ATRASADO"))
+        # bulk_create não dispara os signals, como um INSERT de outro processo
+        ServiceOrderPhase.objects.bulk_create([ServiceOrderPhase(name="ATRASADO")])
+        created = ServiceOrderPhase.objects.get(name="ATRASADO")
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(phases.phase_id("ATRASADO"))
+        with mock.patch.object(phases, "_loaded_at", 0.0):
+            self.assertEqual(phases.phase_id("ATRASADO"), created.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(phases.phase_name(created.id), "ATRASADO")
+
+    def test_rolled_back_phase_not_cached(self):
+        """Teste: Fase criada numa transação revertida não fica no registro"""
+
+        class Rollback(Exception):
+            pass
+
+        with self.assertRaises(Rollback):
+            with transaction.atomic():
+                created = phases.phase_id("ATRASADO", create=True)
+                self.assertEqual(phases.phase_id("ATRASADO"), created)
+                raise Rollback
+
+        self.assertIsNone(phases.phase_id("ATRASADO"))
+        self.assertIsNone(phases.phase_name(created))
+        with self.assertNumQueries(0):
+            self.assertIsNone(phases.phase_id("ATRASADO"))
+
+
+class ConditionalListTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.client = APIClient()
+        self.store = StoreFactory()
+        self.store.grow(orders=12)
+        self.client.force_authenticate(self.store.admin.user)
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def assert_not_modified_until_change(self, url, change):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn("ETag", first)
+        self.assertIn("Last-Modified", first)
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second.content, b"")
+        self.assertEqual(second["ETag"], first["ETag"])
+        # Só a agregação do validador (e a verificação de OS vencidas)
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+
+        change()
+        third = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(third["ETag"], first["ETag"])
+
+    def test_phase_list_not_modified(self):
+        """Teste: Listagem por fase responde 304 até uma OS mudar de fase"""
+        order = self.store.orders["EM_PRODUCAO"][0]
+        url = reverse("api_service_order_by_phase", args=["EM_PRODUCAO"])
+
+        self.assert_not_modified_until_change(
+            url,
+            lambda: state_machine.apply("mark_ready", [order], self.store.admin.user),
+        )
+
+    def test_phase_list_v2_etag_depends_on_page(self):
+        """Teste: Cada página da V2 tem seu próprio ETag"""
+        url = reverse("api_service_order_by_phase_v2", args=["PENDENTE"])
+        page_1 = self.client.get(url, {"page_size": 1})
+        page_2 = self.client.get(url, {"page_size": 1, "page": 2})
+
+        self.assertNotEqual(page_1["ETag"], page_2["ETag"])
+        response = self.client.get(
+            url, {"page_size": 1, "page": 2}, HTTP_IF_NONE_MATCH=page_1["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_event_list_tracks_related_orders(self):
+        """Teste: Lista de eventos muda de ETag quando uma OS vinculada muda"""
+        order = ServiceOrder.objects.filter(event__isnull=False).first()
+        url = reverse("api_event_list_with_status")
+
+        self.assert_not_modified_until_change(
+            url,
+            lambda: ServiceOrder.objects.filter(id=order.id).update(
+                date_updated=timezone.now() + timedelta(seconds=1)
+            ),
+        )
+
+    def test_product_list_revalidates_after_update(self):
+        """Teste: Editar um produto muda o ETag da listagem de produtos"""
+        product = Product.objects.order_by("id").first()
+        url = reverse("api_product_list")
+
+        def change():
+            response = self.client.put(
+                reverse("api_product_update", args=[product.id]),
+                {"nome_produto": "PRODUTO EDITADO"},
+                format="json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assert_not_modified_until_change(url, change)
+
+    def test_client_list_revalidates_after_contact_edit(self):
+        """Teste: Editar um contato muda o ETag da listagem de clientes"""
+        contact = PersonsContacts.objects.filter(
+            person__person_type__type="CLIENTE"
+        ).first()
+        url = reverse("api_client_list")
+
+        def change():
+            contact.phone = "11999990000"
+            contact.save()
+
+        self.assert_not_modified_until_change(url, change)
+
+    def test_phase_list_revalidates_after_item_edit(self):
+        """Teste: Editar um item de OS muda o ETag da listagem por fase"""
+        item = ServiceOrderItem.objects.filter(
+            service_order__service_order_phase__name="PENDENTE"
+        ).first()
+        url = reverse("api_service_order_by_phase", args=["PENDENTE"])
+
+        def change():
+            item.adjustment_notes = "Ajuste editado"
+            item.save(update_fields=["adjustment_notes"])
+
+        self.assert_not_modified_until_change(url, change)
+
+    def test_phase_list_revalidates_after_item_delete(self):
+        """Teste: Excluir um item de OS muda o ETag da listagem por fase"""
+        item = ServiceOrderItem.objects.filter(
+            service_order__service_order_phase__name="PENDENTE"
+        ).first()
+        url = reverse("api_service_order_by_phase", args=["PENDENTE"])
+
+        self.assert_not_modified_until_change(url, item.delete)
+
+    def test_validator_does_not_join_relations(self):
+        """Teste: Cada relação do validador é agregada à parte, sem JOINs"""
+        url = reverse("api_service_order_by_phase", args=["PENDENTE"])
+        first = self.client.get(url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        validator = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if "service_order_items" in query["sql"]
+        ]
+        self.assertEqual(len(validator), 1)
+        # A agregação externa lê só as OS; as relações ficam nas subqueries
+        outer_from = validator[0].rsplit(" FROM ", 1)[1]
+        self.assertNotIn("JOIN", outer_from)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.client = APIClient()
+        self.store = StoreFactory()
+        self.store.grow(orders=12)
+        self.client.force_authenticate(self.store.admin.user)
+        self.url = reverse("api_service_order_list")
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def get(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params)
+        return response, ctx.captured_queries
+
+    def test_fields_prunes_response_and_queries(self):
+        """Teste: ?fields= devolve só os campos pedidos com uma query por página"""
+        response, queries = self.get(
+            {"fields": "id,order_date,renter.name,service_order_phase.name,event_name"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        order = response.data["results"][0]
+        self.assertEqual(
+            set(order),
+            {"id", "order_date", "renter", "service_order_phase", "event_name"},
+        )
+        self.assertEqual(set(order["renter"]), {"name"})
+        self.assertEqual(set(order["service_order_phase"]), {"name"})
+        # Contagem da paginação + a página, já com renter, fase e evento
+        self.assertEqual(len(queries), 2)
+        page_sql = queries[1]["sql"]
+        self.assertNotIn("observations", page_sql)
+        self.assertNotIn('"cpf"', page_sql)
+
+    def test_unexpanded_relations_are_ids(self):
+        """Teste: Relações fora de ?expand= vêm só com o id"""
+        order = ServiceOrder.objects.filter(items__isnull=False).first()
+
+        response, queries = self.get({"fields": "id,renter,items", "expand": ""})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = next(r for r in response.data["results"] if r["id"] == order.id)
+        self.assertEqual(row["renter"], order.renter_id)
+        self.assertEqual(
+            sorted(row["items"]), sorted(order.items.values_list("id", flat=True))
+        )
+        self.assertEqual(len(queries), 3)
+
+    def test_nested_many_relation(self):
+        """Teste: Campos de relações múltiplas aninhadas são prefetchados"""
+        response, queries = self.get(
+            {"fields": "id,renter.contacts.phone,items.product.nome_produto"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = response.data["results"][0]
+        self.assertEqual(set(row["renter"]["contacts"][0]), {"phone"})
+        # Contagem, página, contatos e itens (com o produto no mesmo JOIN)
+        self.assertEqual(len(queries), 4)
+
+    def test_unknown_field(self):
+        """Teste: Campo inexistente em ?fields= retorna 400"""
+        response, _ = self.get({"fields": "id,renter.apelido"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("renter.apelido", response.data["error"])
+
+    def test_full_list_constant_queries(self):
+        """Teste: Sem ?fields=, a listagem completa não faz N+1 por página"""
+        self.store.grow(orders=12)
+
+        _, small_page = self.get({"page_size": 2})
+        response, full_page = self.get({"page_size": 20})
+
+        self.assertEqual(len(response.data["results"]), 20)
+        self.assertEqual(len(full_page), len(small_page))
+        # Contagem, página, contatos de renter/employee/attendant e itens
+        self.assertEqual(len(full_page), 6)
+
+    def test_full_list_same_data(self):
+        """Teste: O plano de consulta não altera os dados da listagem"""
+        response, _ = self.get({"page_size": 20})
+
+        for row in response.data["results"]:
+            order = ServiceOrder.objects.get(id=row["id"])
+            self.assertEqual(row, ServiceOrderSerializer(order).data)
+
+
+class PhaseListStreamingTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.client = APIClient()
+        self.store = StoreFactory()
+        self.store.grow(orders=24)
+        self.client.force_authenticate(self.store.admin.user)
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def test_stream_matches_list(self):
+        """Teste: ?stream=1 devolve o mesmo JSON da listagem completa"""
+        for phase in ("PENDENTE", "AGUARDANDO_RETIRADA", "RECUSADA", "ATRASADO"):
+            url = reverse("api_service_order_by_phase", args=[phase])
+            expected = self.client.get(url)
+
+            response = self.client.get(url, {"stream": "1"})
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            body = b"".join(response.streaming_content)
+            self.assertEqual(body, expected.content)
+            self.assertIn("ETag", response)
+
+    def test_stream_queries_by_chunk(self):
+        """Teste: O streaming faz o prefetch por lote, não por OS"""
+        url = reverse("api_service_order_by_phase", args=["RECUSADA"])
+        self.client.get(url)  # recusa automática de OS vencidas
+
+        with mock.patch.object(listing, "STREAM_CHUNK_SIZE", 2):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, {"stream": "1"})
+                rows = json.loads(b"".join(response.streaming_content))
+
+        chunks = -(-len(rows) // 2)
+        self.assertGreater(chunks, 1)
+        # Recusa automática, validador e a query das OS (lida por lotes do
+        # cursor), mais contatos, endereços e itens a cada lote
+        self.assertEqual(len(ctx.captured_queries), 3 + 3 * chunks)
+
+
+class AgendaCountsTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.store = StoreFactory()
+        self.store.grow(orders=36)
+        self.today = date.today()
+        self.horizon = self.today + timedelta(days=10)
+        # Datas espalhadas em torno de hoje, com algumas OS marcadas em atraso
+        for index, order in enumerate(ServiceOrder.objects.order_by("id")):
+            offset = index % 15 - 3
+            ServiceOrder.objects.filter(id=order.id).update(
+                prova_date=self.today + timedelta(days=offset),
+                retirada_date=self.today + timedelta(days=offset + 1),
+                devolucao_date=(
+                    None if index % 4 == 0 else self.today + timedelta(days=offset - 2)
+                ),
+                esta_atrasada=index % 3 == 0,
+            )
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def expected(self):
+        """Contagem em Python com as mesmas regras de agenda_counts"""
+        active = set(phases.phase_ids(*metrics.AGENDA_ACTIVE_PHASES))
+        overdue = {phases.phase_id("RECUSADA"), phases.phase_id("ATRASADO")} - {None}
+        counts = {
+            bucket: dict.fromkeys(metrics.AGENDA_DATES, 0)
+            for bucket in ("em_atraso", "hoje", "proximos")
+        }
+        for order in ServiceOrder.objects.all():
+            for kind, column in metrics.AGENDA_DATES.items():
+                value = getattr(order, column)
+                if value is None:
+                    continue
+                if order.service_order_phase_id in overdue:
+                    counts["em_atraso"][kind] += 1
+                elif order.service_order_phase_id in active:
+                    if kind != "provas" and order.esta_atrasada and value < self.today:
+                        counts["em_atraso"][kind] += 1
+                    if value == self.today:
+                        counts["hoje"][kind] += 1
+                    elif self.today < value <= self.horizon:
+                        counts["proximos"][kind] += 1
+        return counts
+
+    def test_single_query(self):
+        """Teste: Todos os contadores da agenda saem de uma única query"""
+        phases.phase_ids("PENDENTE")  # carrega o registro de fases
+
+        with CaptureQueriesContext(connection) as ctx:
+            counts = metrics.agenda_counts(self.today, self.horizon)
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(counts, self.expected())
+        self.assertGreater(counts["hoje"]["provas"], 0)
+        self.assertGreater(counts["em_atraso"]["retiradas"], 0)
+
+    def test_dashboard_status(self):
+        """Teste: O dashboard usa os contadores da agenda"""
+        client = APIClient()
+        client.force_authenticate(self.store.admin.user)
+
+        response = client.get(reverse("api_service_order_dashboard"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = self.expected()
+        status_data = response.data["data"]["status"]
+        self.assertEqual(status_data["em_atraso"], expected["em_atraso"])
+        self.assertEqual(status_data["hoje"], expected["hoje"])
+        self.assertEqual(status_data["proximos_10_dias"], expected["proximos"])
+
+
+class FinancialRollupTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.store = StoreFactory()
+        self.store.grow(orders=36)
+        self.today = date.today()
+        self.week_start = self.today - timedelta(days=self.today.weekday())
+        self.month_start = self.today.replace(day=1)
+        start = min(self.week_start, self.month_start)
+        span = (self.today - start).days + 1
+        for index, order in enumerate(ServiceOrder.objects.order_by("id")):
+            ServiceOrder.objects.filter(id=order.id).update(
+                order_date=self.today - timedelta(days=index % (span + 3)),
+                total_value=None if index % 7 == 0 else Decimal("100.10") + index,
+                advance_payment=Decimal("30.05"),
+                remaining_payment=Decimal("70.05") + index,
+            )
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def legacy(self, start):
+        """Cálculo antigo (loop em Python) para um período"""
+        finished = phases.phase_id("FINALIZADO")
+        result = {"total_pedidos": 0.0, "total_recebido": 0.0, "numero_pedidos": 0}
+        orders = ServiceOrder.objects.filter(
+            order_date__gte=start,
+            order_date__lte=self.today,
+            service_order_phase_id__in=phases.phase_ids(*metrics.CONFIRMED_PHASES),
+        )
+        for order in orders:
+            if order.total_value:
+                result["total_pedidos"] += float(order.total_value)
+                result["numero_pedidos"] += 1
+            if order.advance_payment:
+                result["total_recebido"] += float(order.advance_payment)
+            if order.service_order_phase_id == finished and order.remaining_payment:
+                result["total_recebido"] += float(order.remaining_payment)
+        return result
+
+    def test_single_query_matches_legacy(self):
+        """Teste: Dia, semana e mês saem de uma query e batem com o cálculo antigo"""
+        phases.phase_ids("PENDENTE")  # carrega o registro de fases
+
+        with CaptureQueriesContext(connection) as ctx:
+            resultados, serie = metrics.financial_rollup(
+                self.today, self.week_start, self.month_start
+            )
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        periods = {
+            "dia": self.today,
+            "semana": self.week_start,
+            "mes": self.month_start,
+        }
+        for name, start in periods.items():
+            expected = self.legacy(start)
+            self.assertEqual(
+                resultados[name]["numero_pedidos"], expected["numero_pedidos"]
+            )
+            for key in ("total_pedidos", "total_recebido"):
+                self.assertAlmostEqual(resultados[name][key], expected[key], places=6)
+        self.assertGreater(resultados["mes"]["numero_pedidos"], 0)
+
+        self.assertEqual(serie[0]["data"], self.month_start)
+        self.assertEqual(serie[-1]["data"], self.today)
+        self.assertEqual(
+            sum(day["numero_pedidos"] for day in serie),
+            resultados["mes"]["numero_pedidos"],
+        )
+
+    def test_dashboard_granularity(self):
+        """Teste: ?granularity=day inclui a série diária; inválido retorna 400"""
+        client = APIClient()
+        client.force_authenticate(self.store.admin.user)
+        url = reverse("api_service_order_dashboard")
+
+        response = client.get(url, {"granularity": "day"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        serie = response.data["data"]["resultados_diarios"]
+        self.assertEqual(len(serie), (self.today - self.month_start).days + 1)
+
+        response = client.get(url)
+        self.assertNotIn("resultados_diarios", response.data["data"])
+
+        response = client.get(url, {"granularity": "hour"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TimeseriesTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        cache.clear()
+        phases.invalidate()
+        self.store = StoreFactory()
+        self.store.grow(orders=150)
+        self.today = date.today()
+        self.client = APIClient()
+        self.client.force_authenticate(self.store.admin.user)
+        self.url = reverse("api_service_order_timeseries")
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def expected(self, start, end, bucket, metric, employee_id=None):
+        """Série calculada em Python, OS por OS"""
+        confirmed = phases.phase_ids(*metrics.CONFIRMED_PHASES)
+        finished = phases.phase_id("FINALIZADO")
+        values = {}
+        orders = ServiceOrder.objects.filter(order_date__gte=start, order_date__lte=end)
+        if employee_id:
+            orders = orders.filter(employee_id=employee_id)
+        for order in orders:
+            key = metrics.bucket_start(order.order_date, bucket)
+            if metric == "orders":
+                value = 1
+            elif order.service_order_phase_id not in confirmed:
+                continue
+            elif metric == "vendido":
+                value = order.total_value or 0
+            else:
+                value = order.advance_payment or 0
+                if order.service_order_phase_id == finished:
+                    value += order.remaining_payment or 0
+            values[key] = values.get(key, 0) + value
+        return values
+
+    def test_series_match_orders(self):
+        """Teste: Séries por dia, semana e mês batem com o cálculo OS por OS"""
+        start = self.today - timedelta(days=100)
+        for bucket in metrics.TIMESERIES_BUCKETS:
+            for metric in metrics.TIMESERIES_METRICS:
+                serie = metrics.revenue_timeseries(start, self.today, bucket, metric)
+                expected = self.expected(start, self.today, bucket, metric)
+
+                self.assertEqual(
+                    serie[0]["periodo"], metrics.bucket_start(start, bucket)
+                )
+                periods = [point["periodo"] for point in serie]
+                self.assertEqual(periods, sorted(set(periods)))
+                self.assertTrue(set(expected) <= set(periods))
+                for point in serie:
+                    self.assertAlmostEqual(
+                        point["valor"],
+                        float(expected.get(point["periodo"], 0)),
+                        places=6,
+                        msg=f"{bucket}/{metric} {point['periodo']}",
+                    )
+
+        daily = metrics.revenue_timeseries(start, self.today, "day", "orders")
+        self.assertEqual(len(daily), 101)
+        self.assertIn(0, [point["valor"] for point in daily])
+
+    def test_single_query(self):
+        """Teste: A série sai de uma única query agrupada"""
+        phases.phase_ids("PENDENTE")  # carrega o registro de fases
+        start = self.today - timedelta(days=60)
+
+        with CaptureQueriesContext(connection) as ctx:
+            metrics.revenue_timeseries(start, self.today, "week", "recebido")
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_closed_period_cached_and_invalidated(self):
+        """Teste: Série de período encerrado vem do cache até uma OS passada mudar"""
+        phases.phase_ids("PENDENTE")
+        start = self.today - timedelta(days=60)
+        end = self.today - timedelta(days=1)
+        first = metrics.revenue_timeseries(start, end, "day", "orders")
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(
+                metrics.revenue_timeseries(start, end, "day", "orders"), first
+            )
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        order = ServiceOrder.objects.filter(order_date__lt=end).first()
+        order.order_date = end
+        order.save()
+        after = metrics.revenue_timeseries(start, end, "day", "orders")
+        self.assertEqual(after[-1]["valor"], first[-1]["valor"] + 1)
+
+        # A série que inclui hoje fica pouco tempo no cache
+        with mock.patch.object(metrics.cache, "set", wraps=metrics.cache.set) as spy:
+            metrics.revenue_timeseries(start, self.today, "day", "orders")
+        self.assertEqual(spy.call_args.args[2], metrics.PERIOD_CACHE_OPEN_TIMEOUT)
+
+    def test_transition_invalidates_closed_period(self):
+        """Teste: Mudança de fase de OS passada invalida as séries em cache"""
+        start = self.today - timedelta(days=120)
+        end = self.today - timedelta(days=1)
+        before = metrics.revenue_timeseries(start, end, "month", "vendido")
+
+        order = ServiceOrder.objects.filter(
+            order_date__lt=end,
+            service_order_phase_id=phases.phase_id("PENDENTE"),
+        ).first()
+        post_transition.send(
+            sender=ServiceOrder,
+            transition="test",
+            source="PENDENTE",
+            target="EM_PRODUCAO",
+            order_ids=[order.id],
+            order_dates=[order.order_date],
+            user=None,
+        )
+        ServiceOrder.objects.filter(id=order.id).update(
+            service_order_phase_id=phases.phase_id("EM_PRODUCAO")
+        )
+
+        after = metrics.revenue_timeseries(start, end, "month", "vendido")
+        self.assertAlmostEqual(
+            sum(point["valor"] for point in after),
+            sum(point["valor"] for point in before) + float(order.total_value),
+            places=6,
+        )
+
+    def test_endpoint(self):
+        """Teste: Endpoint devolve a série filtrada e valida os parâmetros"""
+        employee = self.store.attendants[0]
+        start = self.today - timedelta(days=30)
+        response = self.client.get(
+            self.url,
+            {
+                "bucket": "week",
+                "metric": "vendido",
+                "data_inicio": start.isoformat(),
+                "atendente_id": employee.id,
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["bucket"], "week")
+        expected = self.expected(start, self.today, "week", "vendido", employee.id)
+        self.assertAlmostEqual(
+            response.data["total"], float(sum(expected.values())), places=6
+        )
+        self.assertEqual(
+            response.data["serie"][0]["periodo"],
+            metrics.bucket_start(start, "week").isoformat(),
+        )
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["serie"]), 30)
+
+        for params in (
+            {"bucket": "hour"},
+            {"metric": "lucro"},
+            {"data_inicio": "2024-13-01"},
+            {"data_inicio": self.today.isoformat(), "data_fim": "2020-01-01"},
+            {"atendente_id": "abc"},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class DashboardPeriodCacheTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        self.store = StoreFactory()
+        self.store.grow(orders=150)
+        self.client = APIClient()
+        self.client.force_authenticate(self.store.admin.user)
+        self.url = reverse("api_service_order_dashboard")
+        today = date.today()
+        self.end = today.replace(day=1) - timedelta(days=1)
+        self.start = self.end.replace(day=1)
+        self.params = {
+            "data_inicio": self.start.isoformat(),
+            "data_fim": self.end.isoformat(),
+        }
+
+    def tearDown(self):
+        phases.invalidate()
+
+    def get(self, params=None):
+        response = self.client.get(self.url, params or self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["data"]
+
+    def period_order(self, phase):
+        return ServiceOrder.objects.filter(
+            order_date__gte=self.start,
+            order_date__lte=self.end,
+            service_order_phase_id=phases.phase_id(phase),
+        ).first()
+
+    def test_closed_period_served_from_cache(self):
+        """Teste: Período encerrado é calculado uma vez e não expira"""
+        with CaptureQueriesContext(connection) as cold:
+            first = self.get()
+        with mock.patch.object(
+            metrics.cache, "set", wraps=metrics.cache.set
+        ) as spy, CaptureQueriesContext(connection) as warm:
+            second = self.get()
+
+        self.assertLess(len(warm.captured_queries), len(cold.captured_queries))
+        self.assertEqual(first["kpis"], second["kpis"])
+        self.assertEqual(first["grafico_canal_origem"], second["grafico_canal_origem"])
+        self.assertFalse(
+            [call for call in spy.call_args_list if call.args[0].startswith("data:")]
+        )
+
+        with mock.patch.object(metrics.cache, "set", wraps=metrics.cache.set) as spy:
+            self.get({"data_inicio": self.start.isoformat()})
+        timeouts = [
+            call.args[2]
+            for call in spy.call_args_list
+            if call.args[0].startswith("data:dashboard")
+        ]
+        self.assertEqual(timeouts, [metrics.PERIOD_CACHE_OPEN_TIMEOUT])
+
+    def test_closed_period_timeout_depends_on_shared_cache(self):
+        """Teste: Período encerrado só fica sem expiração com cache compartilhado"""
+        timeouts = []
+        for shared in (True, False):
+            cache.clear()
+            with mock.patch.object(
+                metrics.response_cache, "is_shared", return_value=shared
+            ), mock.patch.object(metrics.cache, "set", wraps=metrics.cache.set) as spy:
+                self.get()
+            timeouts += [
+                call.args[2]
+                for call in spy.call_args_list
+                if call.args[0].startswith("data:dashboard")
+            ]
+
+        self.assertEqual(timeouts, [None, metrics.PERIOD_CACHE_CLOSED_TIMEOUT])
+
+    def test_merging_attendant_invalidates_period(self):
+        """Teste: Mesclar pessoas invalida os meses das OS movidas"""
+        duplicate = Person.objects.create(
+            name="ATENDENTE DUPLICADO", person_type=self.store.person_types["ATENDENTE"]
+        )
+        target = self.store.attendants[0]
+        moved = list(
+            ServiceOrder.objects.filter(
+                order_date__gte=self.start, order_date__lte=self.end
+            ).values_list("id", flat=True)[:3]
+        )
+        ServiceOrder.objects.filter(id__in=moved).update(employee=duplicate)
+        params = {**self.params, "atendente_id": target.id}
+        before = self.get(params)["kpis"]
+
+        merge_persons(duplicate, target)
+
+        after = self.get(params)["kpis"]
+        self.assertEqual(
+            after["total_atendimentos"], before["total_atendimentos"] + len(moved)
+        )
+
+    def test_renaming_attendant_invalidates_period(self):
+        """Teste: Renomear um atendente atualiza os rankings do período em cache"""
+        order = ServiceOrder.objects.filter(
+            order_date__gte=self.start, order_date__lte=self.end, employee__isnull=False
+        ).first()
+        self.get()
+        attendant = Person.objects.get(id=order.employee_id)
+
+        attendant.save()  # sem troca de nome o período continua em cache
+        with mock.patch.object(metrics.cache, "set", wraps=metrics.cache.set) as spy:
+            self.get()
+        self.assertFalse(
+            [call for call in spy.call_args_list if call.args[0].startswith("data:")]
+        )
+
+        attendant.name = "ATENDENTE RENOMEADO"
+        attendant.save()
+
+        ranking = self.get()["atendentes_taxa_conversao"]
+        names = {row["id"]: row["nome"] for row in ranking}
+        self.assertEqual(names[attendant.id], "ATENDENTE RENOMEADO")
+
+    def test_editing_past_order_invalidates_period(self):
+        """Teste: Editar OS com data de pedido no período invalida o cache"""
+        before = self.get()["kpis"]
+        order = self.period_order("FINALIZADO")
+        order.total_value += Decimal("100.00")
+        order.save()
+
+        after = self.get()["kpis"]
+        self.assertAlmostEqual(
+            after["total_vendido"], before["total_vendido"] + 100, places=2
+        )
+
+    def test_moving_order_out_of_period_invalidates_it(self):
+        """Teste: Mudar a data do pedido invalida também o mês antigo"""
+        before = self.get()["kpis"]
+        order = self.period_order("EM_PRODUCAO")
+        order.order_date = date.today()
+        order.save()
+
+        after = self.get()["kpis"]
+        self.assertEqual(after["total_atendimentos"], before["total_atendimentos"] - 1)
+
+    def test_transition_invalidates_period(self):
+        """Teste: Mudança de fase de OS do período invalida o cache"""
+        before = self.get()["kpis"]
+        order = self.period_order("EM_PRODUCAO")
+        results = state_machine.apply_to_ids(
+            "refuse", [order.id], self.store.admin.user
+        )
+        self.assertTrue(results[0].success, results[0].error)
+
+        after = self.get()["kpis"]
+        self.assertEqual(
+            after["atendimentos_nao_fechados"],
+            before["atendimentos_nao_fechados"] + 1,
+        )
+
+
+class FilterFacetsTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        cache.clear()
+        self.store = StoreFactory()
+        self.store.grow(orders=60)
+
+    def legacy(self):
+        """Opções montadas como antes: uma consulta por atendente e coluna"""
+        atendentes = []
+        employee_ids = (
+            ServiceOrder.objects.exclude(employee__isnull=True)
+            .values_list("employee_id", flat=True)
+            .distinct()
+        )
+        for employee_id in employee_ids:
+            person = Person.objects.get(id=employee_id)
+            atendentes.append({"id": person.id, "nome": person.name})
+        result = {"atendentes": sorted(atendentes, key=lambda a: (a["nome"], a["id"]))}
+        for key, column in metrics.FACET_COLUMNS.items():
+            values = ServiceOrder.objects.values_list(column, flat=True)
+            result[key] = sorted({value.upper() for value in values if value})
+        return result
+
+    def test_facets_match_legacy_and_are_cached(self):
+        """Teste: Opções batem com a consulta antiga e vêm do cache"""
+        with CaptureQueriesContext(connection) as cold:
+            facets = metrics.filter_facets()
+        self.assertEqual(len(cold.captured_queries), 2)
+        self.assertEqual(facets, self.legacy())
+        self.assertTrue(facets["canais_origem"])
+
+        with CaptureQueriesContext(connection) as warm:
+            self.assertEqual(metrics.filter_facets(), facets)
+        self.assertEqual(len(warm.captured_queries), 0)
+
+    def test_saved_order_adds_new_values(self):
+        """Teste: OS salva com valores novos atualiza as opções em cache"""
+        metrics.filter_facets()
+        order = ServiceOrder.objects.first()
+        order.came_from = "Panfleto"
+        order.payment_method = "cheque"
+        order.employee = self.store.receptionist
+        order.save()
+
+        with CaptureQueriesContext(connection) as ctx:
+            facets = metrics.filter_facets()
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertIn("PANFLETO", facets["canais_origem"])
+        self.assertIn("CHEQUE", facets["formas_pagamento"])
+        self.assertIn(
+            {"id": self.store.receptionist.id, "nome": self.store.receptionist.name},
+            facets["atendentes"],
+        )
+        self.assertEqual(facets["canais_origem"], sorted(facets["canais_origem"]))
+
+    def test_edited_or_deleted_order_removes_vanished_values(self):
+        """Teste: Valor que nenhuma OS usa mais sai das opções em cache"""
+        order = ServiceOrder.objects.exclude(employee=None).first()
+        order.came_from = "Panfleto"
+        order.save()
+        order.employee = self.store.receptionist
+        order.save()
+        metrics.filter_facets()
+
+        order = ServiceOrder.objects.get(id=order.id)
+        order.came_from = "Indicação"
+        order.save()
+        facets = metrics.filter_facets()
+        self.assertNotIn("PANFLETO", facets["canais_origem"])
+        self.assertIn("INDICAÇÃO", facets["canais_origem"])
+
+        order.delete()
+        with CaptureQueriesContext(connection) as ctx:
+            facets = metrics.filter_facets()
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(facets, self.legacy())
+        self.assertNotIn(
+            self.store.receptionist.id, [a["id"] for a in facets["atendentes"]]
+        )
+
+    def test_merged_attendant_leaves_facets(self):
+        """Teste: Atendente mesclado em outra pessoa sai das opções"""
+        attendant = ServiceOrder.objects.exclude(employee=None).first().employee
+        duplicate = Person.objects.create(
+            name="ATENDENTE DUPLICADO", person_type=attendant.person_type
+        )
+        ServiceOrder.objects.filter(employee=attendant).update(employee=duplicate)
+        metrics.filter_facets()
+
+        merge_persons(duplicate, attendant)
+
+        facets = metrics.filter_facets()
+        self.assertEqual(facets, self.legacy())
+        self.assertNotIn(duplicate.id, [a["id"] for a in facets["atendentes"]])
+
+    def test_transition_with_payment_method_refreshes_facets(self):
+        """Teste: Forma de pagamento gravada por transição entra nas opções"""
+        metrics.filter_facets()
+        order = ServiceOrder.objects.filter(
+            service_order_phase__name="AGUARDANDO_RETIRADA"
+        ).first()
+
+        state_machine.apply(
+            "mark_retrieved",
+            [order],
+            self.store.admin.user,
+            changes={"payment_method": "Cheque"},
+        )
+
+        self.assertIn("CHEQUE", metrics.filter_facets()["formas_pagamento"])
+
+    def test_renamed_attendant(self):
+        """Teste: Renomear um atendente atualiza o nome nas opções"""
+        metrics.filter_facets()
+        attendant = ServiceOrder.objects.exclude(employee=None).first().employee
+        attendant.name = "AAA PRIMEIRO"
+        attendant.save()
+
+        facets = metrics.filter_facets()
+        self.assertEqual(
+            facets["atendentes"][0], {"id": attendant.id, "nome": "AAA PRIMEIRO"}
+        )
+
+    def test_dashboard_uses_cached_facets(self):
+        """Teste: Dashboard devolve as opções do cache"""
+        client = APIClient()
+        client.force_authenticate(self.store.admin.user)
+        facets = metrics.filter_facets()
+
+        response = client.get(reverse("api_service_order_dashboard"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["filtros_disponiveis"], facets)
+
+
+class OrderDimensionTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        phases.invalidate()
+        dimensions.invalidate()
+        self.store = StoreFactory()
+        self.store.grow(orders=80)
+        self.client = APIClient()
+        self.client.force_authenticate(self.store.admin.user)
+        self.url = reverse("api_service_order_dashboard")
+        self.params = {
+            "data_inicio": (date.today() - timedelta(days=120)).isoformat(),
+            "data_fim": date.today().isoformat(),
+        }
+
+    def tearDown(self):
+        phases.invalidate()
+        dimensions.invalidate()
+
+    def dashboard(self, **params):
+        response = self.client.get(self.url, {**self.params, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["data"]
+
+    def test_save_canonicalizes_text_columns(self):
+        """Teste: Salvar a OS aponta as colunas de texto para o valor canônico"""
+        order = ServiceOrder.objects.first()
+        order.came_from = "  insta   gram "
+        order.renter_role = ""
+        order.save()
+        order.refresh_from_db()
+
+        self.assertEqual(order.came_from, "  insta   gram ")
+        self.assertEqual(order.came_from_dimension.name, "INSTA GRAM")
+        self.assertIsNone(order.renter_role_dimension_id)
+
+        other = ServiceOrder.objects.exclude(id=order.id).first()
+        other.came_from = "Insta Gram"
+        other.save(update_fields=["came_from"])
+        other.refresh_from_db()
+        self.assertEqual(other.came_from_dimension_id, order.came_from_dimension_id)
+        self.assertEqual(
+            OrderDimension.objects.filter(kind="came_from", name="INSTA GRAM").count(),
+            1,
+        )
+
+    def test_transition_changes_canonicalize_text_columns(self):
+        """Teste: Colunas de texto gravadas por uma transição apontam o canônico"""
+        order = ServiceOrder.objects.filter(
+            service_order_phase__name="AGUARDANDO_RETIRADA"
+        ).first()
+
+        state_machine.apply(
+            "mark_retrieved",
+            [order],
+            self.store.admin.user,
+            changes={"payment_method": " pix,  dinheiro "},
+        )
+        order.refresh_from_db()
+
+        self.assertEqual(order.payment_method, " pix,  dinheiro ")
+        self.assertEqual(order.payment_method_dimension.name, "PIX, DINHEIRO")
+
+    def test_search_reloads_values_created_by_other_workers(self):
+        """Teste: Busca por valor criado em outro worker recarrega o registro"""
+        self.assertEqual(dimensions.search_dimension_ids("came_from", "tiktok"), [])
+        # bulk_create não dispara os signals, como um INSERT de outro processo
+        OrderDimension.objects.bulk_create(
+            [OrderDimension(kind="came_from", name="TIKTOK")]
+        )
+        created = OrderDimension.objects.get(kind="came_from", name="TIKTOK")
+
+        self.assertEqual(dimensions.search_dimension_ids("came_from", "tiktok"), [])
+        with mock.patch.object(dimensions, "_loaded_at", 0.0):
+            found = dimensions.search_dimension_ids("came_from", "tiktok")
+        self.assertEqual(found, [created.id])
+
+    def test_rolled_back_value_not_cached(self):
+        """Teste: Valor criado numa transação revertida não fica no registro"""
+
+        class Rollback(Exception):
+            pass
+
+        with self.assertRaises(Rollback):
+            with transaction.atomic():
+                created = dimensions.dimension_id("came_from", "tiktok", create=True)
+                found = dimensions.dimension_id("came_from", "TikTok")
+                self.assertEqual(found, created)
+                raise Rollback
+
+        self.assertIsNone(dimensions.dimension_id("came_from", "tiktok"))
+        self.assertIsNone(dimensions.dimension_name(created))
+        with self.assertNumQueries(0):
+            self.assertIsNone(dimensions.dimension_id("came_from", "tiktok"))
+
+    def test_filters_match_case_insensitive_text(self):
+        """Teste: Filtros por texto equivalem ao iexact/icontains antigos"""
+        order = ServiceOrder.objects.exclude(renter_role=None).first()
+        role = order.renter_role.lower()
+        expected = ServiceOrder.objects.filter(
+            order_date__gte=self.params["data_inicio"],
+            renter_role__iexact=role,
+        ).count()
+
+        data = self.dashboard(tipo_cliente=role)
+        self.assertEqual(data["kpis"]["total_atendimentos"], expected)
+
+        method = order.payment_method[:3].lower()
+        expected = ServiceOrder.objects.filter(
+            order_date__gte=self.params["data_inicio"],
+            payment_method__icontains=method,
+        ).count()
+        data = self.dashboard(forma_pagamento=method)
+        self.assertEqual(data["kpis"]["total_atendimentos"], expected)
+
+        data = self.dashboard(canal_origem="canal que não existe")
+        self.assertEqual(data["kpis"]["total_atendimentos"], 0)
+
+    def test_charts_match_python_grouping(self):
+        """Teste: Gráficos agrupados no banco batem com o agrupamento em Python"""
+        data = self.dashboard()
+        confirmed = set(phases.phase_ids(*metrics.CONFIRMED_PHASES))
+        orders = ServiceOrder.objects.filter(order_date__gte=self.params["data_inicio"])
+
+        canais = {}
+        tipos = {}
+        for order in orders:
+            canal = canais.setdefault(
+                (order.came_from or "").upper() or "NÃO INFORMADO", [0, 0]
+            )
+            tipo = tipos.setdefault(
+                (order.renter_role or "").upper() or "NÃO INFORMADO", [0, Decimal(0)]
+            )
+            canal[0] += 1
+            if order.service_order_phase_id in confirmed:
+                canal[1] += 1
+                tipo[0] += 1
+                tipo[1] += order.total_value or 0
+
+        self.assertEqual(
+            {
+                row["canal"]: [row["atendimentos"], row["atendimentos_fechados"]]
+                for row in data["grafico_canal_origem"]
+            },
+            canais,
+        )
+        self.assertEqual(
+            {
+                row["tipo"]: [row["atendimentos_fechados"], row["total_vendido"]]
+                for row in data["grafico_tipo_cliente"]
+            },
+            {key: [count, float(total)] for key, (count, total) in tipos.items()},
+        )
+        counts = [row["atendimentos"] for row in data["grafico_canal_origem"]]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+    def test_backfill_migration(self):
+        """Teste: Migration de backfill preenche as OS existentes em lotes"""
+        from importlib import import_module
+
+        from django.apps import apps
+
+        migration = import_module(
+            "service_control.migrations.0034_backfill_order_dimensions"
+        )
+        expected = dict(
+            ServiceOrder.objects.values_list("id", "came_from_dimension__name")
+        )
+        ServiceOrder.objects.update(
+            came_from_dimension=None,
+            renter_role_dimension=None,
+            service_type_dimension=None,
+            payment_method_dimension=None,
+        )
+
+        with mock.patch.object(migration, "BATCH_SIZE", 7), mock.patch(
+            "builtins.print"
+        ):
+            migration.backfill_order_dimensions(apps, None)
+
+        self.assertEqual(
+            dict(ServiceOrder.objects.values_list("id", "came_from_dimension__name")),
+            expected,
+        )
+        self.assertFalse(
+            ServiceOrder.objects.exclude(service_type=None)
+            .filter(service_type_dimension=None)
+            .exists()
+        )
+
+
+class BoardTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        self.client = APIClient()
+        self.store = StoreFactory()
+        self.store.grow(orders=60)
+        self.client.force_authenticate(self.store.admin.user)
+        self.url = reverse("api_service_order_board")
+
+    def _newest(self, rows):
+        """Ordem do quadro: data do pedido mais recente primeiro, depois id"""
+        rows = sorted(rows, key=lambda row: row["id"], reverse=True)
+        return sorted(
+            rows,
+            key=lambda row: (row["order_date"] is not None, row["order_date"] or ""),
+            reverse=True,
+        )
+
+    def test_board_matches_phase_lists(self):
+        """Teste: Cada coluna traz o total e as primeiras OS da listagem por fase"""
+        expected = {}
+        for phase in listing.BOARD_PHASES:
+            url = reverse("api_service_order_by_phase", args=[phase])
+            expected[phase] = self._newest(self.client.get(url).json())
+
+        response = self.client.get(self.url, {"limit": 3})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["limit"], 3)
+        self.assertEqual(
+            [column["phase"] for column in data["phases"]], list(listing.BOARD_PHASES)
+        )
+        for column in data["phases"]:
+            rows = expected[column["phase"]]
+            self.assertEqual(column["count"], len(rows), column["phase"])
+            self.assertEqual(column["results"], rows[:3], column["phase"])
+        self.assertTrue(any(column["count"] > 3 for column in data["phases"]))
+
+    def test_board_queries_do_not_grow_with_limit(self):
+        """Teste: O quadro usa o mesmo número de queries para qualquer limit"""
+        self.client.get(self.url)  # recusa automática de OS vencidas
+
+        counts = []
+        for limit in (1, 50):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(self.url, {"limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+        # Recusa automática, a query do quadro, contatos, endereços e itens
+        self.assertEqual(counts[0], 5)
+
+    def test_board_invalid_limit(self):
+        """Teste: limit fora do intervalo é rejeitado"""
+        for limit in ("0", "abc", "101"):
+            response = self.client.get(self.url, {"limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PhaseCountsTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        self.client = APIClient()
+        self.store = StoreFactory()
+        self.store.grow(orders=60)
+        self.client.force_authenticate(self.store.admin.user)
+        self.today = date.today()
+
+    def test_counts_match_phase_lists(self):
+        """Teste: Os contadores batem com o tamanho de cada listagem por fase"""
+        expected = {}
+        for phase in listing.BOARD_PHASES:
+            url = reverse("api_service_order_by_phase", args=[phase])
+            expected[phase] = len(self.client.get(url).json())
+        self.assertGreater(expected["ATRASADO"], 0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("api_service_order_phase_counts"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["counts"], expected)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_transitions_adjust_cached_counts(self):
+        """Teste: Mudanças de fase ajustam os contadores em cache sem recalcular"""
+        metrics.phase_counts(self.today)
+        orders = self.store.orders["EM_PRODUCAO"][:2]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            state_machine.apply("mark_ready", orders, self.store.admin.user)
+        with self.assertNumQueries(0):
+            counts = metrics.phase_counts(self.today)
+
+        self.assertEqual(counts, metrics._count_phases(self.today))
+
+    def test_saved_orders_adjust_cached_counts(self):
+        """Teste: OS criadas ou com a fase alterada por save() ajustam os contadores"""
+        metrics.phase_counts(self.today)
+        pending = ServiceOrder.objects.get(id=self.store.orders["PENDENTE"][0].id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pending.service_order_phase_id = phases.phase_id("FINALIZADO")
+            pending.save()
+            pending.pk = None
+            pending.save()
+        with self.assertNumQueries(0):
+            counts = metrics.phase_counts(self.today)
+
+        self.assertEqual(counts, metrics._count_phases(self.today))
+
+    def test_return_phase_changes_recount(self):
+        """Teste: Mudanças envolvendo AGUARDANDO_DEVOLUCAO recalculam (ATRASADO)"""
+        metrics.phase_counts(self.today)
+        orders = self.store.orders["AGUARDANDO_DEVOLUCAO"][:2]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            state_machine.apply("mark_paid", orders, self.store.admin.user)
+        with self.assertNumQueries(1):
+            counts = metrics.phase_counts(self.today)
+
+        self.assertEqual(counts, metrics._count_phases(self.today))
+
+    def test_rolled_back_transition_keeps_counts(self):
+        """Teste: Sem commit, os contadores em cache não mudam"""
+        before = metrics.phase_counts(self.today)
+
+        orders = self.store.orders["EM_PRODUCAO"][:1]
+
+        with self.captureOnCommitCallbacks(execute=False):
+            state_machine.apply("mark_ready", orders, self.store.admin.user)
+
+        self.assertEqual(metrics.phase_counts(self.today), before)
+
+
+@mock.patch.object(changes, "SETTLE_SECONDS", 0)
+class ChangesFeedTests(TestCase):
+    def setUp(self):
+        """Configuração inicial para os testes"""
+        self.client = APIClient()
+        self.store = StoreFactory()
+        self.store.grow(orders=30)
+        self.client.force_authenticate(self.store.admin.user)
+        self.url = reverse("api_service_order_changes")
+
+    def _read_all(self, since=None, limit=7):
+        """Percorre o feed página a página; retorna (entradas, último cursor)"""
+        entries = []
+        while True:
+            params = {"limit": limit, **({"since": since} if since else {})}
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            entries.extend(data["results"])
+            since = data["cursor"]
+            if not data["has_more"]:
+                return entries, since
+
+    def test_feed_pages_through_all_orders(self):
+        """Teste: Sem cursor vêm todas as OS, uma vez, no formato do detalhe"""
+        entries, _ = self._read_all()
+
+        ids = [entry["id"] for entry in entries]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(
+            set(ids),
+            set(
+                ServiceOrder.objects.filter(is_virtual=False).values_list(
+                    "id", flat=True
+                )
+            ),
+        )
+        refused = set(phases.phase_ids("RECUSADA"))
+        for entry in entries[:10]:
+            order = ServiceOrder.objects.get(id=entry["id"])
+            tombstone = order.service_order_phase_id in refused
+            self.assertEqual(entry["tombstone"], tombstone)
+            if not entry["tombstone"]:
+                detail = self.client.get(
+                    reverse("api_service_order_detail", args=[entry["id"]])
+                )
+                self.assertEqual(entry["order"], detail.json())
+        self.assertTrue(any(entry["tombstone"] for entry in entries))
+
+    def test_feed_queries_do_not_grow_with_limit(self):
+        """Teste: Uma página do feed usa as mesmas queries para qualquer limit"""
+        for limit in (2, 30):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(self.url, {"limit": limit})
+            self.assertEqual(len(response.json()["results"]), limit)
+            # OS, contatos, endereços e itens
+            self.assertEqual(len(ctx.captured_queries), 4)
+
+    def test_cursor_returns_only_later_changes(self):
+        """Teste: Depois do cursor vêm só as OS gravadas ou movidas de fase"""
+        _, cursor = self._read_all()
+        response = self.client.get(self.url, {"since": cursor})
+        self.assertEqual(
+            response.json(), {"results": [], "cursor": cursor, "has_more": False}
+        )
+
+        edited = ServiceOrder.objects.get(id=self.store.orders["PENDENTE"][0].id)
+        edited.observations = "Ajuste de barra"
+        edited.save()
+        refused = self.store.orders["EM_PRODUCAO"][0]
+        state_machine.apply(
+            "refuse",
+            [refused],
+            self.store.admin.user,
+            changes={"justification_refusal": "Desistência"},
+        )
+
+        entries, _ = self._read_all(cursor)
+
+        self.assertEqual([entry["id"] for entry in entries], [edited.id, refused.id])
+        self.assertFalse(entries[0]["tombstone"])
+        self.assertEqual(entries[0]["order"]["id"], edited.id)
+        self.assertEqual(entries[1], {**entries[1], "tombstone": True, "order": None})
+
+    def test_bulk_update_in_long_transaction_reaches_feed(self):
+        """Teste: OS movidas por UPDATE em lote numa transação longa entram no feed"""
+        _, cursor = self._read_all()
+        client = self.store.orders["PENDENTE"][0].renter
+        duplicate = Person.objects.create(
+            name=client.name, person_type=client.person_type
+        )
+        moved = list(
+            ServiceOrder.objects.filter(renter=client).values_list("id", flat=True)
+        )
+        ServiceOrder.objects.filter(id__in=moved).update(renter=duplicate)
+        # Carimbo do UPDATE tirado no início de uma transação de um minuto
+        started = timezone.now() - timedelta(minutes=1)
+
+        with self.captureOnCommitCallbacks(execute=True), mock.patch(
+            "accounts.services.timezone.now", return_value=started
+        ):
+            merge_persons(duplicate, client)
+
+        entries, _ = self._read_all(cursor)
+        self.assertEqual(sorted(entry["id"] for entry in entries), sorted(moved))
+
+    def test_save_with_update_fields_stamps_date_updated(self):
+        """Teste: save(update_fields=...) também carimba date_updated"""
+        order = ServiceOrder.objects.get(id=self.store.orders["PENDENTE"][0].id)
+        before = order.date_updated
+
+        order.esta_atrasada = not order.esta_atrasada
+        order.save(update_fields=["esta_atrasada"])
+
+        order.refresh_from_db()
+        self.assertGreater(order.date_updated, before)
+
+    def test_backfill_migration(self):
+        """Teste: Migration de backfill carimba as OS sem date_updated"""
+        from importlib import import_module
+
+        from django.apps import apps
+
+        migration = import_module(
+            "service_control.migrations.0036_backfill_order_date_updated"
+        )
+        ServiceOrder.objects.update(date_updated=None)
+
+        with mock.patch.object(migration, "BATCH_SIZE", 7), mock.patch(
+            "builtins.print"
+        ):
+            migration.backfill_date_updated(apps, None)
+
+        self.assertFalse(ServiceOrder.objects.filter(date_updated=None).exists())
+        self.assertFalse(
+            ServiceOrder.objects.exclude(date_updated=models.F("date_created")).exists()
+        )
+
+    def test_invalid_params(self):
+        """Teste: Cursor ou limit inválidos são rejeitados"""
+        for params in ({"since": "abc"}, {"since": "12_x"}, {"limit": "0"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
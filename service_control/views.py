@@ -30,41 +30,45 @@ def advance_service_order_phases():
     """
     from datetime import date
 
-    from .models import ServiceOrder, ServiceOrderPhase
+    from . import phases
+    from .models import ServiceOrder
 
     today = date.today()
 
+    overdue_phase_id = phases.phase_id("EM ATRASO")
+    in_progress_phase_id = phases.phase_id("EM ANDAMENTO")
+    if not overdue_phase_id and not in_progress_phase_id:
+        # Nenhuma fase de destino cadastrada - nada a avançar
+        return
+
+    finished_phase_ids = phases.phase_ids("FINALIZADO")
+
     # Busca todas as OS que precisam de avanço de fase
     service_orders = ServiceOrder.objects.filter(
-        service_order_phase__name__in=["PENDENTE", "EM ANDAMENTO", "FINALIZADO"]
-    ).select_related("service_order_phase")
+        service_order_phase_id__in=phases.phase_ids(
+            "PENDENTE", "EM ANDAMENTO", "FINALIZADO"
+        )
+    )
 
     for os in service_orders:
         # Lógica de avanço baseada em datas
         if os.devolucao_date and os.devolucao_date < today:
             # OS em atraso - mudar para "EM ATRASO"
-            try:
-                overdue_phase = ServiceOrderPhase.objects.get(name="EM ATRASO")
-                if os.service_order_phase != overdue_phase:
-                    os.service_order_phase = overdue_phase
-                    os.save()
-                    print(f"OS {os.id} marcada como EM ATRASO")
-            except ServiceOrderPhase.DoesNotExist:
-                pass
+            if overdue_phase_id and os.service_order_phase_id != overdue_phase_id:
+                os.service_order_phase_id = overdue_phase_id
+                os.save()
+                print(f"OS {os.id} marcada como EM ATRASO")
 
         elif (
             os.retirada_date
             and os.retirada_date <= today
-            and os.service_order_phase.name == "FINALIZADO"
+            and os.service_order_phase_id in finished_phase_ids
         ):
             # OS finalizada e data de retirada chegou - mudar para "EM ANDAMENTO"
-            try:
-                in_progress_phase = ServiceOrderPhase.objects.get(name="EM ANDAMENTO")
-                os.service_order_phase = in_progress_phase
+            if in_progress_phase_id:
+                os.service_order_phase_id = in_progress_phase_id
                 os.save()
                 print(f"OS {os.id} avançada para EM ANDAMENTO")
-            except ServiceOrderPhase.DoesNotExist:
-                pass
 
 
 # Todas as funcionalidades agora estão disponíveis via API REST: